@@ -1,24 +1,30 @@
 #!/usr/bin/env sh
 
+# Container name and host ports can be overridden to run several instances,
+# e.g. HIVE_NAME=hive4b HIVE_PORT=10010 HIVE_UI_PORT=10012 ./hive.sh
+HIVE_NAME=${HIVE_NAME:-hive4}
+HIVE_PORT=${HIVE_PORT:-10000}
+HIVE_UI_PORT=${HIVE_UI_PORT:-10002}
+
 # Download the container
 export HIVE_VERSION=4.0.1
 docker pull apache/hive:$HIVE_VERSION
 
-if docker ps | grep -i hive4; then
+if docker ps | grep -iw "$HIVE_NAME"; then
   # If container is already running, do nothing
   exit 0
-elif docker ps -a | grep -i hive4; then
+elif docker ps -a | grep -iw "$HIVE_NAME"; then
   # If container is stopped, remove it
-  docker rm hive4
+  docker rm "$HIVE_NAME"
 fi
 
 docker run -d \
-  -p 10000:10000 \
-  -p 10002:10002 \
+  -p "$HIVE_PORT":10000 \
+  -p "$HIVE_UI_PORT":10002 \
   -v "$(pwd -P)/data:/data" \
   --memory="4g" \
   --cpus="4" \
   --env SERVICE_NAME=hiveserver2 \
   --env HIVE_HEAP_MEMORY=3072 \
-  --name hive4 \
+  --name "$HIVE_NAME" \
   apache/hive:$HIVE_VERSION
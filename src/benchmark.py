@@ -0,0 +1,491 @@
+# benchmark.py
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from pyhive.hive import ttypes
+
+import fake_data
+import plot_generation
+from partition_manager import PartitionManager
+from query_runner import QueryRunner
+from report_generator import write_consolidated_report
+from table import Table
+
+# Cardinality reported for every synthetic column. Four columns of 4 values
+# stay below the default partition limit of 1000, a fifth exceeds it.
+STUB_CARDINALITY = 4
+
+CREATE_PATTERN = re.compile(r"CREATE TABLE (\w+)")
+PARTITION_PATTERN = re.compile(r"PARTITIONED BY \((.*?)\n\)", re.DOTALL)
+RENAME_PATTERN = re.compile(r"ALTER TABLE (\w+) RENAME TO (\w+)")
+
+
+class _Status:
+    def __init__(self, operation_state):
+        self.operationState = operation_state
+        self.errorMessage = None
+
+
+class StubCursor:
+    def __init__(self, latency=0.002, seed=0):
+        """Offline stand-in for a PyHive cursor with simulated query latencies.
+
+        SELECT queries take `latency` seconds, divided by one plus the number
+        of partition columns of the table that the query filters on, so
+        partitioning on the right columns pays off as it would in Hive. DDL
+        and repartitioning statements finish immediately. The simulated
+        time of all queries is accumulated in `server_seconds`.
+
+        Args:
+            latency: Simulated seconds of an unpartitioned SELECT
+            seed: Seed for the latency jitter and the COUNT results
+        """
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.partitions = {}
+        self.server_seconds = 0.0
+        self.arraysize = 1000
+        self.description = None
+        self._rows = []
+        self._done = 0.0
+
+    def _query_latency(self, query):
+        match = re.search(r"\bFROM\s+(\w+)", query, re.IGNORECASE)
+        partition_columns = self.partitions.get(match.group(1), []) if match else []
+        where = query.upper().split("WHERE", 1)[1] if "WHERE" in query.upper() else ""
+        matched = sum(1 for col in partition_columns if col.upper() in where)
+        return self.latency / (1 + matched) * self.random.uniform(0.95, 1.05)
+
+    def execute(self, operation, parameters=None, async_=False):
+        statement = operation.strip()
+        self._rows = []
+        self.description = None
+        latency = 0.0
+
+        create = CREATE_PATTERN.match(statement)
+        rename = RENAME_PATTERN.match(statement)
+        if create:
+            partitioned = PARTITION_PATTERN.search(statement)
+            self.partitions[create.group(1)] = (
+                [line.split()[0] for line in partitioned.group(1).split(",")]
+                if partitioned
+                else []
+            )
+        elif rename:
+            self.partitions[rename.group(2)] = self.partitions.pop(rename.group(1), [])
+        elif statement.upper().startswith("SELECT COUNT(DISTINCT"):
+            self._rows = [(STUB_CARDINALITY,)]
+        elif statement.upper().startswith("SELECT"):
+            latency = self._query_latency(statement)
+            self._rows = [(1,)]
+            self.description = [("result", "INT_TYPE") + (None,) * 5]
+
+        self.server_seconds += latency
+        self._done = time.time() + latency
+        if not async_:
+            time.sleep(latency)
+
+    def poll(self, get_progress_update=True):
+        if time.time() < self._done:
+            return _Status(ttypes.TOperationState.RUNNING_STATE)
+        return _Status(ttypes.TOperationState.FINISHED_STATE)
+
+    def cancel(self):
+        self._done = 0.0
+        self._rows = []
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+def synthetic_workload(n_columns, n_queries, seed=0):
+    """Build a single-table schema, workload and column frequencies.
+
+    Predicate columns are drawn with Zipf-like weights, so a few columns are
+    filtered on much more often than the rest, like in the real workload.
+
+    Returns:
+        tuple: (columns, query specs, column frequency dictionary)
+    """
+    rng = random.Random(seed)
+    columns = [(f"c{i}", "INT") for i in range(n_columns)]
+    weights = [1 / (i + 1) for i in range(n_columns)]
+
+    queries = []
+    frequencies = {name: 0 for name, _ in columns}
+    for _ in range(n_queries):
+        predicates = set(
+            rng.choices([name for name, _ in columns], weights, k=rng.randint(1, 2))
+        )
+        for name in predicates:
+            frequencies[name] += 1
+        where = " AND ".join(
+            f"{name} = {rng.randint(1, STUB_CARDINALITY)}"
+            for name in sorted(predicates)
+        )
+        queries.append(
+            {
+                "query": f"SELECT COUNT(*) FROM bench WHERE {where}",
+                "weight": 1.0,
+                "slo_seconds": None,
+            }
+        )
+    return columns, queries, {"bench": frequencies}
+
+
+def synthetic_results(n_tables, n_candidates, n_queries, seed=0):
+    """Build algorithm results in the format written by the report generator."""
+    rng = random.Random(seed)
+    all_results = {}
+    for t in range(n_tables):
+        results = []
+        for c in range(n_candidates):
+            columns = [] if c == 0 else [f"c{i}" for i in range(1 + c % 3)]
+            query_times = [
+                {
+                    "query": f"SELECT COUNT(*) FROM table_{t} WHERE c{q % 5} = {q}",
+                    "weight": 1.0,
+                    "slo_seconds": None,
+                    "seconds": rng.uniform(0.5, 2.0),
+                }
+                for q in range(n_queries)
+            ]
+            total_time = sum(entry["seconds"] for entry in query_times)
+            details = {"total_time": total_time, "query_times": query_times}
+            results.append((columns, total_time, 4 ** len(columns), details))
+        all_results[f"table_{t}"] = sorted(results, key=lambda x: x[1])
+    return all_results
+
+
+def _metadata(n_tables, algorithm_version=1, data_size=1):
+    return {
+        "data_size": data_size,
+        "total_time": 0.0,
+        "algorithm_version": algorithm_version,
+        "objective": "weighted_total",
+        "num_tables_processed": n_tables,
+        "timestamp": "2000-01-01 00:00:00",
+        "total_tables_available": n_tables,
+    }
+
+
+def algorithm_case(algorithm, n_columns, n_queries, latency):
+    """Return a setup function for running algorithm 1 or 2 on a stub table."""
+
+    def setup():
+        cursor = StubCursor(latency)
+        columns, queries, column_freq_dict = synthetic_workload(n_columns, n_queries)
+        table = Table("bench", columns)
+        table.create(cursor)
+        table.compute_cardinality(cursor)
+        query_runner = QueryRunner(cursor, select_by_index=False)
+        query_runner.table_queries = {"bench": queries, "all": queries}
+        partition_manager = PartitionManager({"bench": table}, cursor, column_freq_dict)
+        algorithm_function = getattr(partition_manager, f"algorithm{algorithm}")
+
+        def run():
+            return {"candidates": len(algorithm_function("bench", query_runner))}
+
+        return run, cursor
+
+    return setup
+
+
+def generate_data_case(size_MiB):
+    """Return a setup function for generating `size_MiB` of fake CSV data."""
+
+    def setup():
+        output_dir = tempfile.mkdtemp(prefix="benchmark_data_")
+        # Faker remembers unique values across calls
+        fake_data.fake.unique.clear()
+
+        def run():
+            try:
+                fake_data.generate_data(size_MiB, output_dir=output_dir)
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+        return run, None
+
+    return setup
+
+
+def report_case(n_tables, n_candidates, n_queries):
+    """Return a setup function for writing a consolidated report."""
+
+    def setup():
+        all_results = synthetic_results(n_tables, n_candidates, n_queries)
+        work_dir = tempfile.mkdtemp(prefix="benchmark_report_")
+
+        def run():
+            cwd = os.getcwd()
+            os.chdir(work_dir)
+            try:
+                write_consolidated_report(
+                    all_results, "algorithm_1", metadata=_metadata(n_tables)
+                )
+            finally:
+                os.chdir(cwd)
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return run, None
+
+    return setup
+
+
+def load_reports_case(n_tables, n_candidates):
+    """Return a setup function for loading report directories for plotting.
+
+    One report with `n_tables` table files is written for every size and
+    algorithm that `plot_generation` looks for.
+    """
+
+    def setup():
+        base_path = tempfile.mkdtemp(prefix="benchmark_reports_")
+        cwd = os.getcwd()
+        os.chdir(base_path)
+        try:
+            for size in plot_generation.sizes:
+                for algorithm in plot_generation.algorithms:
+                    write_consolidated_report(
+                        synthetic_results(n_tables, n_candidates, 5, seed=size),
+                        f"algorithm_{algorithm}",
+                        metadata=_metadata(n_tables, algorithm, size),
+                        results_db=None,
+                    )
+                    report_dir = max(os.listdir("algorithm_reports"))
+                    os.rename(
+                        os.path.join("algorithm_reports", report_dir),
+                        f"algorithm_{algorithm}_{size}",
+                    )
+        finally:
+            os.chdir(cwd)
+
+        def run():
+            try:
+                plot_generation.load_data_from_directories(base_path)
+            finally:
+                shutil.rmtree(base_path, ignore_errors=True)
+
+        return run, None
+
+    return setup
+
+
+def benchmark_cases(latency, quick=False):
+    """Return (name, setup function) pairs for every component and scale."""
+    scales = {
+        "algorithm1": [10, 50],
+        "algorithm2": [4, 8],
+        "generate_data": [1, 2],
+        "write_consolidated_report": [10, 100],
+        "load_data_from_directories": [5, 20],
+    }
+    if quick:
+        scales = {component: values[:1] for component, values in scales.items()}
+
+    cases = []
+    for n_queries in scales["algorithm1"]:
+        cases.append(
+            (
+                f"algorithm1[columns=6,queries={n_queries}]",
+                algorithm_case(1, 6, n_queries, latency),
+            )
+        )
+    for n_columns in scales["algorithm2"]:
+        cases.append(
+            (
+                f"algorithm2[columns={n_columns},queries=10]",
+                algorithm_case(2, n_columns, 10, latency),
+            )
+        )
+    for size_MiB in scales["generate_data"]:
+        cases.append(
+            (f"generate_data[size_MiB={size_MiB}]", generate_data_case(size_MiB))
+        )
+    for n_candidates in scales["write_consolidated_report"]:
+        cases.append(
+            (
+                f"write_consolidated_report[tables=5,candidates={n_candidates},queries=20]",
+                report_case(5, n_candidates, 20),
+            )
+        )
+    for n_tables in scales["load_data_from_directories"]:
+        cases.append(
+            (
+                f"load_data_from_directories[tables={n_tables},candidates=20]",
+                load_reports_case(n_tables, 20),
+            )
+        )
+    return cases
+
+
+def measure(setup, repeat=3):
+    """Time `repeat` runs of a case and trace the peak memory of one more.
+
+    Returns:
+        dict: Median "wall_seconds", "overhead_seconds" (wall time minus the
+            simulated query time of the stub cursor) and "peak_bytes", plus
+            any values the case reports about its run
+    """
+    wall_times = []
+    overhead_times = []
+    info = {}
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            for _ in range(repeat):
+                run, cursor = setup()
+                start = time.perf_counter()
+                info = run() or {}
+                wall_time = time.perf_counter() - start
+                wall_times.append(wall_time)
+                overhead_times.append(
+                    wall_time - (cursor.server_seconds if cursor else 0.0)
+                )
+
+            run, _ = setup()
+            tracemalloc.start()
+            try:
+                run()
+                _, peak_bytes = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+    return dict(
+        info,
+        wall_seconds=statistics.median(wall_times),
+        overhead_seconds=statistics.median(overhead_times),
+        peak_bytes=peak_bytes,
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Compare results against a stored baseline.
+
+    A case regresses when its overhead or peak memory grows by more than
+    `tolerance` percent. Small absolute changes (10 ms, 1 MiB) are ignored as
+    noise.
+
+    Returns:
+        list: Names of the regressed cases
+    """
+    regressions = []
+    print(f"\n{'Case':<75} {'Overhead':>10} {'Peak memory':>12}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<75} {'new':>10} {'new':>12}")
+            continue
+        base = baseline[name]
+        changes = []
+        regressed = False
+        for key, noise in (("overhead_seconds", 0.01), ("peak_bytes", 2**20)):
+            change = (
+                (result[key] - base[key]) / base[key] * 100 if base[key] > 0 else 0.0
+            )
+            changes.append(f"{change:+.1f}%")
+            if change > tolerance and result[key] - base[key] > noise:
+                regressed = True
+        print(
+            f"{name:<75} {changes[0]:>10} {changes[1]:>12}"
+            + ("  REGRESSED" if regressed else "")
+        )
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the optimizer's own overhead offline with a stub cursor"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per case (median is kept)"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.002,
+        help="Simulated seconds of an unpartitioned query (0 measures pure overhead)",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Only run the smallest scale per component"
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write the results to this JSON file"
+    )
+    parser.add_argument(
+        "--save_baseline",
+        type=str,
+        default=None,
+        help="Store the results as the baseline for later comparisons",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Compare the results against this stored baseline and exit with 1 on regressions",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=25.0,
+        help="Percent growth in overhead or peak memory reported as a regression",
+    )
+
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'Case':<75} {'Wall (s)':>10} {'Overhead (s)':>13} {'Peak (MiB)':>11}")
+    for name, setup in benchmark_cases(args.latency, args.quick):
+        result = measure(setup, args.repeat)
+        results[name] = result
+        print(
+            f"{name:<75} {result['wall_seconds']:>10.4f} "
+            f"{result['overhead_seconds']:>13.4f} {result['peak_bytes'] / 2**20:>11.2f}"
+        )
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "latency": args.latency,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=4)
+            print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        if baseline.get("latency") != args.latency:
+            print(
+                f"Warning: Baseline was recorded with latency {baseline.get('latency')}"
+            )
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed against {args.baseline}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+# coordinator.py
+import argparse
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+from datetime import datetime
+
+from partition_manager import PartitionManager, OBJECTIVES
+from query_runner import QueryRunner
+from report_generator import write_consolidated_report
+from table import Table
+from tracing import tracer
+
+
+def parse_endpoint(endpoint):
+    """Split "host:port" into (host, port)."""
+    host, _, port = endpoint.rpartition(":")
+    return host or "localhost", int(port)
+
+
+class StubConnection:
+    def __init__(self, latency):
+        """In-process stand-in for a HiveServer2 instance (see benchmark.py).
+
+        All cursors share one StubCursor, so the node keeps one set of
+        table layouts like a real server does.
+        """
+        from benchmark import StubCursor
+
+        self._cursor = StubCursor(latency)
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+class Node:
+    def __init__(
+        self,
+        endpoint,
+        connect,
+        schemas,
+        column_freq_dict,
+        MAX_PARTITION_PRODUCT=1000,
+        objective="weighted_total",
+        query_runner_options=None,
+    ):
+        """One HiveServer2 instance holding its own copy of the data.
+
+        The node's tables must be loaded and unpartitioned, e.g. by running
+        testbench.py against it once with --host/--port.
+
+        Args:
+            endpoint: "host:port" of the instance
+            connect: Callable (host, port) returning a DB-API connection with
+                the session settings applied
+            schemas: Table schemas, as in schema.json
+            column_freq_dict: Column frequencies, as in column_freq_dict.json
+            MAX_PARTITION_PRODUCT: Partition limit of the cardinality gate
+            objective: Objective candidates are ranked by
+            query_runner_options: Extra keyword arguments for QueryRunner
+        """
+        self.endpoint = endpoint
+        self.conn = connect(*parse_endpoint(endpoint))
+        self.cursor = self.conn.cursor()
+        self.tables = {name: Table(name, schema) for name, schema in schemas.items()}
+        self.query_runner = QueryRunner(
+            self.cursor, schema=schemas, **(query_runner_options or {})
+        )
+        self.partition_manager = PartitionManager(
+            self.tables,
+            self.cursor,
+            column_freq_dict,
+            MAX_PARTITION_PRODUCT,
+            objective=objective,
+        )
+        # Calibration time divided by the median calibration time of all
+        # nodes; measured times are divided by it
+        self.calibration_seconds = None
+        self.speed_factor = 1.0
+        self.tasks_done = 0
+
+    def prepare(self, table_names):
+        """Compute the column cardinalities the partition limit checks need."""
+        for table_name in table_names:
+            self.tables[table_name].compute_cardinality(self.cursor)
+
+    def calibrate(self, queries, repeat=3):
+        """Time the calibration queries and return the median total in seconds."""
+        totals = []
+        for _ in range(repeat):
+            start = time.time()
+            for query in queries:
+                self.cursor.execute(query)
+                self.cursor.fetchall()
+            totals.append(time.time() - start)
+        self.calibration_seconds = statistics.median(totals)
+        return self.calibration_seconds
+
+    def evaluate(self, table_name, partition_columns):
+        """Measure the table's workload with the table partitioned by the columns.
+
+        Returns:
+            tuple: (objective value, cardinality product, details), with the
+                times in details normalized by the node's speed factor
+        """
+        table = self.tables[table_name]
+        if partition_columns:
+            objective_value, cardinality_product, details = (
+                self.partition_manager.attempt_repartition_and_run(
+                    table_name, partition_columns, self.query_runner
+                )
+            )
+        else:
+            # Baseline: restore the unpartitioned layout if needed
+            if table.partition or table.bucket_columns:
+                self.partition_manager.repartition(table_name, [])
+            objective_value, details = self.partition_manager.measure(
+                table_name, self.query_runner
+            )
+            cardinality_product = 1
+
+        details["node"] = self.endpoint
+        details["speed_factor"] = self.speed_factor
+        if "total_time" in details:
+            details["raw_total_time"] = details["total_time"]
+            details["total_time"] /= self.speed_factor
+            details["query_times"] = [
+                dict(
+                    entry,
+                    seconds=entry["seconds"] / self.speed_factor,
+                    raw_seconds=entry["seconds"],
+                )
+                for entry in details["query_times"]
+            ]
+            objective_value = self.partition_manager.score(details["query_times"])
+        self.tasks_done += 1
+        return objective_value, cardinality_product, details
+
+    def close(self):
+        self.conn.close()
+
+
+class Coordinator:
+    def __init__(self, nodes, calibration_queries, calibration_repeat=3):
+        """Distributes layout measurements over several identical Hive instances.
+
+        Args:
+            nodes: Node objects, one per instance
+            calibration_queries: Queries timed on every node to estimate its
+                speed relative to the others
+            calibration_repeat: Number of calibration runs per node
+        """
+        self.nodes = nodes
+        self.calibration_queries = calibration_queries
+        self.calibration_repeat = calibration_repeat
+
+    def _each_node(self, function):
+        """Call `function(node)` for all nodes concurrently."""
+        threads = [
+            threading.Thread(target=function, args=(node,)) for node in self.nodes
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def calibrate(self):
+        """Set each node's speed factor relative to the median node."""
+
+        def calibrate_node(node):
+            with tracer.span("coordinator.calibrate", node=node.endpoint):
+                node.calibrate(self.calibration_queries, self.calibration_repeat)
+
+        self._each_node(calibrate_node)
+        reference = statistics.median(node.calibration_seconds for node in self.nodes)
+        for node in self.nodes:
+            node.speed_factor = (
+                node.calibration_seconds / reference if reference > 0 else 1.0
+            )
+            print(
+                f"Node {node.endpoint}: calibration {node.calibration_seconds:.3f}s, "
+                f"speed factor {node.speed_factor:.2f}"
+            )
+
+    def run(self, tasks):
+        """Measure (table name, partition columns) tasks on the nodes.
+
+        Every node takes the next task from a shared queue as soon as it is
+        done with the previous one, so faster nodes measure more layouts. A
+        node that fails puts its task back and stops. Nodes wait while
+        other nodes' tasks are in progress, so a task put back is taken by
+        a node that is still working; tasks left when no node remains are
+        reported with an infinite time.
+
+        Returns:
+            dict: Results of each table, sorted by objective value, in the
+                format of the PartitionManager algorithms
+        """
+        work = queue.Queue()
+        for task in tasks:
+            work.put(task)
+        results = {}
+        # Tasks neither measured nor left without a node
+        outstanding = len(tasks)
+        condition = threading.Condition()
+
+        def work_on(node):
+            nonlocal outstanding
+            while True:
+                with condition:
+                    # A task in progress on another node may still be put back
+                    while work.empty() and outstanding > 0:
+                        condition.wait()
+                    if outstanding == 0:
+                        return
+                    table_name, partition_columns = work.get_nowait()
+                try:
+                    with tracer.span(
+                        "coordinator.task",
+                        node=node.endpoint,
+                        table=table_name,
+                        partition_columns=list(partition_columns),
+                    ):
+                        result = node.evaluate(table_name, partition_columns)
+                except Exception as e:
+                    print(
+                        f"Node {node.endpoint} failed on {table_name} "
+                        f"{partition_columns}: {e}. Removing it."
+                    )
+                    with condition:
+                        work.put((table_name, partition_columns))
+                        condition.notify_all()
+                    return
+                with condition:
+                    results.setdefault(table_name, []).append(
+                        (list(partition_columns),) + result
+                    )
+                    outstanding -= 1
+                    condition.notify_all()
+
+        self._each_node(work_on)
+
+        # Any node computed the cardinalities of all tables in `prepare`
+        partition_manager = self.nodes[0].partition_manager
+        while not work.empty():
+            table_name, partition_columns = work.get_nowait()
+            print(f"No node left to measure {table_name} {partition_columns}.")
+            cardinality_product = 1
+            if partition_columns:
+                _, cardinality_product = (
+                    partition_manager.check_repartition_cardinality(
+                        partition_columns, table_name
+                    )
+                )
+            results.setdefault(table_name, []).append(
+                (
+                    list(partition_columns),
+                    float("inf"),
+                    cardinality_product,
+                    {"error": "no node left"},
+                )
+            )
+
+        for node in self.nodes:
+            print(f"Node {node.endpoint} measured {node.tasks_done} layouts.")
+        return {
+            table_name: sorted(table_results, key=lambda x: x[1])
+            for table_name, table_results in results.items()
+        }
+
+
+if __name__ == "__main__":
+    import testbench
+
+    parser = argparse.ArgumentParser(
+        description="Measure Algorithm 1 candidate layouts on several HiveServer2 instances"
+    )
+    parser.add_argument(
+        "--endpoints",
+        type=str,
+        default="localhost:10000",
+        help="Comma-separated host:port list of identical HiveServer2 instances",
+    )
+    parser.add_argument(
+        "--tables",
+        type=str,
+        default=None,
+        help="Comma-separated list of tables to process (default: all tables)",
+    )
+    parser.add_argument(
+        "--objective",
+        type=str,
+        choices=OBJECTIVES,
+        default="weighted_total",
+        help="Objective to rank layouts by",
+    )
+    parser.add_argument(
+        "--calibration_repeat",
+        type=int,
+        default=3,
+        help="Calibration runs per node; the median is used",
+    )
+    parser.add_argument(
+        "--query_timeout",
+        type=float,
+        default=None,
+        help="Cancel any single query running longer than this many seconds",
+    )
+    parser.add_argument(
+        "--queries_dir",
+        type=str,
+        default=None,
+        help="Directory with the workload files (default: src/queries)",
+    )
+    parser.add_argument(
+        "--stub",
+        type=str,
+        default=None,
+        help="Instead of connecting to --endpoints, start in-process stand-in servers with these comma-separated relative slowdowns, e.g. 1,2",
+    )
+    parser.add_argument(
+        "--stub_latency",
+        type=float,
+        default=0.02,
+        help="Simulated seconds of an unpartitioned query on a stand-in server with slowdown 1",
+    )
+
+    args = parser.parse_args()
+
+    with open(os.path.join(os.getcwd(), "src", "schema.json"), "r") as file:
+        schemas = json.load(file)
+    column_freq_path = os.path.join(os.getcwd(), "src", "column_freq_dict.json")
+    if args.queries_dir and os.path.exists(
+        os.path.join(args.queries_dir, "column_freq_dict.json")
+    ):
+        column_freq_path = os.path.join(args.queries_dir, "column_freq_dict.json")
+    with open(column_freq_path, "r") as file:
+        column_freq_dict = json.load(file)
+
+    if args.stub:
+        slowdowns = [float(value) for value in args.stub.split(",")]
+        endpoints = [f"stub{i}:{i}" for i in range(len(slowdowns))]
+
+        def connect(host, port):
+            return StubConnection(args.stub_latency * slowdowns[port])
+
+    else:
+        endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",")]
+
+        def connect(host, port):
+            return testbench.connect(host, port)
+
+    table_names = (
+        [t.strip() for t in args.tables.split(",")] if args.tables else list(schemas)
+    )
+
+    start_time = time.time()
+    nodes = [
+        Node(
+            endpoint,
+            connect,
+            schemas,
+            column_freq_dict,
+            objective=args.objective,
+            query_runner_options={
+                "query_timeout": args.query_timeout,
+                "queries_dir": args.queries_dir,
+            },
+        )
+        for endpoint in endpoints
+    ]
+    for node in nodes:
+        node.prepare(table_names)
+
+    coordinator = Coordinator(
+        nodes,
+        [f"SELECT COUNT(*) FROM {table_name}" for table_name in table_names],
+        args.calibration_repeat,
+    )
+    coordinator.calibrate()
+
+    tasks = [
+        (table_name, cols)
+        for table_name in table_names
+        for cols in nodes[0].partition_manager.algorithm1_candidates(table_name)
+    ]
+    print(f"Measuring {len(tasks)} layouts on {len(nodes)} nodes...")
+    all_results = coordinator.run(tasks)
+    total_time = time.time() - start_time
+
+    for table_name, results in all_results.items():
+        columns, objective_value, _, details = results[0]
+        print(
+            f"{table_name}: best layout {columns} ({objective_value:.4f}, "
+            f"measured on {details.get('node')})"
+        )
+
+    for node in nodes:
+        node.close()
+
+    if not args.stub:
+        write_consolidated_report(
+            all_results,
+            algorithm_name="algorithm_distributed",
+            metadata={
+                "data_size": "N/A",
+                "total_time": total_time,
+                "algorithm_version": "distributed",
+                "objective": args.objective,
+                "num_tables_processed": len(all_results),
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "total_tables_available": len(schemas),
+                "nodes": {
+                    node.endpoint: {
+                        "calibration_seconds": node.calibration_seconds,
+                        "speed_factor": node.speed_factor,
+                        "layouts_measured": node.tasks_done,
+                    }
+                    for node in nodes
+                },
+            },
+        )
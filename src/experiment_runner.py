@@ -0,0 +1,283 @@
+# experiment_runner.py
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from report_generator import write_consolidated_report
+from session_params import apply_settings, default_settings
+from tracing import tracer
+
+ALGORITHMS = (1, 2, 3, "session")
+
+
+def load_spec(path):
+    """Load and validate an experiment spec.
+
+    A spec is a JSON object with:
+
+    - "sizes": data sizes in MiB
+    - "algorithms": any of 1, 2, 3 and "session" (see `ALGORITHMS`)
+    - "tables": optional list of tables (default: all tables)
+    - "repetitions": optional number of runs of every experiment (default 1)
+    - "options": optional keyword arguments for Testbench, e.g.
+      {"objective": "weighted_p95", "target_rows_per_partition": 1000}
+    - "session_budget": optional measurement budget of the "session"
+      algorithm (default 40)
+    - "name": optional name of the report collection (default: the spec
+      file name)
+    """
+    with open(path, "r") as file:
+        spec = json.load(file)
+
+    for key in ("sizes", "algorithms"):
+        if not spec.get(key):
+            raise ValueError(f"Experiment spec {path} needs a non-empty {key!r} list")
+    unknown = [alg for alg in spec["algorithms"] if alg not in ALGORITHMS]
+    if unknown:
+        raise ValueError(
+            f"Unknown algorithms {unknown}. Available: "
+            f"{', '.join(str(alg) for alg in ALGORITHMS)}"
+        )
+    spec.setdefault("tables", None)
+    spec.setdefault("repetitions", 1)
+    spec.setdefault("options", {})
+    spec.setdefault("session_budget", 40)
+    spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return spec
+
+
+def experiments(spec, table_names):
+    """Expand a spec into (size, algorithm, repetition, table) tuples.
+
+    Experiments are grouped by data size, so each dataset is loaded once,
+    in the order of the spec's sizes.
+    """
+    return [
+        (size, algorithm, repetition, table_name)
+        for size in spec["sizes"]
+        for repetition in range(1, spec["repetitions"] + 1)
+        for algorithm in spec["algorithms"]
+        for table_name in table_names
+    ]
+
+
+def experiment_key(size, algorithm, repetition, table_name):
+    return f"{size}/{algorithm}/{repetition}/{table_name}"
+
+
+def report_dir(spec, size, algorithm, repetition):
+    """Return the report directory of one (size, algorithm, repetition) run.
+
+    The layout matches the saved report collections, e.g.
+    algorithm_reports/<name>/algorithm_1_20, with one collection per
+    repetition (<name>_rep2, ...) when there are several.
+    """
+    collection = spec["name"]
+    if spec["repetitions"] > 1:
+        collection += f"_rep{repetition}"
+    return os.path.join(
+        "algorithm_reports", collection, f"algorithm_{algorithm}_{size}"
+    )
+
+
+class ExperimentRunner:
+    def __init__(self, spec, state_path, table_names):
+        """Runs an experiment matrix, resuming from a state file.
+
+        The results of every finished (size, algorithm, repetition, table)
+        experiment are kept in `state_path`, so an interrupted matrix
+        continues where it stopped. A run's report is written once all of
+        its tables are done.
+
+        Args:
+            spec: Experiment spec (see `load_spec`)
+            state_path: JSON file holding the finished experiments
+            table_names: All tables of the schema
+        """
+        self.spec = spec
+        self.state_path = state_path
+        self.table_names = spec["tables"] or list(table_names)
+        self.state = {}
+        if os.path.exists(state_path):
+            with open(state_path, "r") as file:
+                self.state = json.load(file)
+
+    def save(self):
+        """Write the state file atomically."""
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.state, file)
+        os.replace(temp_path, self.state_path)
+
+    def pending(self):
+        """Return the experiments without a recorded result, in run order."""
+        return [
+            experiment
+            for experiment in experiments(self.spec, self.table_names)
+            if experiment_key(*experiment) not in self.state
+        ]
+
+    def _reset(self, testbench, table_name):
+        """Restore the unpartitioned layout and the starting session settings.
+
+        Algorithms leave tables in their last measured layout and the
+        session search leaves its best settings, but every algorithm
+        expects to start from the baseline.
+        """
+        apply_settings(
+            testbench.cursor, dict(default_settings(), **testbench.session_settings)
+        )
+        table = testbench.tables[table_name]
+        if table.partition or table.bucket_columns:
+            testbench.partition_manager.repartition(table_name, [])
+
+    def _run(self, testbench, algorithm, table_name):
+        if algorithm == "session":
+            return testbench.session_search(
+                table_name, max_measurements=self.spec["session_budget"]
+            )
+        return getattr(testbench, f"algorithm{algorithm}")(table_name)
+
+    def _write_report(self, size, algorithm, repetition, load_stats):
+        """Write the report of a run from the results in the state."""
+        entries = {
+            table_name: self.state[
+                experiment_key(size, algorithm, repetition, table_name)
+            ]
+            for table_name in self.table_names
+        }
+        all_results = {
+            table_name: [tuple(result) for result in entry["results"]]
+            for table_name, entry in entries.items()
+        }
+        write_consolidated_report(
+            all_results,
+            algorithm_name=f"algorithm_{algorithm}",
+            metadata={
+                "data_size": size,
+                "total_time": sum(entry["seconds"] for entry in entries.values()),
+                "algorithm_version": algorithm,
+                "objective": self.spec["options"].get("objective", "weighted_total"),
+                "num_tables_processed": len(all_results),
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "total_tables_available": len(self.table_names),
+                "data_loading": load_stats,
+                "repetition": repetition,
+                "experiment": self.spec["name"],
+            },
+            report_dir=report_dir(self.spec, size, algorithm, repetition),
+        )
+
+    def run(self, testbench_factory):
+        """Run all pending experiments.
+
+        Args:
+            testbench_factory: Callable taking a data size and returning a
+                Testbench with that dataset loaded. It is called once per
+                size with pending experiments.
+        """
+        pending = self.pending()
+        if not pending:
+            print("All experiments are done.")
+            return
+        print(
+            f"{len(pending)} of {len(experiments(self.spec, self.table_names))} "
+            "experiments pending."
+        )
+
+        for size in self.spec["sizes"]:
+            size_pending = [
+                experiment for experiment in pending if experiment[0] == size
+            ]
+            if not size_pending:
+                continue
+            print(
+                f"Loading the {size} MiB dataset for {len(size_pending)} experiments."
+            )
+            testbench = testbench_factory(size)
+            try:
+                for _, algorithm, repetition, table_name in size_pending:
+                    print(
+                        f"Running {algorithm} on {table_name} ({size} MiB, "
+                        f"repetition {repetition})"
+                    )
+                    self._reset(testbench, table_name)
+                    start = time.time()
+                    with tracer.span(
+                        "experiment_runner.experiment",
+                        size_MiB=size,
+                        algorithm=algorithm,
+                        repetition=repetition,
+                        table=table_name,
+                    ):
+                        results = self._run(testbench, algorithm, table_name)
+                    self.state[
+                        experiment_key(size, algorithm, repetition, table_name)
+                    ] = {
+                        "results": results,
+                        "seconds": time.time() - start,
+                    }
+                    self.save()
+
+                    # Report the run once its last table is done
+                    if all(
+                        experiment_key(size, algorithm, repetition, other) in self.state
+                        for other in self.table_names
+                    ):
+                        self._write_report(
+                            size, algorithm, repetition, testbench.load_stats
+                        )
+            finally:
+                testbench.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a matrix of sizes, algorithms, tables and repetitions from a spec file"
+    )
+    parser.add_argument("spec", type=str, help="JSON experiment spec")
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help="State file of finished experiments (default: algorithm_reports/<name>/experiment_state.json)",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard the state and run the whole matrix again",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only list the pending experiments",
+    )
+
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    with open(os.path.join(os.getcwd(), "src", "schema.json"), "r") as file:
+        schemas = json.load(file)
+    state_path = args.state or os.path.join(
+        "algorithm_reports", spec["name"], "experiment_state.json"
+    )
+    if args.restart and os.path.exists(state_path):
+        os.remove(state_path)
+
+    runner = ExperimentRunner(spec, state_path, list(schemas))
+    invalid_tables = [t for t in runner.table_names if t not in schemas]
+    if invalid_tables:
+        raise SystemExit(f"Error: Table(s) not found: {invalid_tables}")
+
+    if args.dry_run:
+        for size, algorithm, repetition, table_name in runner.pending():
+            print(
+                f"{size} MiB, algorithm {algorithm}, repetition {repetition}: {table_name}"
+            )
+    else:
+        from testbench import Testbench
+
+        runner.run(lambda size: Testbench(data_size_MiB=size, **spec["options"]))
@@ -1,5 +1,7 @@
 # fake_data.py
+import bz2
 import csv
+import gzip
 from datetime import datetime
 import random
 from faker import Faker
@@ -10,9 +12,37 @@ import os
 # at most this cardinality
 CARDINALITY = 1000
 
+# Supported CSV compressions, with the file extension Hive recognizes them by
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "bz2": ".bz2"}
+OPENERS = {None: open, "gzip": gzip.open, "bz2": bz2.open}
+
 
 fake = Faker()
 
+# Product categories
+CATEGORIES = [
+    "Electronics",
+    "Clothing",
+    "Home & Kitchen",
+    "Books",
+    "Sports",
+    "Toys & Games",
+    "Beauty",
+    "Automotive",
+    "Garden & Outdoor",
+    "Pet Supplies",
+    "Health",
+    "Grocery",
+    "Tools",
+    "Music",
+    "Movies",
+    "Baby",
+    "Office Products",
+    "Jewelry",
+    "Art & Crafts",
+    "Industrial",
+]
+
 
 # Generate Users
 def generate_users(
@@ -55,28 +85,6 @@ def generate_users(
 # Generate Products
 def generate_products(n=500):
     products = []
-    categories = [
-        "Electronics",
-        "Clothing",
-        "Home & Kitchen",
-        "Books",
-        "Sports",
-        "Toys & Games",
-        "Beauty",
-        "Automotive",
-        "Garden & Outdoor",
-        "Pet Supplies",
-        "Health",
-        "Grocery",
-        "Tools",
-        "Music",
-        "Movies",
-        "Baby",
-        "Office Products",
-        "Jewelry",
-        "Art & Crafts",
-        "Industrial",
-    ]
     price_cardinality = 21
     price_pool = [random.randint(1, 10000) for _ in range(price_cardinality)]
 
@@ -85,7 +93,7 @@ def generate_products(n=500):
             [
                 fake.unique.random_int(min=1, max=n * 1000),
                 fake.word().capitalize(),
-                random.choice(categories),
+                random.choice(CATEGORIES),
                 random.choice(price_pool),
                 random.randint(0, 100),
             ]
@@ -253,7 +261,21 @@ def generate_reviews(
     return reviews
 
 
-def generate_data(size_MiB=10, output_dir="data"):
+def data_filename(table_name, compression=None):
+    """Return the name of a table's CSV file, e.g. "users.csv.gz" for gzip."""
+    return f"{table_name}.csv{COMPRESSION_EXTENSIONS[compression]}"
+
+
+def generate_data(size_MiB=10, output_dir="data", compression=None):
+    """Generate the CSV files of all tables.
+
+    Args:
+        size_MiB: Approximate size of the uncompressed data
+        output_dir: Directory the CSV files are written to
+        compression: None, "gzip" or "bz2". Hive decompresses text files by
+            their extension, so compressed files load without changes and
+            take less disk I/O.
+    """
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
@@ -274,34 +296,35 @@ def generate_data(size_MiB=10, output_dir="data"):
     )
 
     # Save Data to CSV
-    def save_to_csv(filename, data, headers):
-        with open(filename, "w", newline="", encoding="utf-8") as f:
+    def save_to_csv(table_name, data, headers):
+        filename = os.path.join(output_dir, data_filename(table_name, compression))
+        with OPENERS[compression](filename, "wt", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
             writer.writerow(headers)
             writer.writerows(data)
 
     save_to_csv(
-        os.path.join(output_dir, "users.csv"),
+        "users",
         users,
         ["user_id", "name", "email", "created_at"],
     )
     save_to_csv(
-        os.path.join(output_dir, "products.csv"),
+        "products",
         products,
         ["product_id", "name", "category", "price", "stock"],
     )
     save_to_csv(
-        os.path.join(output_dir, "orders.csv"),
+        "orders",
         orders,
         ["order_id", "user_id", "order_date", "total_amount"],
     )
     save_to_csv(
-        os.path.join(output_dir, "order_items.csv"),
+        "order_items",
         order_items,
         ["order_id", "product_id", "quantity", "price"],
     )
     save_to_csv(
-        os.path.join(output_dir, "reviews.csv"),
+        "reviews",
         reviews,
         ["review_id", "user_id", "product_id", "rating", "comment"],
     )
@@ -317,7 +340,13 @@ if __name__ == "__main__":
     parser.add_argument(
         "--output", type=str, default="data", help="Output directory for CSV files"
     )
+    parser.add_argument(
+        "--compression",
+        choices=[c for c in COMPRESSION_EXTENSIONS if c],
+        default=None,
+        help="Compress the CSV files",
+    )
 
     args = parser.parse_args()
 
-    generate_data(args.size, args.output)
+    generate_data(args.size, args.output, args.compression)
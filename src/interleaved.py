@@ -0,0 +1,354 @@
+# interleaved.py
+import itertools
+import random
+
+from query_runner import cache_totals
+from tracing import tracer
+
+
+def paired_differences(query_times_a, query_times_b):
+    """Return the weighted per-query time differences of two passes.
+
+    Entries are matched by position, since both passes run the same
+    workload in the same order. Each difference is multiplied by the
+    query's weight and template count, so the differences sum to the
+    difference of the weighted totals.
+    """
+    differences = []
+    for entry_a, entry_b in zip(query_times_a, query_times_b):
+        factor = entry_a.get("weight", 1.0) * entry_a.get("count", 1)
+        differences.append(factor * (entry_a["seconds"] - entry_b["seconds"]))
+    return differences
+
+
+def sign_flip_test(differences, permutations=10000, rng=None):
+    """Two-sided p-value of a paired sign-flip permutation test.
+
+    If two layouts are equally fast, each paired difference is as likely
+    to be positive as negative. The p-value is the share of random sign
+    assignments whose summed difference is at least as large as the one
+    observed. All assignments are enumerated when there are at most
+    `permutations` of them.
+    """
+    observed = abs(sum(differences))
+    if not differences or observed == 0:
+        return 1.0
+    # Tolerance for floating point noise in sums of the same terms
+    threshold = observed * (1 - 1e-9)
+
+    if 2 ** len(differences) <= permutations:
+        extreme = sum(
+            1
+            for signs in itertools.product((1, -1), repeat=len(differences))
+            if abs(sum(s * d for s, d in zip(signs, differences))) >= threshold
+        )
+        return extreme / 2 ** len(differences)
+
+    rng = rng or random.Random()
+    extreme = 0
+    for _ in range(permutations):
+        bits = rng.getrandbits(len(differences))
+        total = sum(-d if bits >> i & 1 else d for i, d in enumerate(differences))
+        if abs(total) >= threshold:
+            extreme += 1
+    return (extreme + 1) / (permutations + 1)
+
+
+def min_rounds(significance_level):
+    """Fewest paired rounds whose exact sign-flip test can reach the level.
+
+    With n paired values, the smallest two-sided p-value is 2 / 2**n, when
+    every difference has the same sign.
+    """
+    rounds = 1
+    while 2 / 2**rounds >= significance_level:
+        rounds += 1
+    return rounds
+
+
+class InterleavedScheduler:
+    def __init__(
+        self,
+        partition_manager,
+        query_runner,
+        rounds=5,
+        max_materialized=4,
+        significance_level=0.05,
+        permutations=10000,
+        seed=None,
+    ):
+        """Compares layouts by interleaving their measurements.
+
+        Measuring each layout right after building it favors later
+        candidates, which run with warmer HDFS, OS and JVM caches. Instead,
+        up to `max_materialized` layouts are kept as copies of the table at
+        the same time, and every round runs the workload once against each
+        of them, in a new random order. The copies are read through
+        rewritten queries (see `QueryRunner.run`), so the table itself is
+        not repartitioned until the winner is known.
+
+        A layout only replaces the current best one if a paired sign-flip
+        permutation test finds it significantly faster. Otherwise the
+        current best layout, initially the first candidate, is kept. For
+        the weighted_total objective, the test pairs the weighted per-query
+        times of each round. The other objectives are not sums over queries,
+        so the test pairs the objective values of the rounds, which needs at
+        least `min_rounds(significance_level)` rounds.
+
+        Args:
+            partition_manager: PartitionManager of the tables
+            query_runner: QueryRunner used to run the queries
+            rounds: Number of passes over each layout per batch
+            max_materialized: Maximum number of layouts materialized at once,
+                including the current best one
+            significance_level: p-value below which a layout is declared
+                faster
+            permutations: Number of random sign assignments of the test
+            seed: Optional seed of the measurement order and the test
+        """
+        if max_materialized < 2:
+            raise ValueError("max_materialized must be at least 2")
+        self.per_query = partition_manager.objective == "weighted_total"
+        if not self.per_query and rounds < min_rounds(significance_level):
+            raise ValueError(
+                f"The {partition_manager.objective} objective is tested on the "
+                f"objective values of the rounds and needs at least "
+                f"{min_rounds(significance_level)} rounds at a significance level "
+                f"of {significance_level}"
+            )
+        self.partition_manager = partition_manager
+        self.query_runner = query_runner
+        self.rounds = rounds
+        self.max_materialized = max_materialized
+        self.significance_level = significance_level
+        self.permutations = permutations
+        self.rng = random.Random(seed)
+        self._copies = 0
+
+    def _materialize(self, table_name, layout):
+        """Give the layout a table to read, copying the data if needed."""
+        table = self.partition_manager.tables[table_name]
+        if not layout["columns"] and not table.partition and not table.bucket_columns:
+            # The table itself already has the baseline layout
+            layout["name"] = table_name
+            layout["materialize_seconds"] = 0.0
+            return
+        self._copies += 1
+        copy, seconds = self.partition_manager.materialize(
+            table_name, layout["columns"], f"{table_name}_layout_{self._copies}"
+        )
+        layout["name"] = copy.name
+        layout["table"] = copy
+        layout["materialize_seconds"] = seconds
+
+    def _drop(self, table_name, layout):
+        if layout.get("name") not in (None, table_name):
+            self.partition_manager.cursor.execute(
+                f"DROP TABLE IF EXISTS {layout['name']}"
+            )
+        layout["name"] = None
+
+    def _measure(self, table_name, batch):
+        """Run the rounds of a batch, each in a new random order."""
+        for layout in batch:
+            layout["samples"] = []
+        for round_number in range(self.rounds):
+            order = [layout for layout in batch if not layout.get("failed")]
+            self.rng.shuffle(order)
+            print(
+                f"Round {round_number + 1}/{self.rounds}: "
+                + ", ".join(str(layout["columns"]) for layout in order)
+            )
+            for layout in order:
+                rename = None
+                if layout["name"] != table_name:
+                    rename = {table_name: layout["name"]}
+                with tracer.span(
+                    "interleaved.pass",
+                    table=table_name,
+                    partition_columns=layout["columns"],
+                    round=round_number,
+                ):
+                    exec_time = self.query_runner.run(table_name, rename=rename)
+                if exec_time == float("inf"):
+                    layout["failed"] = self.query_runner.last_prune_reason
+                    continue
+                query_times = list(self.query_runner.last_query_times)
+                sample = (
+                    round_number,
+                    exec_time,
+                    self.partition_manager.score(query_times),
+                    query_times,
+                )
+                layout["samples"].append(sample)
+                # Passes of all batches, for the results
+                layout.setdefault("history", []).append(sample)
+
+    def _mean_score(self, layout, key="samples"):
+        scores = [score for _, _, score, _ in layout[key]]
+        return sum(scores) / len(scores)
+
+    def _p_value(self, layout_a, layout_b):
+        """Test whether two layouts of a batch differ, pairing passes by round.
+
+        The pairs are the weighted per-query times for the weighted_total
+        objective and the rounds' objective values otherwise, so the test
+        checks the quantity the layouts are ranked by.
+        """
+        passes_b = {sample[0]: sample for sample in layout_b["samples"]}
+        differences = []
+        for round_number, _, score, query_times in layout_a["samples"]:
+            if round_number not in passes_b:
+                continue
+            if self.per_query:
+                differences.extend(
+                    paired_differences(query_times, passes_b[round_number][3])
+                )
+            else:
+                differences.append(score - passes_b[round_number][2])
+        return sign_flip_test(differences, self.permutations, self.rng)
+
+    def _decide(self, champion, batch):
+        """Return the batch's best layout, and compare the others against it."""
+        live = [layout for layout in batch if not layout.get("failed")]
+        if not live:
+            return champion
+        leader = min(live, key=self._mean_score)
+        if champion.get("failed"):
+            champion = leader
+        elif leader is not champion:
+            p_value = self._p_value(leader, champion)
+            if p_value < self.significance_level:
+                print(
+                    f"{leader['columns']} is faster than {champion['columns']} "
+                    f"(p = {p_value:.4f})."
+                )
+                leader["p_value"] = p_value
+                leader["compared_with"] = champion["columns"]
+                champion = leader
+            else:
+                print(
+                    f"{leader['columns']} is not significantly faster than "
+                    f"{champion['columns']} (p = {p_value:.4f}), keeping the latter."
+                )
+
+        for layout in live:
+            if layout is not champion:
+                layout["p_value"] = self._p_value(layout, champion)
+                layout["compared_with"] = champion["columns"]
+        return champion
+
+    def _result(self, layout):
+        """Convert a layout to a result tuple of the PartitionManager algorithms."""
+        details = {
+            "interleaved": True,
+            "repartition_seconds": layout.get("materialize_seconds"),
+        }
+        for key in ("p_value", "compared_with"):
+            if key in layout:
+                details[key] = layout[key]
+        if layout.get("failed") or not layout.get("history"):
+            details["pruned"] = True
+            details["prune_reason"] = layout.get("failed")
+            return (layout["columns"], float("inf"), layout["product"], details)
+
+        samples = layout["history"]
+        details["rounds"] = len(samples)
+        details["round_times"] = [exec_time for _, exec_time, _, _ in samples]
+        details["round_scores"] = [score for _, _, score, _ in samples]
+        details["total_time"] = sum(details["round_times"]) / len(samples)
+        # Mean times of each query over the rounds
+        details["query_times"] = []
+        for entries in zip(*(query_times for _, _, _, query_times in samples)):
+            entry = dict(entries[0])
+            for key in ("seconds", "cold_seconds", "warm_seconds"):
+                if entry.get(key) is not None:
+                    entry[key] = sum(other[key] for other in entries) / len(entries)
+            details["query_times"].append(entry)
+        details.update(cache_totals(details["query_times"]))
+        return (
+            layout["columns"],
+            self._mean_score(layout, "history"),
+            layout["product"],
+            details,
+        )
+
+    def run(self, table_name, candidates):
+        """Compare candidate layouts of a table and apply the best one.
+
+        The first candidate, normally the unpartitioned baseline, is the
+        initial best layout. The other candidates are compared against the
+        current best layout in batches of up to `max_materialized`
+        layouts. Copies are dropped once their batch is over, except the
+        best layout's, which finally replaces the table.
+
+        Args:
+            table_name: Name of the table
+            candidates: Layouts as lists of partition columns
+
+        Returns:
+            list: (partition columns, mean objective value, cardinality
+                product, details) tuples, the declared best layout first and
+                the others sorted by objective value. Details hold the
+                per-round times and scores, the mean per-query times, and the
+                p-value of the comparison with the layout named in
+                "compared_with". The best layout is marked "declared_best",
+                unless every layout failed, in which case the table is left
+                as it is.
+        """
+        partition_manager = self.partition_manager
+        results = []
+        layouts = []
+        for columns in candidates:
+            product = 1
+            if columns:
+                valid, product = partition_manager.check_repartition_cardinality(
+                    columns, table_name
+                )
+                if not valid:
+                    print(
+                        f"Repartitioning {table_name} by {columns} exceeds max partitions."
+                    )
+                    results.append((list(columns), float("inf"), product, {}))
+                    continue
+            layouts.append({"columns": list(columns), "product": product})
+        if not layouts:
+            return results
+
+        champion = layouts[0]
+        pending = layouts[1:]
+        try:
+            self._materialize(table_name, champion)
+            while True:
+                batch = [champion] + pending[: self.max_materialized - 1]
+                pending = pending[self.max_materialized - 1 :]
+                for layout in batch[1:]:
+                    self._materialize(table_name, layout)
+                self._measure(table_name, batch)
+                champion = self._decide(champion, batch)
+                for layout in batch:
+                    if layout is not champion:
+                        self._drop(table_name, layout)
+                if not pending:
+                    break
+
+            if champion.get("failed"):
+                # Every layout failed; leave the table as it is
+                print(f"No layout of {table_name} could be measured.")
+            elif champion["name"] != table_name:
+                print(f"Applying {champion['columns']} to {table_name}...")
+                partition_manager.tables[table_name].replace_with(
+                    partition_manager.cursor, champion["table"]
+                )
+                champion["name"] = table_name
+        finally:
+            for layout in layouts:
+                self._drop(table_name, layout)
+
+        if champion.get("failed"):
+            others = [self._result(layout) for layout in layouts]
+            return sorted(results + others, key=lambda x: x[1])
+        best = self._result(champion)
+        best[3]["declared_best"] = True
+        others = [self._result(layout) for layout in layouts if layout is not champion]
+        return [best] + sorted(results + others, key=lambda x: x[1])
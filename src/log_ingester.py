@@ -0,0 +1,471 @@
+# log_ingester.py
+import argparse
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from query_index import QueryIndex, analyze_query
+from query_runner import normalize_query
+
+# HiveServer2 log lines start with a timestamp such as 2024-03-01T12:00:00,123
+HS2_LINE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[,.]\d+)?)")
+# HiveServer2 logs each statement it compiles. The statement continues on the
+# following lines up to the next timestamped line.
+HS2_COMMAND_PATTERN = re.compile(r"Executing command\(queryId=[^)]*\):\s*(.*)$")
+
+# Only queries are part of the workload, not DDL, SET or LOAD statements
+QUERY_PATTERN = re.compile(r"^\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+
+
+def parse_timestamp(value):
+    """Convert epoch seconds or an ISO 8601 string to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # Epoch milliseconds
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(
+            str(value).replace(",", ".").replace("Z", "+00:00")
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+class TemplateWindow:
+    def __init__(self, window_seconds=86400, bucket_seconds=3600, max_templates=10000):
+        """Sliding-window frequencies of query templates with bounded memory.
+
+        Counts are kept per time bucket and buckets older than the window are
+        dropped. At most `max_templates` templates are kept, each with its
+        most recent query as an executable example; beyond that, the least
+        frequent templates are evicted, except the ones seen in the newest
+        bucket.
+
+        Args:
+            window_seconds: Length of the window, in seconds of log time
+            bucket_seconds: Granularity the window slides by
+            max_templates: Maximum number of templates kept
+        """
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.max_templates = max_templates
+        # {bucket start: {template: count}}, oldest first
+        self.buckets = {}
+        # {template: most recent query of the template}
+        self.examples = {}
+        self.latest = None
+
+    def add(self, query, timestamp):
+        template = normalize_query(query)
+        bucket = int(timestamp // self.bucket_seconds * self.bucket_seconds)
+        counts = self.buckets.setdefault(bucket, {})
+        counts[template] = counts.get(template, 0) + 1
+        self.examples[template] = query
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+            self._expire()
+        if len(self.examples) > self.max_templates:
+            self._evict()
+
+    def _expire(self):
+        """Drop buckets that slid out of the window, and their templates."""
+        horizon = self.latest - self.window_seconds
+        expired = [
+            bucket for bucket in self.buckets if bucket + self.bucket_seconds <= horizon
+        ]
+        if not expired:
+            return
+        for bucket in expired:
+            del self.buckets[bucket]
+        counts = self.counts()
+        for template in list(self.examples):
+            if template not in counts:
+                del self.examples[template]
+
+    def _evict(self):
+        """Evict the least frequent templates down to 90% of the limit.
+
+        Templates seen in the newest bucket are evicted last, and ties go to
+        the template seen least recently. Otherwise a template that just
+        appeared, with a count of 1, would always be evicted first and a
+        rising template could never enter the window. Evicting in batches
+        keeps the cost of the scan over all templates rare.
+        """
+        counts = self.counts()
+        last_seen = {}
+        for bucket, bucket_counts in self.buckets.items():
+            for template in bucket_counts:
+                last_seen[template] = max(bucket, last_seen.get(template, bucket))
+        newest = max(self.buckets, default=None)
+        keep = int(self.max_templates * 0.9)
+        ranked = sorted(
+            self.examples,
+            key=lambda template: (
+                last_seen.get(template) == newest,
+                counts.get(template, 0),
+                last_seen.get(template, float("-inf")),
+            ),
+        )
+        for template in ranked[: len(ranked) - keep]:
+            del self.examples[template]
+            for bucket_counts in self.buckets.values():
+                bucket_counts.pop(template, None)
+
+    def counts(self):
+        """Return the number of occurrences of each template in the window."""
+        totals = {}
+        for bucket_counts in self.buckets.values():
+            for template, count in bucket_counts.items():
+                totals[template] = totals.get(template, 0) + count
+        return totals
+
+    def to_dict(self):
+        return {
+            "buckets": {str(bucket): counts for bucket, counts in self.buckets.items()},
+            "examples": self.examples,
+            "latest": self.latest,
+        }
+
+    def load(self, data):
+        self.buckets = {
+            int(bucket): counts for bucket, counts in data["buckets"].items()
+        }
+        self.examples = data["examples"]
+        self.latest = data["latest"]
+
+
+class LogIngester:
+    def __init__(
+        self,
+        path,
+        log_format="jsonl",
+        state_path=None,
+        schema=None,
+        window=None,
+        query_field="query",
+        time_field="timestamp",
+        max_statement_chars=1000000,
+    ):
+        """Builds the workload from a query log, reading it incrementally.
+
+        Every call to `ingest` continues at the offset where the previous one
+        stopped, and only complete lines are consumed. The offset, the
+        template window and a statement still being continued are kept in
+        `state_path`, so the ingester can also resume after a restart. A log
+        that was rotated or truncated is read again from the start.
+
+        Args:
+            path: The log file
+            log_format: "jsonl" for an audit log with one JSON object per
+                query, or "hs2" for a HiveServer2 log
+            state_path: Optional JSON file to persist the ingestion state in
+            schema: Table schemas, as in schema.json. Queries that read none
+                of the tables are ignored.
+            window: TemplateWindow holding the frequencies
+            query_field: Key of the query text in JSONL records
+            time_field: Key of the timestamp in JSONL records
+            max_statement_chars: HiveServer2 statements longer than this are
+                dropped instead of buffered until they end
+        """
+        if log_format not in ("jsonl", "hs2"):
+            raise ValueError(f"Unknown log format {log_format}. Available: jsonl, hs2")
+        self.path = path
+        self.log_format = log_format
+        self.state_path = state_path
+        self.schema = schema
+        # Only used for its normalized schema: caching the analysis of every
+        # logged query would grow with the log
+        self.index = QueryIndex(schema)
+        self.window = window or TemplateWindow()
+        self.query_field = query_field
+        self.time_field = time_field
+        self.max_statement_chars = max_statement_chars
+        self.offset = 0
+        self.inode = None
+        # HiveServer2 statement whose continuation lines may follow, as
+        # [timestamp, text]
+        self.pending = None
+
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "r") as file:
+                state = json.load(file)
+            self.offset = state["offset"]
+            self.inode = state["inode"]
+            self.pending = state["pending"]
+            self.window.load(state["window"])
+
+    def save(self):
+        """Write the ingestion state, if a state file is configured."""
+        if not self.state_path:
+            return
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(
+                {
+                    "offset": self.offset,
+                    "inode": self.inode,
+                    "pending": self.pending,
+                    "window": self.window.to_dict(),
+                },
+                file,
+            )
+        os.replace(temp_path, self.state_path)
+
+    def _tables(self, info):
+        """Return the tables of an analysis that are in the schema."""
+        if self.schema is None:
+            return info["tables"]
+        return [table for table in info["tables"] if table in self.index.schema]
+
+    def _add(self, query, timestamp):
+        """Count a statement if it is a query reading known tables."""
+        query = " ".join(query.split()).rstrip(";")
+        if not QUERY_PATTERN.match(query):
+            return False
+        if not self._tables(analyze_query(query, self.index.schema)):
+            return False
+        self.window.add(query, timestamp if timestamp is not None else time.time())
+        return True
+
+    def _flush_pending(self):
+        added = False
+        if self.pending is not None:
+            added = self._add(self.pending[1], self.pending[0])
+            self.pending = None
+        return added
+
+    def _read_line(self, line):
+        """Process one log line and return whether a query was counted."""
+        if self.log_format == "jsonl":
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                return False
+            if not isinstance(record, dict) or not record.get(self.query_field):
+                return False
+            return self._add(
+                record[self.query_field], parse_timestamp(record.get(self.time_field))
+            )
+
+        timestamp = HS2_LINE_PATTERN.match(line)
+        if timestamp is None:
+            # Continuation of a multi-line statement
+            if self.pending is not None:
+                self.pending[1] += "\n" + line
+                if len(self.pending[1]) > self.max_statement_chars:
+                    print(
+                        f"Dropping a statement longer than {self.max_statement_chars} "
+                        f"characters at offset {self.offset}."
+                    )
+                    # Its remaining lines are ignored like any other
+                    # continuation without a statement
+                    self.pending = None
+            return False
+        added = self._flush_pending()
+        command = HS2_COMMAND_PATTERN.search(line)
+        if command:
+            self.pending = [parse_timestamp(timestamp.group(1)), command.group(1)]
+        return added
+
+    def ingest(self, max_lines=None):
+        """Read the log from the last offset to its end.
+
+        Args:
+            max_lines: Optional number of lines after which to stop, e.g. to
+                save the state periodically on very large logs
+
+        Returns:
+            int: Number of queries counted
+        """
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # New, rotated or truncated log
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.pending = None
+
+        added = 0
+        lines = 0
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            for raw_line in file:
+                if not raw_line.endswith(b"\n"):
+                    # Incomplete line still being written
+                    break
+                self.offset += len(raw_line)
+                added += self._read_line(
+                    raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+                )
+                lines += 1
+                if max_lines is not None and lines >= max_lines:
+                    break
+        return added
+
+    def workload(self):
+        """Return the workload of the window as (tables, analysis, query spec).
+
+        Each template is represented by its most recent query, with a weight
+        proportional to its frequency in the window and scaled so the
+        weights average 1, like generated workloads.
+        """
+        counts = self.window.counts()
+        if not counts:
+            return []
+        mean = sum(counts.values()) / len(counts)
+        workload = []
+        for template, count in sorted(counts.items(), key=lambda item: -item[1]):
+            query = self.window.examples[template]
+            info = analyze_query(query, self.index.schema)
+            workload.append(
+                (self._tables(info), info, {"query": query, "weight": count / mean})
+            )
+        return workload
+
+    def column_frequencies(self, workload):
+        """Count the weighted uses of each column in WHERE and GROUP BY clauses."""
+        frequencies = {
+            table_name: {col: 0.0 for col in columns}
+            for table_name, columns in (self.index.schema or {}).items()
+        }
+        for tables, info, spec in workload:
+            for table_name in tables:
+                frequencies.setdefault(table_name, {})
+                used = set(info["filter_columns"].get(table_name, []))
+                used |= set(info["group_columns"].get(table_name, []))
+                for col in used:
+                    frequencies[table_name][col] = (
+                        frequencies[table_name].get(col, 0.0) + spec["weight"]
+                    )
+        return {
+            table_name: dict(
+                sorted(
+                    ((col, round(count, 3)) for col, count in columns.items()),
+                    key=lambda item: -item[1],
+                )
+            )
+            for table_name, columns in frequencies.items()
+        }
+
+    def write(self, output_dir):
+        """Write the workload in the format of src/queries.
+
+        Every query goes to the file of each table it reads and to all.json;
+        column_freq_dict.json is written next to them. Files are replaced
+        atomically, so a running optimizer never reads a partial file.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        workload = self.workload()
+        files = {table_name: [] for table_name in self.index.schema or {}}
+        for tables, _, spec in workload:
+            for table_name in tables:
+                files.setdefault(table_name, []).append(spec)
+        files["all"] = [spec for _, _, spec in workload]
+        files["column_freq_dict"] = self.column_frequencies(workload)
+
+        for name, content in files.items():
+            path = os.path.join(output_dir, f"{name}.json")
+            with open(f"{path}.tmp", "w") as file:
+                json.dump(content, file, indent=4)
+            os.replace(f"{path}.tmp", path)
+        return workload
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the workload files from a HiveServer2 or JSONL query log"
+    )
+    parser.add_argument("log", type=str, help="Log file to read")
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=["jsonl", "hs2"],
+        default="jsonl",
+        help="jsonl: one JSON object per query; hs2: HiveServer2 log",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=os.path.join("src", "queries", "ingested"),
+        help="Directory the workload files are written to (use with testbench --queries_dir)",
+    )
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help="State file to resume from (default: <output_dir>/ingester_state.json)",
+    )
+    parser.add_argument(
+        "--window", type=float, default=86400, help="Sliding window in seconds"
+    )
+    parser.add_argument(
+        "--bucket", type=float, default=3600, help="Window granularity in seconds"
+    )
+    parser.add_argument(
+        "--max_templates",
+        type=int,
+        default=10000,
+        help="Maximum number of query templates kept",
+    )
+    parser.add_argument(
+        "--query_field", type=str, default="query", help="Query key of JSONL records"
+    )
+    parser.add_argument(
+        "--time_field",
+        type=str,
+        default="timestamp",
+        help="Timestamp key of JSONL records (epoch seconds, milliseconds or ISO 8601)",
+    )
+    parser.add_argument(
+        "--max_statement_chars",
+        type=int,
+        default=1000000,
+        help="Drop HiveServer2 statements longer than this many characters",
+    )
+    parser.add_argument(
+        "--follow",
+        type=float,
+        default=None,
+        help="Keep tailing the log, checking for new lines every this many seconds",
+    )
+    parser.add_argument(
+        "--batch_lines",
+        type=int,
+        default=100000,
+        help="Save the state and rewrite the workload after this many lines",
+    )
+
+    args = parser.parse_args()
+
+    with open(os.path.join(os.getcwd(), "src", "schema.json"), "r") as file:
+        schema = json.load(file)
+    state_path = args.state or os.path.join(args.output_dir, "ingester_state.json")
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    ingester = LogIngester(
+        args.log,
+        log_format=args.format,
+        state_path=state_path,
+        schema=schema,
+        window=TemplateWindow(args.window, args.bucket, args.max_templates),
+        query_field=args.query_field,
+        time_field=args.time_field,
+        max_statement_chars=args.max_statement_chars,
+    )
+
+    while True:
+        start_offset = ingester.offset
+        added = ingester.ingest(args.batch_lines)
+        if ingester.offset != start_offset:
+            workload = ingester.write(args.output_dir)
+            ingester.save()
+            print(
+                f"Counted {added} queries up to offset {ingester.offset}; "
+                f"{len(workload)} templates in the window."
+            )
+            # More lines may be waiting
+            continue
+        if args.follow is None:
+            break
+        time.sleep(args.follow)
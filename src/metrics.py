@@ -0,0 +1,218 @@
+# metrics.py
+import math
+import os
+import threading
+
+# Query latency buckets in seconds, from sub-second lookups to full scans
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Repartitioning rewrites the whole table, so its buckets start higher
+REPARTITION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help_text = help_text
+        self._lock = lock
+        self._values = {}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    def samples(self):
+        """Return (name, labels, value) tuples in exposition order."""
+        return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Add a non-negative amount to the counter for the given labels."""
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        """Set the gauge for the given labels."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, lock, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, lock)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """Record one observation for the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total) in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, counts):
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        key + (("le", _format_value(bound)),),
+                        count,
+                    )
+                )
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, counts[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        """Collection of metrics rendered in the Prometheus text format."""
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, help_text, **kwargs):
+        if name in self._metrics:
+            metric = self._metrics[name]
+            if not isinstance(metric, cls):
+                raise ValueError(
+                    f"Metric {name} is already registered as a {metric.type_name}"
+                )
+            return metric
+        metric = cls(name, help_text, self._lock, **kwargs)
+        self._metrics[name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} {metric.type_name}")
+                for sample_name, labels, value in metric.samples():
+                    lines.append(
+                        f"{sample_name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically write the metrics to a textfile.
+
+        The file is written next to its destination and renamed over it, so
+        a scraper such as the node exporter's textfile collector never sees
+        a partially written file.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(self.render())
+        os.replace(temp_path, path)
+
+
+class Flusher(threading.Thread):
+    def __init__(self, registry, path, interval=15.0):
+        """Background thread writing the registry to `path` every `interval` seconds.
+
+        Call `stop` at the end of the run to write the final values.
+        """
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.registry.write(self.path)
+            except OSError as e:
+                print(f"Warning: Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        """Stop flushing and write the metrics one last time."""
+        self._stopped.set()
+        self.join()
+        self.registry.write(self.path)
+
+
+# Process-wide registry and the optimizer's metrics
+registry = Registry()
+
+queries_executed = registry.counter(
+    "hive_optimizer_queries_total",
+    "Queries executed, by outcome (finished or cancelled)",
+)
+query_latency = registry.histogram(
+    "hive_optimizer_query_latency_seconds",
+    "Latency of individual workload queries",
+)
+repartition_duration = registry.histogram(
+    "hive_optimizer_repartition_seconds",
+    "Time taken to repartition a table",
+    buckets=REPARTITION_BUCKETS,
+)
+bytes_loaded = registry.counter(
+    "hive_optimizer_loaded_bytes_total",
+    "Bytes of CSV data loaded into Hive, by table",
+)
+load_throughput = registry.gauge(
+    "hive_optimizer_load_throughput_bytes_per_second",
+    "Throughput of the most recent data load, by table",
+)
+candidates_measured = registry.counter(
+    "hive_optimizer_candidates_total",
+    "Candidate layouts measured, by table",
+)
+candidates_pruned = registry.counter(
+    "hive_optimizer_candidates_pruned_total",
+    "Candidate layouts pruned without a full timing, by table and reason",
+)
+best_time = registry.gauge(
+    "hive_optimizer_best_time_seconds",
+    "Best total workload time measured so far, by table",
+)
@@ -1,14 +1,140 @@
 # parition_manager.py
 from table import Table
+import itertools
 import time
+from tracing import tracer
+from interleaved import InterleavedScheduler
+from query_runner import cache_totals
+from session_params import (
+    PARAMETER_SPACE,
+    apply_settings,
+    changed_settings,
+    default_settings,
+)
+import metrics
+
+# Objectives candidates can be ranked by. All of them use the per-query
+# weights of the workload; lower is better.
+OBJECTIVES = ("weighted_total", "weighted_p95", "slo_violations")
+
+
+def weighted_percentile(values, weights, percentile):
+    """Return the smallest value covering `percentile` percent of the weight."""
+    pairs = sorted(zip(values, weights))
+    total_weight = sum(weights)
+    if not pairs or total_weight <= 0:
+        return 0.0
+
+    threshold = total_weight * percentile / 100
+    cumulative = 0.0
+    for value, weight in pairs:
+        cumulative += weight
+        if cumulative >= threshold:
+            return value
+    return pairs[-1][0]
 
 
 class PartitionManager:
-    def __init__(self, tables, cursor, column_freq_dict, MAX_PARTITION_PRODUCT=1000):
+    def __init__(
+        self,
+        tables,
+        cursor,
+        column_freq_dict,
+        MAX_PARTITION_PRODUCT=1000,
+        bucket_counts=(8, 32),
+        sort_buckets=False,
+        objective="weighted_total",
+        prune_factor=None,
+        explain_filter=False,
+        target_rows_per_partition=None,
+        target_bytes_per_partition=None,
+        min_partitions=1,
+        max_partitions=None,
+        interleaved_rounds=None,
+        max_materialized=4,
+        significance_level=0.05,
+    ):
         self.tables = tables
         self.cursor = cursor
         self.column_freq_dict = column_freq_dict
+        # Partition limit of every table, unless a target size per partition
+        # is given (see `partition_limit`)
         self.MAX_PARTITION_PRODUCT = MAX_PARTITION_PRODUCT
+        self.target_rows_per_partition = target_rows_per_partition
+        self.target_bytes_per_partition = target_bytes_per_partition
+        self.min_partitions = min_partitions
+        self.max_partitions = max_partitions
+        # Bucket counts tried for each bucket column, and whether buckets
+        # are also sorted by the bucket column (SORTED BY)
+        self.bucket_counts = list(bucket_counts)
+        self.sort_buckets = sort_buckets
+        if objective not in OBJECTIVES:
+            raise ValueError(
+                f"Unknown objective {objective}. Available: {', '.join(OBJECTIVES)}"
+            )
+        self.objective = objective
+        # Candidates are cancelled once their running time exceeds the best
+        # time measured so far times this factor (None disables pruning)
+        self.prune_factor = prune_factor
+        self.best_times = {}
+        # Inspect query plans after each repartition and skip timing layouts
+        # that no query can prune partitions of
+        self.explain_filter = explain_filter
+        # Compare Algorithm 1's candidates with this many interleaved rounds
+        # instead of one pass each (see interleaved.py)
+        self.interleaved_rounds = interleaved_rounds
+        self.max_materialized = max_materialized
+        self.significance_level = significance_level
+
+    def score(self, query_times):
+        """Compute the configured objective from per-query timings.
+
+        - weighted_total: sum of query time times query weight
+        - weighted_p95: weighted 95th percentile of query latency
+        - slo_violations: number of queries slower than their SLO target,
+          each counted with its weight. Ties, e.g. for a workload without
+          SLO targets, are broken by the weighted total time, scaled into
+          [0, 1) so it never outweighs a violation.
+        """
+        times = [entry["seconds"] for entry in query_times]
+        weights = [entry.get("weight", 1.0) for entry in query_times]
+        weighted_total = sum(t * w for t, w in zip(times, weights))
+
+        if self.objective == "weighted_p95":
+            return weighted_percentile(times, weights, 95)
+        if self.objective == "slo_violations":
+            violations = sum(
+                entry.get("weight", 1.0)
+                for entry in query_times
+                if entry.get("slo_seconds") is not None
+                and entry["seconds"] > entry["slo_seconds"]
+            )
+            return violations + weighted_total / (weighted_total + 1)
+        return weighted_total
+
+    def partition_limit(self, table_name):
+        """Return the maximum number of partitions a layout of the table may have.
+
+        With a target rows or bytes per partition, the limit is the table's
+        row count (or size) divided by the target, the stricter of the two,
+        clamped to [min_partitions, max_partitions]. Small tables thus get
+        few partitions and large ones are not capped at a fixed number.
+        Without a target, or before the table's statistics are known, it is
+        MAX_PARTITION_PRODUCT.
+        """
+        table = self.tables[table_name]
+        limits = []
+        if self.target_rows_per_partition and table.row_count is not None:
+            limits.append(table.row_count / self.target_rows_per_partition)
+        if self.target_bytes_per_partition and table.size_bytes:
+            limits.append(table.size_bytes / self.target_bytes_per_partition)
+        if not limits:
+            return self.MAX_PARTITION_PRODUCT
+
+        limit = max(int(min(limits)), self.min_partitions)
+        if self.max_partitions is not None:
+            limit = min(limit, self.max_partitions)
+        return limit
 
     def check_repartition_cardinality(self, repartition_columns, table_name):
         """Check the cardinality of the repartition columns in the table."""
@@ -20,17 +146,101 @@ class PartitionManager:
             cardinalities.append((col, cardinality))
             product *= cardinality
 
+        limit = self.partition_limit(table_name)
         print(
-            f"Cardinalities for {table_name} and cols {repartition_columns}: {cardinalities}"
+            f"Cardinalities for {table_name} and cols {repartition_columns}: "
+            f"{cardinalities} (limit {limit})"
         )
-        return product <= self.MAX_PARTITION_PRODUCT, product
+        return product <= limit, product
+
+    def dynamic_partition_bound(self, table_name, partition_columns):
+        """Return an upper bound on the partitions a repartition creates.
+
+        Every column contributes its distinct values plus NULL, which Hive
+        writes to a default partition.
+        """
+        table = self.tables[table_name]
+        bound = 1
+        for col in partition_columns:
+            bound *= table.cardinalities.get(col, 0) + 1
+        return bound
+
+    def bucket_spec(self, bucket_columns, num_buckets):
+        """Build a bucket spec dictionary for the given bucket columns."""
+        return {
+            "bucket_columns": list(bucket_columns),
+            "num_buckets": num_buckets,
+            "sorted_by": list(bucket_columns) if self.sort_buckets else [],
+        }
+
+    def bucket_candidates(self, table_name, query_runner):
+        """Return the columns of a table worth bucketing on.
+
+        These are the columns the cardinality gate rejects for partitioning
+        and the columns the table is joined on in all.json.
+        """
+        table = self.tables[table_name]
+        candidates = [
+            col
+            for col in self.column_freq_dict.get(table_name, {})
+            if table.cardinalities.get(col, 0) > self.partition_limit(table_name)
+        ]
+        for key in query_runner.get_join_keys(list(self.tables)):
+            for key_table, key_col in key:
+                if key_table == table_name and key_col not in candidates:
+                    candidates.append(key_col)
+        return candidates
+
+    def _allow_dynamic_partitions(self, table_name, partition_columns):
+        """Set the session's dynamic partition limits to what a layout can create.
+
+        hive.exec.max.dynamic.partitions and its .pernode variant are
+        session-wide settings: they apply to every later statement on the
+        cursor until the next call sets them again.
+        """
+        if partition_columns:
+            bound = self.dynamic_partition_bound(table_name, partition_columns)
+            self.cursor.execute(f"SET hive.exec.max.dynamic.partitions={bound}")
+            self.cursor.execute(f"SET hive.exec.max.dynamic.partitions.pernode={bound}")
+
+    def materialize(self, table_name, partition_columns, copy_name, bucket_spec=None):
+        """Create a copy of a table with another layout, leaving the table as is.
+
+        Returns:
+            tuple: (Table of the copy, time taken in seconds)
+        """
+        table = self.tables[table_name]
+        bucket_spec = bucket_spec or {}
+        print(f"Materializing {table_name} by {partition_columns} as {copy_name}...")
 
-    def repartition(self, table_name, partition_columns):
+        start = time.time()
+        self._allow_dynamic_partitions(table_name, partition_columns)
+        with tracer.span(
+            "partition_manager.materialize",
+            table=table_name,
+            partition_columns=list(partition_columns),
+            **bucket_spec,
+        ):
+            copy = table.copy(
+                self.cursor,
+                copy_name,
+                partition_columns,
+                bucket_columns=bucket_spec.get("bucket_columns"),
+                num_buckets=bucket_spec.get("num_buckets", 0),
+                sorted_by=bucket_spec.get("sorted_by"),
+            )
+        end = time.time()
+        metrics.repartition_duration.observe(end - start, table=table_name)
+        return copy, end - start
+
+    def repartition(self, table_name, partition_columns, bucket_spec=None):
         """Repartition a specific table by the given columns.
 
         Args:
             table_name: Name of the table to repartition
             partition_columns: List of column names to partition by
+            bucket_spec: Optional bucket spec (see `bucket_spec`) to also
+                cluster the table by
 
         Returns:
             float: Time taken to perform the repartitioning in seconds
@@ -39,38 +249,183 @@ class PartitionManager:
             raise ValueError(f"Table {table_name} not found")
 
         table = self.tables[table_name]
-        print(f"Repartitioning {table_name} by {partition_columns}...")
+        bucket_spec = bucket_spec or {}
+        if bucket_spec:
+            print(
+                f"Repartitioning {table_name} by {partition_columns}, bucketed by "
+                f"{bucket_spec['bucket_columns']} into {bucket_spec['num_buckets']} buckets..."
+            )
+        else:
+            print(f"Repartitioning {table_name} by {partition_columns}...")
 
         start = time.time()
-        table.repartition(self.cursor, partition_columns)
+        self._allow_dynamic_partitions(table_name, partition_columns)
+        with tracer.span(
+            "partition_manager.repartition",
+            table=table_name,
+            partition_columns=list(partition_columns),
+            **bucket_spec,
+        ):
+            table.repartition(
+                self.cursor,
+                partition_columns,
+                bucket_columns=bucket_spec.get("bucket_columns"),
+                num_buckets=bucket_spec.get("num_buckets", 0),
+                sorted_by=bucket_spec.get("sorted_by"),
+            )
         end = time.time()
+        metrics.repartition_duration.observe(end - start, table=table_name)
 
         return end - start
 
+    def measure(
+        self, table_name, query_runner, bucket_spec=None, joint_tables=None, rename=None
+    ):
+        """Run the table's queries against its current layout.
+
+        When pruning is enabled, the run is cancelled as soon as it takes
+        longer than `prune_factor` times the best time measured so far for
+        the table, and the candidate is marked as pruned.
+
+        Args:
+            table_name: Name of the table, or the group name in joint mode
+            query_runner: QueryRunner used to run the queries
+            bucket_spec: Bucket spec of the current layout, if bucketed
+            joint_tables: Tables whose joint workload is run instead of the
+                queries of `table_name`
+            rename: Optional {table name: copy name} to run the queries
+                against copies (see `QueryRunner.run`)
+
+        Returns:
+            tuple: (objective value, details) where details holds the bucket
+                spec of the layout, the total execution time under
+                "total_time", the per-query timings under "query_times",
+                execution/fetch totals when results are fetched and "pruned"
+                for cancelled candidates
+        """
+        budget = None
+        if self.prune_factor and table_name in self.best_times:
+            budget = self.best_times[table_name] * self.prune_factor
+
+        with tracer.span("partition_manager.measure", table=table_name) as span:
+            if joint_tables:
+                exec_time = query_runner.run_joint(joint_tables, budget)
+            else:
+                exec_time = query_runner.run(table_name, budget, rename=rename)
+            span["pruned"] = bool(query_runner.last_prune_reason)
+
+        metrics.candidates_measured.inc(table=table_name)
+        details = dict(bucket_spec or {})
+        details["query_times"] = query_runner.last_query_times
+        if query_runner.last_prune_reason:
+            metrics.candidates_pruned.inc(
+                table=table_name, reason=query_runner.last_prune_reason
+            )
+            details["pruned"] = True
+            details["prune_reason"] = query_runner.last_prune_reason
+            return float("inf"), details
+
+        details["total_time"] = exec_time
+        details.update(cache_totals(details["query_times"]))
+        if query_runner.fetch_results:
+            for key in ("execute_seconds", "fetch_seconds", "rows", "bytes"):
+                details[f"total_{key}"] = sum(
+                    entry[key] for entry in details["query_times"]
+                )
+        self.best_times[table_name] = min(
+            exec_time, self.best_times.get(table_name, float("inf"))
+        )
+        metrics.best_time.set(self.best_times[table_name], table=table_name)
+        return self.score(details["query_times"]), details
+
     def attempt_repartition_and_run(
-        self, table_name, repartition_columns, query_runner
+        self, table_name, repartition_columns, query_runner, bucket_spec=None
     ):
-        """Attempt to repartition the table and run the queries."""
+        """Attempt to repartition the table and run the queries.
+
+        Returns:
+            tuple: (objective value, cardinality product, details), see
+                `measure`
+        """
         valid_partition, cardinality_product = self.check_repartition_cardinality(
             repartition_columns, table_name
         )
         if valid_partition:
-            self.repartition(table_name, repartition_columns)
-            return query_runner.run(table_name), cardinality_product
+            repartition_time = self.repartition(
+                table_name, repartition_columns, bucket_spec
+            )
+
+            plan = None
+            if self.explain_filter and repartition_columns:
+                with tracer.span("partition_manager.explain", table=table_name):
+                    plan = query_runner.explain(table_name)
+                if not any(query_plan["pruned"] for query_plan in plan):
+                    print(
+                        f"No query prunes partitions of {table_name} by {repartition_columns}, skipping timing."
+                    )
+                    metrics.candidates_pruned.inc(table=table_name, reason="explain")
+                    details = dict(bucket_spec or {})
+                    details["filtered"] = True
+                    details["plan"] = plan
+                    details["repartition_seconds"] = repartition_time
+                    return float("inf"), cardinality_product, details
+
+            exec_time, details = self.measure(table_name, query_runner, bucket_spec)
+            details["repartition_seconds"] = repartition_time
+            if plan is not None:
+                details["plan"] = plan
+            return exec_time, cardinality_product, details
         else:
             print(
                 f"Repartitioning {table_name} by {repartition_columns} exceeds max partitions."
             )
-            return float("inf"), cardinality_product
+            return float("inf"), cardinality_product, dict(bucket_spec or {})
 
-    def algorithm1(self, table_name, query_runner):
-        """Implement Algorithm 1 for partition column selection."""
+    def attempt_copy_and_run(
+        self, table_name, partition_columns, query_runner, bucket_spec=None
+    ):
+        """Measure a layout on a copy of the table, leaving the table as is.
+
+        The copy is read through rewritten queries and dropped afterwards.
+        Unlike `attempt_repartition_and_run`, the EXPLAIN filter is not
+        applied.
+
+        Returns:
+            tuple: (objective value, cardinality product, details), see
+                `measure`
+        """
+        valid_partition, cardinality_product = self.check_repartition_cardinality(
+            partition_columns, table_name
+        )
+        if not valid_partition:
+            print(
+                f"Repartitioning {table_name} by {partition_columns} exceeds max partitions."
+            )
+            return float("inf"), cardinality_product, dict(bucket_spec or {})
+
+        copy, materialize_time = self.materialize(
+            table_name, partition_columns, f"{table_name}_candidate", bucket_spec
+        )
+        try:
+            exec_time, details = self.measure(
+                table_name, query_runner, bucket_spec, rename={table_name: copy.name}
+            )
+        finally:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {copy.name}")
+        details["repartition_seconds"] = materialize_time
+        return exec_time, cardinality_product, details
+
+    def algorithm1_candidates(self, table_name):
+        """Return the layouts Algorithm 1 tests, as lists of partition columns.
+
+        These are no partitioning followed by every combination of one, two
+        and three of the table's three most frequently used columns. The
+        candidates do not depend on each other's timings, so they can also
+        be measured elsewhere (see coordinator.py).
+        """
         if table_name not in self.tables:
             raise ValueError(f"Table {table_name} not found")
 
-        table = self.tables[table_name]
-        query_execution_times = []
-
         # Get frequencies for this table
         table_frequencies = self.column_freq_dict.get(table_name, {})
 
@@ -82,43 +437,69 @@ class PartitionManager:
         # Get top 3 most frequently used columns
         top_columns = [col for col, _ in sorted_columns[:3]]
 
-        # Test no partition (baseline case)
-        exec_time_no_partition = query_runner.run(
-            table_name
-        )  # Run without any repartitioning
-        query_execution_times.append(
-            ([], exec_time_no_partition, 1)
-        )  # No partition, product = 1 (or can be set as 0)
-
-        # Test single column combinations
-        for col in top_columns:
-            exec_time, cardinality_product = self.attempt_repartition_and_run(
-                table_name, [col], query_runner
-            )
-            query_execution_times.append(([col], exec_time, cardinality_product))
-
-        # Test two column combinations
-        for i in range(len(top_columns)):
-            for j in range(i + 1, len(top_columns)):
-                cols = [top_columns[i], top_columns[j]]
-                exec_time, cardinality_product = self.attempt_repartition_and_run(
-                    table_name, cols, query_runner
-                )
-                query_execution_times.append((cols, exec_time, cardinality_product))
+        candidates = [[]]
+        for size in range(1, len(top_columns) + 1):
+            candidates.extend(
+                list(cols) for cols in itertools.combinations(top_columns, size)
+            )
+        return candidates
+
+    def algorithm1(self, table_name, query_runner):
+        """Implement Algorithm 1 for partition column selection.
+
+        With `interleaved_rounds`, the candidates are materialized side by
+        side and measured in interleaved rounds, and the best one is applied
+        to the table (see `InterleavedScheduler`).
+        """
+        if table_name not in self.tables:
+            raise ValueError(f"Table {table_name} not found")
 
-        # Test three column combination
-        if len(top_columns) >= 3:
-            cols = top_columns[:3]
-            exec_time, cardinality_product = self.attempt_repartition_and_run(
+        if self.interleaved_rounds:
+            scheduler = InterleavedScheduler(
+                self,
+                query_runner,
+                rounds=self.interleaved_rounds,
+                max_materialized=self.max_materialized,
+                significance_level=self.significance_level,
+            )
+            return scheduler.run(table_name, self.algorithm1_candidates(table_name))
+
+        query_execution_times = []
+        # Pruning only compares against candidates of this run
+        self.best_times.pop(table_name, None)
+
+        for cols in self.algorithm1_candidates(table_name):
+            if not cols:
+                # Test no partition (baseline case), without repartitioning
+                exec_time, details = self.measure(table_name, query_runner)
+                query_execution_times.append(([], exec_time, 1, details))
+                continue
+
+            exec_time, cardinality_product, details = self.attempt_repartition_and_run(
                 table_name, cols, query_runner
             )
-            query_execution_times.append((cols, exec_time, cardinality_product))
+            query_execution_times.append(
+                (cols, exec_time, cardinality_product, details)
+            )
 
         # Sort by execution time
         return sorted(query_execution_times, key=lambda x: x[1])
 
-    def algorithm2(self, table_name, query_runner):
-        """Implement Algorithm 2 for partition column selection using a greedy approach."""
+    def algorithm2(
+        self, table_name, query_runner, initial_columns=None, on_copies=False
+    ):
+        """Implement Algorithm 2 for partition column selection using a greedy approach.
+
+        Args:
+            initial_columns: Optional layout to warm-start from, e.g. the best
+                layout of an earlier run. It is measured after the baseline
+                and, if it beats the baseline, the greedy search extends it
+                instead of starting from no partitioning.
+            on_copies: Measure every layout but the table's current one on a
+                copy (see `attempt_copy_and_run`), so the table keeps its
+                layout during the search. The current layout is measured in
+                place.
+        """
         if table_name not in self.tables:
             raise ValueError(f"Table {table_name} not found")
 
@@ -133,18 +514,62 @@ class PartitionManager:
         # Get all columns (without sorting by frequency)
         all_columns = list(table_frequencies.keys())
 
-        # Test no partition (baseline case)
-        exec_time_no_partition = query_runner.run(
-            table_name
-        )  # Run without any repartitioning
+        attempt = self.attempt_repartition_and_run
+        if on_copies:
+            attempt = self.attempt_copy_and_run
+        current_columns = list(table.partition)
+        unbucketed = not table.bucket_columns
+
+        # Test no partition (baseline case). Pruning only compares against
+        # candidates of this run.
+        self.best_times.pop(table_name, None)
+        if on_copies and (current_columns or not unbucketed):
+            exec_time_no_partition, _, details = attempt(table_name, [], query_runner)
+        else:
+            exec_time_no_partition, details = self.measure(
+                table_name, query_runner
+            )  # Run without any repartitioning
         best_exec_time = exec_time_no_partition
         query_execution_times.append(
-            ([], exec_time_no_partition, 1)
+            ([], exec_time_no_partition, 1, details)
         )  # No partition, product = 1
 
         # Iteratively add the best column
         remaining_columns = all_columns.copy()
 
+        # Warm start from the given layout
+        initial_columns = [
+            col
+            for col in initial_columns or []
+            if col in table.columns or col in table.partition
+        ]
+        if (
+            initial_columns
+            and on_copies
+            and unbucketed
+            and initial_columns == current_columns
+        ):
+            # The incumbent layout, measured without rewriting the table
+            _, cardinality_product = self.check_repartition_cardinality(
+                initial_columns, table_name
+            )
+            exec_time, details = self.measure(table_name, query_runner)
+            details["incumbent"] = True
+        elif initial_columns:
+            exec_time, cardinality_product, details = attempt(
+                table_name, initial_columns, query_runner
+            )
+        if initial_columns:
+            query_execution_times.append(
+                (list(initial_columns), exec_time, cardinality_product, details)
+            )
+            if exec_time < best_exec_time:
+                best_columns = list(initial_columns)
+                best_exec_time = exec_time
+                remaining_columns = [
+                    col for col in remaining_columns if col not in best_columns
+                ]
+
         while remaining_columns:
             iteration_best_col = None
             iteration_best_time = float("inf")
@@ -153,13 +578,13 @@ class PartitionManager:
             # Try adding each remaining column to our best set
             for col in remaining_columns:
                 candidate_columns = best_columns + [col]
-                exec_time, cardinality_product = self.attempt_repartition_and_run(
+                exec_time, cardinality_product, details = attempt(
                     table_name, candidate_columns, query_runner
                 )
 
                 # Record all tested combinations
                 query_execution_times.append(
-                    (candidate_columns, exec_time, cardinality_product)
+                    (candidate_columns, exec_time, cardinality_product, details)
                 )
 
                 # Track the best for this iteration
@@ -182,6 +607,355 @@ class PartitionManager:
             # Return all tested combinations, sorted by execution time
         return sorted(query_execution_times, key=lambda x: x[1])
 
+    def algorithm3(self, table_name, query_runner, top_layouts=2):
+        """Implement Algorithm 3: partition column selection plus bucketing.
+
+        First runs Algorithm 1 to rank partition-only layouts. The best
+        `top_layouts` of them (the baseline included) are then combined with
+        every bucket candidate column and bucket count. Bucketing covers the
+        high-cardinality and join key columns that the cardinality gate
+        rejects for partitioning.
+        """
+        if table_name not in self.tables:
+            raise ValueError(f"Table {table_name} not found")
+
+        query_execution_times = self.algorithm1(table_name, query_runner)
+
+        # Best partition-only layouts that could actually be built
+        partition_layouts = [
+            (columns, cardinality_product)
+            for columns, exec_time, cardinality_product, _ in query_execution_times
+            if exec_time != float("inf")
+        ][:top_layouts]
+
+        bucket_columns = self.bucket_candidates(table_name, query_runner)
+        print(f"Bucket candidates for {table_name}: {bucket_columns}")
+
+        for columns, cardinality_product in partition_layouts:
+            for col in bucket_columns:
+                if col in columns:
+                    continue
+                for num_buckets in self.bucket_counts:
+                    bucket_spec = self.bucket_spec([col], num_buckets)
+                    exec_time, cardinality_product, details = (
+                        self.attempt_repartition_and_run(
+                            table_name, columns, query_runner, bucket_spec
+                        )
+                    )
+                    query_execution_times.append(
+                        (columns, exec_time, cardinality_product, details)
+                    )
+
+        # Sort by execution time
+        return sorted(query_execution_times, key=lambda x: x[1])
+
+    def session_search(
+        self,
+        table_name,
+        query_runner,
+        space=None,
+        settings=None,
+        max_measurements=40,
+        min_improvement=0.02,
+    ):
+        """Search session parameters together with the partition columns.
+
+        The best layout often depends on the session (e.g. vectorization or
+        the map-join threshold), so the two are tuned together by coordinate
+        descent, starting from no partitioning and `settings`. Each round
+        first tries the settings that change a single parameter of the best
+        configuration, measured on the current layout, which needs no
+        repartitioning. It then tries the Algorithm 1 candidate layouts
+        with the best settings. Improvements of more than `min_improvement`
+        are adopted as soon as they are found, so noise does not drift the
+        settings, and the search stops when a round finds none or after
+        `max_measurements` measurements.
+
+        Args:
+            table_name: Name of the table
+            query_runner: QueryRunner over the same session as the
+                PartitionManager's cursor
+            space: {parameter: [values]} to search (default:
+                session_params.PARAMETER_SPACE)
+            settings: Starting settings (default: the first value of every
+                parameter)
+            max_measurements: Maximum number of configurations measured,
+                including the baseline
+            min_improvement: Relative improvement of the objective a
+                configuration needs over the best one to replace it
+
+        Returns:
+            list: (partition columns, objective value, cardinality product,
+                details) tuples, the adopted configuration first and the
+                others sorted by objective value. Details hold the
+                configuration's settings under "session" and the parameters
+                differing from the starting settings under "session_changes".
+                The adopted configuration is marked "declared_best"; a
+                faster one within `min_improvement` of it is not adopted.
+                The table and session are left with the adopted layout and
+                settings.
+        """
+        if table_name not in self.tables:
+            raise ValueError(f"Table {table_name} not found")
+
+        space = space or PARAMETER_SPACE
+        start_settings = dict(default_settings(space), **(settings or {}))
+        self.best_times.pop(table_name, None)
+        query_execution_times = []
+        # Configurations tried, and the number actually measured
+        tried = set()
+        measurements = 0
+
+        def evaluate(columns, settings):
+            """Measure a configuration, or return None if it was already tried."""
+            nonlocal measurements
+            key = (
+                tuple(columns),
+                tuple(sorted((name, str(value)) for name, value in settings.items())),
+            )
+            if key in tried:
+                return None
+            tried.add(key)
+            changes = changed_settings(settings, start_settings)
+
+            valid_partition, cardinality_product = self.check_repartition_cardinality(
+                columns, table_name
+            )
+            if not valid_partition:
+                # Rejected without measuring, so it does not use up the budget
+                print(
+                    f"Repartitioning {table_name} by {columns} exceeds max partitions."
+                )
+                query_execution_times.append(
+                    (list(columns), float("inf"), cardinality_product, {})
+                )
+                return None
+
+            print(f"Session: {changes or 'starting settings'}")
+            apply_settings(self.cursor, settings)
+            details = {}
+            table = self.tables[table_name]
+            if list(table.partition) != list(columns) or table.bucket_columns:
+                details["repartition_seconds"] = self.repartition(table_name, columns)
+            exec_time, measure_details = self.measure(table_name, query_runner)
+            details.update(measure_details)
+            details["session"] = dict(settings)
+            details["session_changes"] = changes
+            measurements += 1
+            query_execution_times.append(
+                (list(columns), exec_time, cardinality_product, details)
+            )
+            return exec_time
+
+        # Baseline: no partitioning with the starting settings
+        if self.tables[table_name].partition:
+            self.repartition(table_name, [])
+        best_columns, best_settings = [], start_settings
+        best_value = evaluate(best_columns, best_settings)
+        best_result = query_execution_times[-1]
+
+        def threshold():
+            return best_value * (1 - min_improvement)
+
+        improved = True
+        while improved and measurements < max_measurements:
+            improved = False
+            for name, values in space.items():
+                for value in values:
+                    if measurements >= max_measurements:
+                        break
+                    candidate = dict(best_settings, **{name: value})
+                    objective_value = evaluate(best_columns, candidate)
+                    if objective_value is not None and objective_value < threshold():
+                        best_settings, best_value = candidate, objective_value
+                        best_result = query_execution_times[-1]
+                        improved = True
+
+            for columns in self.algorithm1_candidates(table_name):
+                if measurements >= max_measurements:
+                    break
+                objective_value = evaluate(columns, best_settings)
+                if objective_value is not None and objective_value < threshold():
+                    best_columns, best_value = columns, objective_value
+                    best_result = query_execution_times[-1]
+                    improved = True
+
+        if measurements >= max_measurements:
+            print(
+                f"Session search budget of {max_measurements} measurements exhausted."
+            )
+        changes = changed_settings(best_settings, start_settings)
+        print(
+            f"Best configuration for {table_name}: {best_columns} with "
+            f"{changes or 'the starting settings'}"
+        )
+        apply_settings(self.cursor, best_settings)
+        table = self.tables[table_name]
+        if list(table.partition) != list(best_columns) or table.bucket_columns:
+            self.repartition(table_name, best_columns)
+
+        best_result[3]["declared_best"] = True
+        others = [
+            result for result in query_execution_times if result is not best_result
+        ]
+        return [best_result] + sorted(others, key=lambda x: x[1])
+
+    def joint_algorithm(self, table_names, query_runner, max_candidates=20):
+        """Jointly select partition columns for a group of tables that are joined.
+
+        Every table gets a small set of candidate layouts (no partition, its
+        most frequent columns and its join keys). The combined space is
+        searched in priority order: the baseline, then co-partitioned and
+        co-bucketed layouts where the join partners are partitioned or
+        bucketed on the join key, then the remaining combinations by column
+        frequency. Each layout is measured with the cross-table queries from
+        all.json plus the tables' own queries.
+
+        Args:
+            table_names: Names of the tables to optimize together
+            query_runner: QueryRunner used to measure each layout
+            max_candidates: Maximum number of layouts to measure, including
+                the baseline
+
+        Returns:
+            list: (qualified partition columns, objective value, cardinality
+                product, details) tuples sorted by objective value. Columns
+                are qualified with their table name, e.g. "orders.order_id".
+        """
+        for table_name in table_names:
+            if table_name not in self.tables:
+                raise ValueError(f"Table {table_name} not found")
+
+        group_name = "+".join(table_names)
+        self.best_times.pop(group_name, None)
+
+        # Join keys used between the tables, most frequently joined first
+        key_counts = query_runner.get_join_keys(table_names)
+        sorted_keys = sorted(key_counts.items(), key=lambda x: x[1], reverse=True)
+
+        # Candidate partition columns per table: baseline, top 2 columns and
+        # join keys. A layout maps each table to (partition columns, bucket spec).
+        table_candidates = {}
+        for table_name in table_names:
+            table_frequencies = self.column_freq_dict.get(table_name, {})
+            sorted_columns = sorted(
+                table_frequencies.items(), key=lambda x: x[1], reverse=True
+            )
+            columns = [col for col, _ in sorted_columns[:2]]
+            for key, _ in sorted_keys:
+                for key_table, key_col in key:
+                    if key_table == table_name and key_col not in columns:
+                        columns.append(key_col)
+            table_candidates[table_name] = [([], None)] + [
+                ([col], None) for col in columns
+            ]
+
+        # Co-located layouts: both join partners partitioned on the join key,
+        # or bucketed on it into the same number of buckets
+        co_located = []
+        for ((left, left_col), (right, right_col)), _ in sorted_keys:
+            layout = {table_name: ([], None) for table_name in table_names}
+            layout[left] = ([left_col], None)
+            layout[right] = ([right_col], None)
+            co_located.append(layout)
+            for num_buckets in self.bucket_counts:
+                layout = {table_name: ([], None) for table_name in table_names}
+                layout[left] = ([], self.bucket_spec([left_col], num_buckets))
+                layout[right] = ([], self.bucket_spec([right_col], num_buckets))
+                co_located.append(layout)
+
+        def frequency_score(layout):
+            return sum(
+                self.column_freq_dict.get(table_name, {}).get(col, 0)
+                for table_name, (cols, _) in layout.items()
+                for col in cols
+            )
+
+        other_layouts = [
+            dict(zip(table_names, combination))
+            for combination in itertools.product(
+                *(table_candidates[table_name] for table_name in table_names)
+            )
+        ]
+        other_layouts.sort(key=frequency_score, reverse=True)
+
+        # Baseline first, then co-located layouts, then everything else
+        baseline = {table_name: ([], None) for table_name in table_names}
+        layouts = []
+        for layout in [baseline] + co_located + other_layouts:
+            if layout not in layouts:
+                layouts.append(layout)
+
+        query_execution_times = []
+        candidates_measured = 0
+        for layout in layouts:
+            if candidates_measured >= max_candidates:
+                print(f"Joint search budget of {max_candidates} layouts exhausted.")
+                break
+
+            qualified_columns = [
+                f"{table_name}.{col}"
+                for table_name in table_names
+                for col in layout[table_name][0]
+            ]
+            joint_bucket_spec = {}
+            for table_name in table_names:
+                bucket_spec = layout[table_name][1]
+                if bucket_spec:
+                    joint_bucket_spec.setdefault("bucket_columns", []).extend(
+                        f"{table_name}.{col}" for col in bucket_spec["bucket_columns"]
+                    )
+                    joint_bucket_spec.setdefault("sorted_by", []).extend(
+                        f"{table_name}.{col}" for col in bucket_spec["sorted_by"]
+                    )
+                    joint_bucket_spec["num_buckets"] = bucket_spec["num_buckets"]
+
+            # Check the partition limit of every table before repartitioning
+            cardinality_product = 1
+            valid_layout = True
+            for table_name, (cols, _) in layout.items():
+                if not cols:
+                    continue
+                valid_partition, product = self.check_repartition_cardinality(
+                    cols, table_name
+                )
+                valid_layout = valid_layout and valid_partition
+                cardinality_product *= product
+
+            if not valid_layout:
+                print(f"Joint layout {qualified_columns} exceeds max partitions.")
+                query_execution_times.append(
+                    (
+                        qualified_columns,
+                        float("inf"),
+                        cardinality_product,
+                        joint_bucket_spec,
+                    )
+                )
+                continue
+
+            # Only rebuild the tables whose layout actually changes
+            repartition_time = 0.0
+            for table_name, (cols, bucket_spec) in layout.items():
+                table = self.tables[table_name]
+                bucket_spec = bucket_spec or {}
+                if sorted(table.partition.keys()) != sorted(cols) or (
+                    table.bucket_columns != bucket_spec.get("bucket_columns", [])
+                    or table.num_buckets != bucket_spec.get("num_buckets", 0)
+                ):
+                    repartition_time += self.repartition(table_name, cols, bucket_spec)
+
+            exec_time, details = self.measure(
+                group_name, query_runner, joint_bucket_spec, joint_tables=table_names
+            )
+            details["repartition_seconds"] = repartition_time
+            candidates_measured += 1
+            query_execution_times.append(
+                (qualified_columns, exec_time, cardinality_product, details)
+            )
+
+        return sorted(query_execution_times, key=lambda x: x[1])
+
     # def algorithm2(self, table_name, query_runner):
     #     if table_name not in self.tables:
     #         raise ValueError(f"Table {table_name} not found")
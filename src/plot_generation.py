@@ -1,14 +1,25 @@
 import os
 import json
+import hashlib
+import inspect
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
+import matplotlib
+
+# Figures are only saved to files, also from worker processes
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
+from results_store import ResultsStore, DEFAULT_RESULTS_DB
 
 
 sizes = [1, 2, 4, 20]
 algorithms = [1, 2]
 
+# Hashes of the inputs of the figures rendered last time
+PLOT_CACHE_FILE = os.path.join("plots", ".plot_cache.json")
+
 
 def load_data_from_directories(
     base_path="saved_algorithm_reports/march_8_reports",
@@ -59,6 +70,7 @@ def load_data_from_directories(
                             )
                             time_diff_percent = result.get("time_difference_percent", 0)
                             cardinality = result.get("cardinality_product", 0)
+                            bucket_columns = result.get("bucket_columns", [])
 
                             # Skip infinite execution times
                             if execution_time == "inf" or execution_time == float(
@@ -73,6 +85,11 @@ def load_data_from_directories(
                                         ",".join(partition_columns)
                                         if partition_columns
                                         else "None"
+                                    )
+                                    + (
+                                        f" | {','.join(bucket_columns)} x{result['num_buckets']}"
+                                        if bucket_columns
+                                        else ""
                                     ),
                                     "execution_time": execution_time,
                                     "time_difference_percent": time_diff_percent,
@@ -90,6 +107,70 @@ def load_data_from_directories(
     return all_data, algorithm_times
 
 
+def load_data_from_store(db_path=DEFAULT_RESULTS_DB, collection=None, since_run_id=None):
+    """
+    Load data from the results store (see results_store.py) instead of
+    parsing report directories. Import saved report directories first with
+    `python src/results_store.py`.
+
+    Args:
+        db_path: Path of the results database
+        collection: Only use runs of this collection, e.g. "march_8_reports"
+        since_run_id: Only use runs added after this run id
+
+    Returns:
+        Same as load_data_from_directories
+    """
+    all_data = {}
+    algorithm_times = {}
+
+    with ResultsStore(db_path) as store:
+        rows = store.results(collection=collection, since_run_id=since_run_id)
+
+    table_data = {}
+    for row in rows:
+        if row["data_size_MiB"] is None or not row["algorithm"].startswith("algorithm_"):
+            continue
+        size = int(row["data_size_MiB"])
+        alg = row["algorithm"][len("algorithm_"):]
+        if size not in sizes or not alg.isdigit() or int(alg) not in algorithms:
+            continue
+        alg = int(alg)
+
+        if row["total_algorithm_time"] is not None:
+            algorithm_times.setdefault(size, {})[alg] = row["total_algorithm_time"]
+
+        # Skip infinite execution times
+        execution_time = row["execution_time_seconds"]
+        if execution_time is None or execution_time == float("inf"):
+            continue
+
+        table_data.setdefault(size, {}).setdefault(alg, []).append(
+            {
+                "table_name": row["table_name"],
+                "partition_columns": (row["partition_columns"] or "None")
+                + (
+                    f" | {row['bucket_columns']} x{row['num_buckets']}"
+                    if row["bucket_columns"]
+                    else ""
+                ),
+                "execution_time": execution_time,
+                "time_difference_percent": row["time_difference_percent"] or 0,
+                "cardinality_product": row["cardinality_product"] or 0,
+                "column_count": row["column_count"],
+            }
+        )
+
+    for size in sizes:
+        algorithm_times.setdefault(size, {})
+        if size in table_data:
+            all_data[size] = {
+                alg: pd.DataFrame(rows) for alg, rows in table_data[size].items()
+            }
+
+    return all_data, algorithm_times
+
+
 def plot_best_speedup_by_size(data_dict):
     """
     Plot 1: Graph comparing the average percent speedup of the best table for multiple data sizes,
@@ -485,7 +566,7 @@ def plot_algorithm_comparison(data_dict, size=1):
         )
 
     plt.tight_layout()
-    plt.savefig("plots/algorithm_comparison.png", dpi=300, bbox_inches="tight")
+    plt.savefig(f"plots/algorithm_comparison_{size}.png", dpi=300, bbox_inches="tight")
     plt.close()
 
 
@@ -579,7 +660,7 @@ def plot_speedup_vs_cardinality(data_dict, table_name="orders", size=1, algorith
             print(f"Could not calculate trend line: {e}")
 
     plt.tight_layout()
-    save_path = f"plots/speedup_vs_cardinality_{table_name}_{size}gb.png"
+    save_path = f"plots/speedup_vs_cardinality_{table_name}_{size}gb_alg{algorithm}.png"
     plt.savefig(save_path, dpi=300, bbox_inches="tight")
     plt.close()
 
@@ -629,13 +710,162 @@ def create_speedup_heatmap(data_dict, size=1, algorithm=1):
     plt.close()
 
 
+def _canonical(value):
+    """Convert plot input data to a JSON-serializable form for hashing."""
+    if isinstance(value, pd.DataFrame):
+        return value.to_csv(index=False)
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    return value
+
+
+def plot_input_hash(function, data, kwargs):
+    """
+    Hash everything a figure depends on: its input data, its arguments and
+    the source code of the function drawing it.
+
+    Only that function's own source is hashed, not the helpers it calls
+    (such as `_layout_label`) or matplotlib's style. After changing those,
+    re-render with --force.
+    """
+    content = json.dumps(
+        [inspect.getsource(function), _canonical(data), _canonical(kwargs)],
+        sort_keys=True,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def plot_tasks(data_dict, algorithm_times):
+    """
+    List every figure as a (name, function, data, kwargs, output path) task.
+    Each task only gets the part of the data its figure reads, so adding a
+    run only invalidates the figures of that run's size and algorithm. The
+    output paths are the ones the plotting functions save to.
+    """
+    tasks = [
+        (
+            "best speedup by size chart",
+            plot_best_speedup_by_size,
+            data_dict,
+            {},
+            "plots/best_speedup_by_size.png",
+        ),
+        (
+            "execution time by size chart",
+            plot_execution_time_by_size,
+            algorithm_times,
+            {},
+            "plots/total_algorithm_execution_time.png",
+        ),
+    ]
+    for size in sizes:
+        size_data = {size: data_dict[size]} if size in data_dict else {}
+        tasks.append(
+            (
+                f"products column speedup chart ({size} GB)",
+                plot_products_column_speedup,
+                size_data,
+                {"size": size},
+                f"plots/products_column_speedup_{size}.png",
+            )
+        )
+        tasks.append(
+            (
+                f"algorithm comparison chart ({size} GB)",
+                plot_algorithm_comparison,
+                size_data,
+                {"size": size},
+                f"plots/algorithm_comparison_{size}.png",
+            )
+        )
+        for algorithm in algorithms:
+            algorithm_data = (
+                {size: {algorithm: data_dict[size][algorithm]}}
+                if algorithm in size_data.get(size, {})
+                else {}
+            )
+            for table_name in ("orders", "products"):
+                tasks.append(
+                    (
+                        f"speedup vs cardinality chart ({table_name}, {size} GB, algorithm {algorithm})",
+                        plot_speedup_vs_cardinality,
+                        algorithm_data,
+                        {
+                            "table_name": table_name,
+                            "size": size,
+                            "algorithm": algorithm,
+                        },
+                        f"plots/speedup_vs_cardinality_{table_name}_{size}gb_alg{algorithm}.png",
+                    )
+                )
+            tasks.append(
+                (
+                    f"speedup heatmap ({size} GB, algorithm {algorithm})",
+                    create_speedup_heatmap,
+                    algorithm_data,
+                    {"size": size, "algorithm": algorithm},
+                    f"plots/speedup_heatmap_{size}gb_alg{algorithm}.png",
+                )
+            )
+    return tasks
+
+
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate plots from algorithm reports")
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Load results from this results database instead of the report directories",
+    )
+    parser.add_argument(
+        "--collection",
+        type=str,
+        default=None,
+        help="Collection of runs to plot when loading from the results database "
+        "(default: the collection of the newest run, 'all' for every collection)",
+    )
+    parser.add_argument(
+        "--since_run_id",
+        type=int,
+        default=None,
+        help="Only plot runs added to the results database after this run id",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes rendering plots (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Render all plots, even those whose input data has not changed",
+    )
+    args = parser.parse_args()
+
     # Create the data directory if it doesn't exist
     os.makedirs("plots", exist_ok=True)
 
-    # Load data from all directories
-    print("Loading data from directories...")
-    data_dict, algorithm_times = load_data_from_directories()
+    if args.store:
+        collection = args.collection
+        if collection is None:
+            # New runs are stored under "algorithm_reports" while imported
+            # ones keep their directory's name, so pick the newest run's
+            with ResultsStore(args.store) as store:
+                collection = store.latest_collection()
+        elif collection == "all":
+            collection = None
+        print(f"Loading data from {args.store} (collection: {collection or 'all'})...")
+        data_dict, algorithm_times = load_data_from_store(
+            args.store, collection, args.since_run_id
+        )
+    else:
+        # Load data from all directories
+        print("Loading data from directories...")
+        data_dict, algorithm_times = load_data_from_directories()
 
     if not data_dict:
         print("No data found in the specified directories.")
@@ -645,43 +875,45 @@ def main():
 
     # Generate the plots
     print("Generating plots...")
+    tasks = plot_tasks(data_dict, algorithm_times)
+
+    cache = {}
+    if os.path.exists(PLOT_CACHE_FILE) and not args.force:
+        with open(PLOT_CACHE_FILE, "r") as f:
+            cache = json.load(f)
+
+    # Each entry is {"hash": input hash, "written": whether the figure was
+    # saved}. Figures without data are not saved and need no file.
+    stale = []
+    for name, function, data, kwargs, path in tasks:
+        input_hash = plot_input_hash(function, data, kwargs)
+        entry = cache.get(name)
+        if (
+            not isinstance(entry, dict)
+            or entry["hash"] != input_hash
+            or (entry["written"] and not os.path.exists(path))
+        ):
+            stale.append((name, function, data, kwargs, path, input_hash))
+    print(f"{len(tasks) - len(stale)} of {len(tasks)} plots are up to date")
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(function, data, **kwargs): (name, path, input_hash)
+            for name, function, data, kwargs, path, input_hash in stale
+        }
+        for future in as_completed(futures):
+            name, path, input_hash = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error generating {name}: {e}")
+                cache.pop(name, None)
+                continue
+            cache[name] = {"hash": input_hash, "written": os.path.exists(path)}
+            print(f"✓ Generated {name}")
 
-    # Plot 1: Best speedup by size
-    plot_best_speedup_by_size(data_dict)
-    print("✓ Generated best speedup by size chart")
-
-    # Plot 2: Execution time by size (not speedup)
-    plot_execution_time_by_size(algorithm_times)
-    print("✓ Generated execution time by size chart")
-
-    # Plot 3: Products column speedup
-    for size in sizes:
-        plot_products_column_speedup(data_dict, size=size)
-    print("✓ Generated products column speedup charts")
-
-    # Plot 4: Algorithm comparison
-    for size in sizes:
-        plot_algorithm_comparison(data_dict, size=size)
-    print("✓ Generated algorithm comparison charts")
-
-    # Plot 5:  Speedup vs cardinality for orders
-    for size in sizes:
-        for algorithm in algorithms:
-            plot_speedup_vs_cardinality(
-                data_dict, table_name="orders", size=size, algorithm=algorithm
-            )
-    for size in sizes:
-        for algorithm in algorithms:
-            plot_speedup_vs_cardinality(
-                data_dict, table_name="products", size=size, algorithm=algorithm
-            )
-    print("✓ Generated speedup vs cardinality charts")
-
-    # Additional visualization: Speedup heatmap
-    for size in sizes:
-        for algorithm in algorithms:
-            create_speedup_heatmap(data_dict, size=size, algorithm=algorithm)
-    print("✓ Generated speedup heatmaps")
+    with open(PLOT_CACHE_FILE, "w") as f:
+        json.dump(cache, f, indent=2)
 
     print("All plots have been successfully generated!")
 
@@ -1,14 +1,19 @@
 import json
+import os
+import sys
 
-def classify(queries: list[str], table_names: list[str]) -> dict[str, list[str]]:
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from query_index import QueryIndex
+
+def classify(queries: list, table_names: list[str], index: QueryIndex) -> dict[str, list]:
+    """Assign each query to every table it reads, so joins land in each of their tables."""
     classes = {name: list() for name in table_names}
 
     for query in queries:
-        tokens = query.split()
-        for table_name in classes:
-            if table_name in tokens:
+        text = query if isinstance(query, str) else query['query']
+        for table_name in index.tables(text):
+            if table_name in classes:
                 classes[table_name].append(query)
-                break
     return classes
 
 def main():
@@ -18,7 +23,9 @@ def main():
 
     with open('all.json', 'r') as f:
         queries = json.load(f)
-    classified_queries = classify(queries, table_names)
+    index = QueryIndex(schema, cache_path='.query_index.json')
+    classified_queries = classify(queries, table_names, index)
+    index.save()
 
     for table_name in classified_queries:
         with open(f'{table_name}.json', 'w') as f:
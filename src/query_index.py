@@ -0,0 +1,461 @@
+# query_index.py
+import hashlib
+import json
+import os
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<comment>--[^\n]*)
+    | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<quoted>`[^`]*`)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<operator><=|>=|<>|!=|==|[=<>+\-*/%,.;()\[\]])
+    | (?P<other>.)
+    """,
+    re.VERBOSE,
+)
+
+# Keywords that are never column names. Function names do not need to be
+# listed, they are recognized by the parenthesis that follows them.
+KEYWORDS = {
+    "ALL",
+    "AND",
+    "ANTI",
+    "AS",
+    "ASC",
+    "BETWEEN",
+    "BY",
+    "CASE",
+    "CLUSTER",
+    "CROSS",
+    "CURRENT",
+    "DESC",
+    "DISTINCT",
+    "DISTRIBUTE",
+    "ELSE",
+    "END",
+    "EXISTS",
+    "FALSE",
+    "FOLLOWING",
+    "FROM",
+    "FULL",
+    "GROUP",
+    "HAVING",
+    "IN",
+    "INNER",
+    "INTERVAL",
+    "IS",
+    "JOIN",
+    "LATERAL",
+    "LEFT",
+    "LIKE",
+    "LIMIT",
+    "NOT",
+    "NULL",
+    "ON",
+    "OR",
+    "ORDER",
+    "OUTER",
+    "OVER",
+    "PARTITION",
+    "PRECEDING",
+    "RANGE",
+    "RIGHT",
+    "RLIKE",
+    "ROW",
+    "ROWS",
+    "SELECT",
+    "SEMI",
+    "SORT",
+    "THEN",
+    "TRUE",
+    "UNBOUNDED",
+    "UNION",
+    "VIEW",
+    "WHEN",
+    "WHERE",
+    "WITH",
+}
+
+# Keywords that start a clause, and the clause they start. Columns are
+# classified by the clause they appear in.
+CLAUSE_KEYWORDS = {
+    "SELECT": "select",
+    "FROM": "from",
+    "JOIN": "from",
+    "ON": "on",
+    "WHERE": "where",
+    "GROUP": "group",
+    "HAVING": "having",
+    "ORDER": "order",
+    "SORT": "order",
+    "CLUSTER": "order",
+    "DISTRIBUTE": "order",
+    "LIMIT": "limit",
+    "UNION": "select",
+    "OVER": "window",
+}
+
+# Clauses whose columns filter rows, and so benefit from partition pruning
+FILTER_CLAUSES = {"where", "having"}
+
+
+def tokenize(query: str) -> list:
+    """Split a query into (kind, text) tokens, dropping whitespace and comments."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        text = match.group()
+        if kind == "quoted":
+            kind, text = "word", text[1:-1]
+        tokens.append((kind, text))
+    return tokens
+
+
+def _is_word(token, *words):
+    return token[0] == "word" and (not words or token[1].upper() in words)
+
+
+def _table_references(tokens, references=None):
+    """Find the tables and aliases following FROM and JOIN.
+
+    Every parenthesis opens a scope, identified by the position of the
+    parenthesis (-1 for the outermost query), so columns in a subquery
+    resolve against the subquery's own tables first.
+
+    Args:
+        tokens: Tokens of the query (see `tokenize`)
+        references: Optional list to append each table reference to, as
+            (first token position, last token position, table name,
+            whether it has an alias)
+
+    Returns:
+        tuple: ({scope: {alias: table name}}, where every table also maps to
+            itself; names of common table expressions and subquery aliases)
+    """
+    scopes = {}
+    derived = set()
+
+    # Common table expressions: WITH name AS (...), name AS (...)
+    for i, token in enumerate(tokens[:-2]):
+        if (
+            _is_word(token)
+            and _is_word(tokens[i + 1], "AS")
+            and tokens[i + 2] == ("operator", "(")
+            and (i == 0 or _is_word(tokens[i - 1], "WITH") or tokens[i - 1][1] == ",")
+        ):
+            derived.add(token[1].lower())
+
+    # Open parentheses as (position, whether it is a derived table, whether
+    # the enclosing scope was in its FROM clause)
+    stack = []
+    in_from = False
+    expect_table = False
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == ("operator", "("):
+            stack.append((i, expect_table, in_from))
+            in_from = expect_table = False
+            i += 1
+            continue
+        if token == ("operator", ")"):
+            is_derived = False
+            if stack:
+                _, is_derived, in_from = stack.pop()
+            expect_table = False
+            i += 1
+            if is_derived:
+                if i < len(tokens) and _is_word(tokens[i], "AS"):
+                    i += 1
+                if (
+                    i < len(tokens)
+                    and _is_word(tokens[i])
+                    and tokens[i][1].upper() not in KEYWORDS
+                ):
+                    derived.add(tokens[i][1].lower())
+                    i += 1
+            continue
+
+        if _is_word(token, "FROM", "JOIN"):
+            in_from = expect_table = True
+            i += 1
+            continue
+        if _is_word(token) and token[1].upper() in CLAUSE_KEYWORDS:
+            in_from = False
+
+        if expect_table and _is_word(token) and token[1].upper() not in KEYWORDS:
+            first = i
+            table_name = token[1].lower()
+            # Qualified names like db.table
+            while (
+                i + 2 < len(tokens)
+                and tokens[i + 1] == ("operator", ".")
+                and _is_word(tokens[i + 2])
+            ):
+                i += 2
+                table_name = tokens[i][1].lower()
+            last = i
+            i += 1
+
+            # Optional alias
+            alias = None
+            if i < len(tokens) and _is_word(tokens[i], "AS"):
+                i += 1
+            if (
+                i < len(tokens)
+                and _is_word(tokens[i])
+                and tokens[i][1].upper() not in KEYWORDS
+            ):
+                alias = tokens[i][1].lower()
+                i += 1
+
+            if table_name in derived:
+                if alias:
+                    derived.add(alias)
+            else:
+                aliases = scopes.setdefault(stack[-1][0] if stack else -1, {})
+                aliases[table_name] = table_name
+                if alias:
+                    aliases[alias] = table_name
+                if references is not None:
+                    references.append((first, last, table_name, alias is not None))
+            expect_table = False
+            continue
+
+        # Comma-separated table lists
+        expect_table = in_from and token == ("operator", ",")
+        i += 1
+    return scopes, derived
+
+
+def rename_tables(query: str, names: dict) -> str:
+    """Point the table references of a query at other tables.
+
+    References without an alias get the original name as alias, so columns
+    qualified with the table name still resolve.
+
+    Args:
+        query: The SQL query
+        names: {table name: name of the table to read instead}
+
+    Returns:
+        str: The query with the references replaced
+    """
+    names = {table.lower(): new_name for table, new_name in names.items()}
+    tokens = tokenize(query)
+    spans = [
+        match.span()
+        for match in TOKEN_PATTERN.finditer(query)
+        if match.lastgroup not in ("space", "comment")
+    ]
+    references = []
+    _table_references(tokens, references)
+    for first, last, table_name, has_alias in reversed(references):
+        if table_name not in names:
+            continue
+        replacement = names[table_name]
+        if not has_alias:
+            replacement += f" {tokens[last][1]}"
+        query = query[: spans[first][0]] + replacement + query[spans[last][1] :]
+    return query
+
+
+def analyze_query(query: str, schema: dict = None) -> dict:
+    """Find the tables and columns a query touches.
+
+    Qualified columns (alias.column) are resolved through the query's
+    aliases. Unqualified columns are resolved against `schema`: they belong
+    to the tables of the innermost enclosing query that have a column of
+    that name.
+
+    Args:
+        query: The SQL query
+        schema: Optional {table: [column names]}. Unqualified columns of
+            tables missing from it cannot be resolved.
+
+    Returns:
+        dict: {"tables": [table], "columns": {table: [column]},
+            "filter_columns": {table: [column]} for WHERE and HAVING,
+            "group_columns": {table: [column]} for GROUP BY,
+            "join_keys": [[[table, column], [table, column]]] for equality
+            conditions between columns of two different tables}
+    """
+    tokens = tokenize(query)
+    scopes, derived = _table_references(tokens)
+    tables = sorted(
+        {table for aliases in scopes.values() for table in aliases.values()}
+    )
+    table_columns = {
+        table: {col.lower() for col in (schema or {}).get(table, [])}
+        for table in tables
+    }
+
+    columns = {table: set() for table in tables}
+    filter_columns = {table: set() for table in tables}
+    group_columns = {table: set() for table in tables}
+
+    def add(refs, clause):
+        for table, col in refs:
+            columns[table].add(col)
+            if clause in FILTER_CLAUSES:
+                filter_columns[table].add(col)
+            elif clause == "group":
+                group_columns[table].add(col)
+
+    def resolve(qualifier, col, open_scopes):
+        # Innermost scope first, so correlated subqueries reach outer tables
+        for scope in reversed(open_scopes):
+            aliases = scopes.get(scope, {})
+            if qualifier is not None:
+                if qualifier in aliases:
+                    return [(aliases[qualifier], col)]
+                continue
+            refs = [
+                (table, col)
+                for table in sorted(set(aliases.values()))
+                if col in table_columns[table]
+            ]
+            if refs:
+                return refs
+        return []
+
+    # Each token becomes an atom: a list of resolved (table, column)
+    # references for column names, the token itself otherwise
+    atoms = []
+    clause = None
+    clause_stack = []
+    open_scopes = [-1]
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        upper = text.upper()
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if (kind, text) == ("operator", "("):
+            clause_stack.append(clause)
+            open_scopes.append(i)
+        elif (kind, text) == ("operator", ")"):
+            clause = clause_stack.pop() if clause_stack else None
+            if len(open_scopes) > 1:
+                open_scopes.pop()
+        elif kind == "word" and upper in CLAUSE_KEYWORDS:
+            clause = CLAUSE_KEYWORDS[upper]
+        elif (
+            kind == "word"
+            and upper not in KEYWORDS
+            and next_token != ("operator", "(")
+            and clause != "from"
+            and not (atoms and atoms[-1] == ("word", "AS"))
+        ):
+            if (
+                next_token == ("operator", ".")
+                and i + 2 < len(tokens)
+                and _is_word(tokens[i + 2])
+            ):
+                refs = resolve(text.lower(), tokens[i + 2][1].lower(), open_scopes)
+                i += 2
+            elif text.lower() in derived:
+                refs = []
+            else:
+                refs = resolve(None, text.lower(), open_scopes)
+            add(refs, clause)
+            atoms.append(refs)
+            i += 1
+            continue
+
+        atoms.append((kind, upper if kind == "word" else text))
+        i += 1
+
+    join_keys = []
+    for left, operator, right in zip(atoms, atoms[1:], atoms[2:]):
+        if (
+            isinstance(left, list)
+            and isinstance(right, list)
+            and operator == ("operator", "=")
+            and len(left) == 1
+            and len(right) == 1
+            and left[0][0] != right[0][0]
+        ):
+            join_keys.append([list(left[0]), list(right[0])])
+
+    return {
+        "tables": tables,
+        "columns": {table: sorted(cols) for table, cols in columns.items()},
+        "filter_columns": {
+            table: sorted(cols) for table, cols in filter_columns.items()
+        },
+        "group_columns": {table: sorted(cols) for table, cols in group_columns.items()},
+        "join_keys": join_keys,
+    }
+
+
+class QueryIndex:
+    def __init__(self, schema: dict = None, cache_path: str = None):
+        """Cached mapping from queries to the tables and columns they touch.
+
+        Args:
+            schema: {table: [column names]} or the contents of schema.json
+                ({table: [[column, type], ...]})
+            cache_path: Optional JSON file the index is loaded from and saved
+                to. Entries computed for a different schema are discarded.
+        """
+        self.schema = None
+        if schema is not None:
+            self.schema = {
+                table.lower(): [
+                    col[0] if isinstance(col, (list, tuple)) else col for col in cols
+                ]
+                for table, cols in schema.items()
+            }
+        self.fingerprint = hashlib.sha1(
+            json.dumps(self.schema, sort_keys=True).encode()
+        ).hexdigest()
+        self.cache_path = cache_path
+        self.entries = {}
+        self._dirty = False
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r") as file:
+                    cache = json.load(file)
+                if cache.get("schema") == self.fingerprint:
+                    self.entries = cache.get("queries", {})
+            except (json.JSONDecodeError, OSError):
+                print(f"Warning: Ignoring unreadable query index {cache_path}")
+
+    def get(self, query: str) -> dict:
+        """Return the analysis of a query (see `analyze_query`)."""
+        if query not in self.entries:
+            self.entries[query] = analyze_query(query, self.schema)
+            self._dirty = True
+        return self.entries[query]
+
+    def tables(self, query: str) -> list:
+        return self.get(query)["tables"]
+
+    def touches(self, query: str, table_name: str) -> bool:
+        return table_name in self.get(query)["tables"]
+
+    def join_keys(self, query: str) -> list:
+        """Return the join keys as ((table, column), (table, column)) tuples."""
+        return [
+            (tuple(left), tuple(right)) for left, right in self.get(query)["join_keys"]
+        ]
+
+    def save(self):
+        """Write new entries to the cache file, if one is configured."""
+        if not self.cache_path or not self._dirty:
+            return
+        # Runners in other threads may save the same index concurrently
+        temp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"schema": self.fingerprint, "queries": self.entries}, file)
+        os.replace(temp_path, self.cache_path)
+        self._dirty = False
@@ -1,24 +1,262 @@
+from contextlib import nullcontext
+from functools import partial
 import json
 import os
+import re
+import subprocess
+from pyhive.exc import OperationalError
+from pyhive.hive import ttypes
 from tqdm import tqdm
 import time
+from tracing import tracer
+from query_index import QueryIndex, rename_tables
+import metrics
+
+# Operation states in which a submitted query is still in flight
+RUNNING_STATES = (
+    ttypes.TOperationState.INITIALIZED_STATE,
+    ttypes.TOperationState.PENDING_STATE,
+    ttypes.TOperationState.RUNNING_STATE,
+)
+
+# How caches are treated around each timed query (see `QueryRunner`)
+CACHE_MODES = ("default", "cold", "warm", "both")
+
+# Table scan statistics in EXPLAIN output
+STATISTICS_PATTERN = re.compile(r"Statistics: Num rows: (\d+) Data size: (\d+)")
+
+# Literals and formatting that are stripped to find a query's template
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_LITERAL_PATTERN = re.compile(
+    r"(?<![\w.])\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.])"
+)
+# A minus after an operator, an opening parenthesis, a comma or a keyword is
+# the sign of the literal that follows, not a subtraction
+UNARY_MINUS_PATTERN = re.compile(
+    r"(^|[=<>(,*/+-]|\b(?:and|or|not|between|when|then|else|select)\b)\s*-\s*\?"
+)
+IN_LIST_PATTERN = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+COMPARISON_PATTERN = re.compile(r"\s*([=<>!]+)\s*")
+COMMA_PATTERN = re.compile(r"\s*,\s*")
+PARENTHESIS_SPACE_PATTERN = re.compile(r"(?<=\()\s+|\s+(?=\))")
+
+
+def command_hook(command: str):
+    """Return a cache hook that runs a shell command.
+
+    The command could, for example, drop the OS page cache on every worker
+    (`sync; echo 3 > /proc/sys/vm/drop_caches` over ssh) or restart the
+    containers to reset JIT state.
+
+    Raises:
+        CalledProcessError: From the hook, if the command fails
+    """
+
+    def hook():
+        subprocess.run(command, shell=True, check=True)
+
+    return hook
+
+
+def cache_totals(query_times: list) -> dict:
+    """Sum the cold and warm times of a run's entries, if it measured them.
+
+    Times are multiplied by the template count of representatives.
+
+    Returns:
+        dict: "total_cold_seconds" and/or "total_warm_seconds"
+    """
+    totals = {}
+    for key in ("cold_seconds", "warm_seconds"):
+        if query_times and all(entry.get(key) is not None for entry in query_times):
+            totals[f"total_{key}"] = sum(
+                entry[key] * entry.get("count", 1) for entry in query_times
+            )
+    return totals
+
+
+def query_spec(entry) -> dict:
+    """
+    Normalize one workload entry into a query spec.
+
+    Workload files list either plain query strings or objects of the form
+    {"query": str, "weight": float, "slo_seconds": float}. The weight is how
+    often the query runs relative to the others (default 1) and
+    `slo_seconds` is its optional latency target.
+
+    Returns:
+        dict: {"query": str, "weight": float, "slo_seconds": float | None}
+    """
+    if isinstance(entry, str):
+        return {"query": entry, "weight": 1.0, "slo_seconds": None}
+    return {
+        "query": entry["query"],
+        "weight": float(entry.get("weight", 1.0)),
+        "slo_seconds": entry.get("slo_seconds"),
+    }
+
+
+def normalize_query(query: str) -> str:
+    """
+    Return the template of a query: the query with string and number
+    literals replaced by "?", IN lists collapsed to a single "?", keywords
+    and identifiers lowercased and whitespace normalized. Queries that only
+    differ in their literals share a template.
+    """
+    template = STRING_LITERAL_PATTERN.sub("?", query)
+    template = NUMBER_LITERAL_PATTERN.sub("?", template).lower()
+    template = UNARY_MINUS_PATTERN.sub(r"\1 ?", template)
+    template = IN_LIST_PATTERN.sub("in (?)", template)
+    template = COMPARISON_PATTERN.sub(r" \1 ", template)
+    template = COMMA_PATTERN.sub(", ", template)
+    template = PARENTHESIS_SPACE_PATTERN.sub("", template)
+    return " ".join(template.split())
+
+
+def template_representatives(specs: list, representatives: int) -> list:
+    """
+    Group query specs by template and pick up to `representatives` queries,
+    spread evenly over each group, to stand in for the whole group.
+
+    Each representative gets a "count" of how many queries it stands for and
+    the group's summed weight split evenly among the representatives, so
+    weighted objectives keep their scale. Templates are kept in the order
+    they first appear.
+
+    Returns:
+        list: Query specs with an added "template" and "count"
+    """
+    groups = {}
+    for spec in specs:
+        groups.setdefault(normalize_query(spec["query"]), []).append(spec)
+
+    selected = []
+    for template, group in groups.items():
+        num_selected = min(representatives, len(group))
+        step = len(group) / num_selected
+        weight = sum(spec["weight"] for spec in group) / num_selected
+        for i in range(num_selected):
+            spec = group[int(i * step)]
+            selected.append(
+                dict(
+                    spec,
+                    weight=weight,
+                    template=template,
+                    count=len(group) / num_selected,
+                )
+            )
+    return selected
 
 
 class QueryRunner:
-    def __init__(self, cursor):
+    def __init__(
+        self,
+        cursor,
+        query_timeout=None,
+        candidate_timeout=None,
+        poll_interval=0.05,
+        fetch_results=False,
+        arraysize=10000,
+        queries_dir=None,
+        representatives=None,
+        schema=None,
+        select_by_index=True,
+        exclude_tables=(),
+        timing_lock=None,
+        cache_mode="default",
+        priming_runs=1,
+        drop_caches=None,
+    ):
+        """
+        Args:
+            cursor: The cursor instance obtained from the Hive connection.
+            query_timeout: Seconds after which a single query is cancelled
+            candidate_timeout: Seconds after which a whole run is cancelled
+            poll_interval: Maximum seconds between two status polls of a
+                running query
+            fetch_results: Whether to consume each query's results, so the
+                measured time includes the transfer cost
+            arraysize: Number of rows fetched per fetchmany batch and per
+                server round trip (set as the cursor's arraysize)
+            queries_dir: Directory with the workload files (default:
+                src/queries)
+            representatives: If set, queries are grouped into templates
+                that differ only in literals and only this many queries per
+                template are measured; the total is extrapolated with the
+                template counts (see `template_representatives`)
+            schema: {table: [[column, type], ...]} used to resolve
+                unqualified columns (default: src/schema.json)
+            select_by_index: Whether a table's workload is every query that
+                touches the table (see `get_queries`) instead of only the
+                queries in its own workload file
+            exclude_tables: Tables whose queries are never selected by the
+                index, e.g. tables repartitioned concurrently by another
+                runner
+            timing_lock: Optional lock held while queries are measured, shared
+                by runners whose measurements must not overlap
+            cache_mode: "default" leaves caches alone. The other modes
+                disable Hive's query results cache and time each query
+                "cold" (after calling `drop_caches`), "warm" (after
+                `priming_runs` untimed runs) or "both" (a cold run, which
+                also primes, followed by a warm one)
+            priming_runs: Number of runs that warm the caches before a warm
+                measurement
+            drop_caches: Optional callable run before each cold measurement,
+                e.g. `command_hook("...")`
+        """
+        if representatives is not None and representatives < 1:
+            raise ValueError("representatives must be at least 1")
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(
+                f"Unknown cache mode {cache_mode}. Available: {', '.join(CACHE_MODES)}"
+            )
         self.cursor = cursor
-        self.queries_dir = os.path.join(os.getcwd(), "src", "queries")
+        self.queries_dir = queries_dir or os.path.join(os.getcwd(), "src", "queries")
         self.table_queries = self._load_all_queries()
+        if schema is None:
+            schema_path = os.path.join(os.getcwd(), "src", "schema.json")
+            if os.path.exists(schema_path):
+                with open(schema_path, "r") as file:
+                    schema = json.load(file)
+        # Tables and columns each query touches, cached next to the workload
+        self.index = QueryIndex(
+            schema, cache_path=os.path.join(self.queries_dir, ".query_index.json")
+        )
+        self.select_by_index = select_by_index
+        self.exclude_tables = set(exclude_tables)
+        self.timing_lock = timing_lock
+        self.query_timeout = query_timeout
+        self.candidate_timeout = candidate_timeout
+        self.poll_interval = poll_interval
+        self.fetch_results = fetch_results
+        self.arraysize = arraysize
+        # PyHive's fetchmany(n) calls fetchone() n times, and each round trip
+        # to the server fetches cursor.arraysize rows
+        self.cursor.arraysize = arraysize
+        self.representatives = representatives
+        self.cache_mode = cache_mode
+        self.priming_runs = priming_runs
+        self.drop_caches = drop_caches
+        # Per-query timings of the most recent run, in execution order
+        self.last_query_times = []
+        # Why the most recent run was cancelled, or None if it completed
+        self.last_prune_reason = None
 
     def _load_all_queries(self) -> dict:
         """
         Load all query files into a dictionary during initialization.
 
         Returns:
-            dict: Dictionary mapping table names to their queries
+            dict: Dictionary mapping table names to their query specs
+                (see `query_spec`)
         """
         table_queries = {}
-        json_files = [f for f in os.listdir(self.queries_dir) if f.endswith(".json")]
+        # Hidden files hold caches such as the query index
+        json_files = [
+            f
+            for f in os.listdir(self.queries_dir)
+            if f.endswith(".json") and not f.startswith(".")
+        ]
 
         for json_file in json_files:
             table_name = os.path.splitext(json_file)[0]
@@ -26,8 +264,12 @@ class QueryRunner:
 
             try:
                 with open(file_path, "r") as f:
-                    table_queries[table_name] = json.load(f)
-            except json.JSONDecodeError:
+                    entries = json.load(f)
+                # Skip files that are not workloads, e.g. column_freq_dict.json
+                if not isinstance(entries, list):
+                    continue
+                table_queries[table_name] = [query_spec(entry) for entry in entries]
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
                 print(f"Warning: Invalid JSON format in {file_path}")
 
         return table_queries
@@ -36,18 +278,16 @@ class QueryRunner:
         """Return a list of available table names."""
         return [table for table in self.table_queries.keys() if table != "all"]
 
-    def run(self, table_name: str = None) -> float:
+    def get_queries(self, table_name: str = None) -> list:
         """
-        Run queries for the specified table and return the total execution time.
-        If no table_name is provided, runs queries from all.json if it exists,
-        otherwise runs all queries from all table files.
+        Return the query specs for the specified table. If no table_name is
+        provided, returns the queries from all.json if it exists, otherwise
+        all queries from all table files.
 
-        Args:
-            table_name (str, optional): Name of the table to run queries for.
-                                      If None, runs all queries
-
-        Returns:
-            float: Total execution time in seconds
+        With `select_by_index`, a table's queries are those of its own
+        workload file followed by every other query that touches the table,
+        so joins count towards each table they read and a layout is measured
+        against all queries it affects.
 
         Raises:
             ValueError: If table_name is invalid
@@ -56,12 +296,11 @@ class QueryRunner:
         if table_name is None:
             # If 'all.json' exists, use it
             if "all" in self.table_queries:
-                queries = self.table_queries["all"]
+                queries = list(self.table_queries["all"])
             # Otherwise, run all queries from all tables
             else:
                 for table_queries in self.table_queries.values():
                     queries.extend(table_queries)
-            print("Running all queries...")
         else:
             if table_name not in self.table_queries:
                 available_tables = self.get_available_tables()
@@ -70,11 +309,498 @@ class QueryRunner:
                     f"Available tables: {', '.join(available_tables)}"
                 )
             queries = self.table_queries[table_name]
+            if self.select_by_index:
+                queries = self._touching(table_name, queries)
+        return queries
+
+    def _workload(self) -> list:
+        """Return every query spec once, all.json first."""
+        specs = []
+        seen = set()
+        for name in sorted(self.table_queries, key=lambda name: name != "all"):
+            for spec in self.table_queries[name]:
+                if spec["query"] not in seen:
+                    seen.add(spec["query"])
+                    specs.append(spec)
+        return specs
+
+    def _touching(self, table_name: str, queries: list) -> list:
+        """Extend `queries` with the other workload queries touching a table.
+
+        Queries reading any of `exclude_tables` are dropped, including those
+        from the table's own file.
+        """
+        selected = []
+        seen = set()
+        candidates = [(spec, True) for spec in queries]
+        candidates += [(spec, False) for spec in self._workload()]
+        for spec, own in candidates:
+            tables = set(self.index.tables(spec["query"]))
+            if (
+                spec["query"] not in seen
+                and (own or table_name in tables)
+                and not tables & self.exclude_tables
+            ):
+                seen.add(spec["query"])
+                selected.append(spec)
+        self.index.save()
+        return selected
+
+    def excluded_queries(self, table_name: str) -> list:
+        """Return the workload queries touching a table that `exclude_tables` drop."""
+        excluded = []
+        for spec in self._workload():
+            tables = set(self.index.tables(spec["query"]))
+            if table_name in tables and tables & self.exclude_tables:
+                excluded.append(spec)
+        self.index.save()
+        return excluded
+
+    def run(
+        self, table_name: str = None, budget: float = None, rename: dict = None
+    ) -> float:
+        """
+        Run queries for the specified table and return the total execution time.
+        If no table_name is provided, runs queries from all.json if it exists,
+        otherwise runs all queries from all table files.
+
+        Args:
+            table_name (str, optional): Name of the table to run queries for.
+                                      If None, runs all queries
+            budget (float, optional): Seconds the whole run may take before
+                                      it is cancelled (see `_run_queries`)
+            rename (dict, optional): {table: other table} the queries read
+                                     instead, e.g. copies with other layouts.
+                                     `last_query_times` keeps the original
+                                     queries.
+
+        Returns:
+            float: Total execution time in seconds, or infinity if the run
+                was cancelled
+
+        Raises:
+            ValueError: If table_name is invalid
+        """
+        queries = self.get_queries(table_name)
+        if table_name is None:
+            print("Running all queries...")
+        else:
             print(f"Running queries for table: {table_name}...")
 
+        if not rename:
+            return self._run_queries(queries, budget)
+        renamed = [
+            dict(spec, query=rename_tables(spec["query"], rename)) for spec in queries
+        ]
+        originals = {
+            spec["query"]: original["query"] for spec, original in zip(renamed, queries)
+        }
+        exec_time = self._run_queries(renamed, budget)
+        for entry in self.last_query_times:
+            entry["query"] = originals[entry["query"]]
+        return exec_time
+
+    def explain(self, table_name: str = None, mode: str = "both") -> list:
+        """
+        Inspect the plans of the table's queries without executing them.
+
+        EXPLAIN DEPENDENCY lists the partitions a query reads and EXPLAIN
+        gives the estimated rows and bytes of its table scans. Both take
+        milliseconds, so they are a cheap proxy for running the queries.
+
+        Args:
+            table_name (str, optional): Name of the table whose queries to
+                explain. If None, explains all queries (see `get_queries`)
+            mode (str): "dependency", "explain" or "both"
+
+        Returns:
+            list: One dictionary per query with "partitions_read" and
+                "total_partitions" (per input table, dependency mode),
+                "estimated_rows" and "estimated_bytes" (explain mode), and
+                "pruned", whether some partitioned input table is read only
+                partially
+        """
+        if mode not in ("dependency", "explain", "both"):
+            raise ValueError(f"Invalid explain mode: {mode}")
+
+        specs = self.get_queries(table_name)
+        if self.representatives is not None:
+            specs = template_representatives(specs, self.representatives)
+
+        plans = []
+        partition_counts = {}
+        for spec in tqdm(specs):
+            plan = {"query": spec["query"]}
+
+            if mode in ("dependency", "both"):
+                self.cursor.execute(f"EXPLAIN DEPENDENCY {spec['query']}")
+                dependency = json.loads(self.cursor.fetchall()[0][0])
+
+                partitions_read = {}
+                for partition in dependency.get("input_partitions", []):
+                    # Partition names look like "default@orders@order_date=..."
+                    input_table = partition["partitionName"].split("@")[1]
+                    partitions_read[input_table] = (
+                        partitions_read.get(input_table, 0) + 1
+                    )
+
+                total_partitions = {}
+                for input_table in dependency.get("input_tables", []):
+                    input_table = input_table["tablename"].split("@")[-1]
+                    if input_table not in partition_counts:
+                        partition_counts[input_table] = self._partition_count(
+                            input_table
+                        )
+                    total_partitions[input_table] = partition_counts[input_table]
+
+                plan["partitions_read"] = partitions_read
+                plan["total_partitions"] = total_partitions
+                plan["pruned"] = any(
+                    partitions_read.get(input_table, 0) < count
+                    for input_table, count in total_partitions.items()
+                    if count > 0
+                )
+
+            if mode in ("explain", "both"):
+                self.cursor.execute(f"EXPLAIN {spec['query']}")
+                lines = [row[0] for row in self.cursor.fetchall()]
+                rows, size = 0, 0
+                for i, line in enumerate(lines):
+                    if "TableScan" not in line:
+                        continue
+                    # The scan's statistics follow a few lines below it
+                    for next_line in lines[i + 1 : i + 6]:
+                        match = STATISTICS_PATTERN.search(next_line)
+                        if match:
+                            rows += int(match.group(1))
+                            size += int(match.group(2))
+                            break
+                plan["estimated_rows"] = rows
+                plan["estimated_bytes"] = size
+
+            plans.append(plan)
+
+        return plans
+
+    def _fetch(self, deadline: float = None):
+        """
+        Consume the results of the finished query in batches of `arraysize`.
+
+        Rows are counted and discarded batch by batch, so memory stays
+        bounded no matter how large the result is. Bytes are approximated by
+        the length of each value's string form.
+
+        Returns:
+            tuple: (rows, bytes) transferred, or None if the deadline passed
+                and the operation was cancelled
+        """
+        if self.cursor.description is None:
+            return 0, 0
+
+        rows, size = 0, 0
+        while True:
+            batch = self.cursor.fetchmany(self.arraysize)
+            if not batch:
+                return rows, size
+            rows += len(batch)
+            size += sum(
+                len(str(value)) for row in batch for value in row if value is not None
+            )
+            if deadline is not None and time.time() >= deadline:
+                self.cursor.cancel()
+                return None
+
+    def _partition_count(self, table_name: str) -> int:
+        """Return the number of partitions of a table, 0 if unpartitioned."""
+        try:
+            self.cursor.execute(f"SHOW PARTITIONS {table_name}")
+            return len(self.cursor.fetchall())
+        except Exception:
+            return 0
+
+    def get_join_queries(self, table_names: list) -> list:
+        """
+        Return the cross-table queries from all.json that join the given tables.
+
+        A query is selected when it joins at least two tables and every table
+        it references is one of `table_names`.
+        """
+        join_queries = []
+        for spec in self.table_queries.get("all", []):
+            tables = set(self.index.tables(spec["query"]))
+            if len(tables) > 1 and tables <= set(table_names):
+                join_queries.append(spec)
+        self.index.save()
+        return join_queries
+
+    def get_join_keys(self, table_names: list) -> dict:
+        """
+        Count the equi-join keys used between the given tables.
+
+        Returns:
+            dict: Mapping of ((table, column), (table, column)) to the number
+                of cross-table queries joining on that key
+        """
+        key_counts = {}
+        for spec in self.get_join_queries(table_names):
+            for key in self.index.join_keys(spec["query"]):
+                key = tuple(sorted(key))
+                key_counts[key] = key_counts.get(key, 0) + 1
+        return key_counts
+
+    def run_joint(self, table_names: list, budget: float = None) -> float:
+        """
+        Run the workload of a group of joined tables and return the total
+        execution time: the cross-table queries joining them plus each
+        table's own queries.
+
+        Raises:
+            ValueError: If there are no cross-table queries for the tables
+        """
+        queries = self.get_join_queries(table_names)
+        if not queries:
+            raise ValueError(f"No cross-table queries found joining {table_names}")
+        seen = {spec["query"] for spec in queries}
+        for table_name in table_names:
+            for spec in self.table_queries.get(table_name, []):
+                if spec["query"] not in seen:
+                    seen.add(spec["query"])
+                    queries.append(spec)
+
+        print(f"Running joint queries for tables: {', '.join(table_names)}...")
+        return self._run_queries(queries, budget)
+
+    def _run_queries(self, queries: list, budget: float = None) -> float:
+        """
+        Execute the query specs in order and return the total execution time.
+
+        Queries are submitted asynchronously and polled, so a run can be
+        cancelled while a query is in flight. This happens when the running
+        total exceeds `budget` or `candidate_timeout`, or when a single query
+        exceeds `query_timeout`; the run then returns infinity and
+        `last_prune_reason` says why.
+
+        The time of each individual query is kept in `last_query_times` as a
+        list of {"query": str, "seconds": float, "weight": float,
+        "slo_seconds": float | None} dictionaries. When results are fetched,
+        each entry also has "execute_seconds", "fetch_seconds", "rows" and
+        "bytes".
+
+        With `representatives` set, only the representatives of each query
+        template are run; their entries also have "template" and "count",
+        and the returned total (and the budget) is the sum of each query's
+        time multiplied by its count.
+
+        With a `timing_lock`, the run holds the lock, so runs of runners
+        sharing it never overlap.
+
+        Outside the "default" cache mode, the results cache is disabled and
+        each query's caches are prepared before it is timed (see
+        `_prepare_caches`). Entries then have "cold_seconds" and/or
+        "warm_seconds"; in "both" mode "seconds" is the warm time. The
+        returned total is the sum of the timed runs only.
+        """
+        # Wait for other tables' measurements when timing is exclusive
+        with self.timing_lock or nullcontext():
+            self.last_query_times = []
+            self.last_prune_reason = None
+            if self.cache_mode != "default":
+                # Results served from the cache would hide the layout
+                self.cursor.execute("SET hive.query.results.cache.enabled=false")
+
+            if self.representatives is not None:
+                num_queries = len(queries)
+                queries = template_representatives(queries, self.representatives)
+                num_templates = len({spec["template"] for spec in queries})
+                print(
+                    f"Measuring {len(queries)} representatives of {num_templates} "
+                    f"templates for {num_queries} queries."
+                )
+
+            start = time.time()
+            # Sum of the query times, each multiplied by its template count
+            total = 0.0
+            for spec in tqdm(queries):
+                count = spec.get("count", 1)
+                # Untimed cache preparation runs stop at the same deadlines
+                deadline_for = partial(
+                    self._deadline,
+                    run_start=start,
+                    total=total,
+                    count=count,
+                    budget=budget,
+                )
+                cold_seconds = None
+                if self.cache_mode != "default":
+                    prepared, cold_seconds = self._prepare_caches(
+                        spec["query"], deadline_for
+                    )
+                    if not prepared:
+                        metrics.queries_executed.inc(outcome="cancelled")
+                        print(
+                            f"Cancelled run after {time.time() - start:.2f}s "
+                            f"({self.last_prune_reason} while preparing caches)."
+                        )
+                        return float("inf")
+
+                query_start = time.time()
+                deadline, reason = deadline_for(query_start)
+
+                with tracer.span("query.run", query=spec["query"]) as span:
+                    completed = self._execute(spec["query"], deadline)
+                    execute_end = time.time()
+                    if completed and self.fetch_results:
+                        with tracer.span("query.fetch"):
+                            fetched = self._fetch(deadline)
+                        completed = fetched is not None
+                    if not completed:
+                        span["cancelled"] = reason
+                if not completed:
+                    metrics.queries_executed.inc(outcome="cancelled")
+                    self.last_prune_reason = reason
+                    print(f"Cancelled run after {time.time() - start:.2f}s ({reason}).")
+                    return float("inf")
+
+                entry = dict(spec, seconds=time.time() - query_start)
+                if self.fetch_results:
+                    entry["execute_seconds"] = execute_end - query_start
+                    entry["fetch_seconds"] = time.time() - execute_end
+                    entry["rows"], entry["bytes"] = fetched
+                if self.cache_mode == "both":
+                    entry["cold_seconds"] = cold_seconds
+                    entry["warm_seconds"] = entry["seconds"]
+                elif self.cache_mode != "default":
+                    entry[f"{self.cache_mode}_seconds"] = entry["seconds"]
+                self.last_query_times.append(entry)
+                total += entry["seconds"] * count
+                metrics.queries_executed.inc(outcome="finished")
+                metrics.query_latency.observe(entry["seconds"])
+            end = time.time()
+
+            if self.representatives is not None or self.cache_mode != "default":
+                return total
+            return end - start
+
+    def _deadline(
+        self,
+        query_start: float,
+        run_start: float,
+        total: float,
+        count: int,
+        budget: float = None,
+    ) -> tuple:
+        """Return when a query started at `query_start` is cancelled.
+
+        The query is cancelled at the earliest applicable deadline. The
+        budget left is spread over the queries this one stands for.
+
+        Args:
+            query_start (float): time.time() at which the query starts
+            run_start (float): time.time() at which the run started
+            total (float): Time the run has measured so far
+            count (int): Number of queries the query stands for
+            budget (float, optional): Seconds the whole run may take
+
+        Returns:
+            tuple: (deadline, reason), or (None, None) without a deadline
+        """
+        deadlines = []
+        if budget is not None:
+            deadlines.append((query_start + (budget - total) / count, "budget"))
+        if self.candidate_timeout is not None:
+            deadlines.append((run_start + self.candidate_timeout, "candidate_timeout"))
+        if self.query_timeout is not None:
+            deadlines.append((query_start + self.query_timeout, "query_timeout"))
+        return min(deadlines) if deadlines else (None, None)
+
+    def _untimed_run(self, query: str, deadline_for) -> float:
+        """Run a query outside the measurement, e.g. to prime the caches.
+
+        Args:
+            query (str): Query to run
+            deadline_for: Callable returning the (deadline, reason) of a
+                query started at the given time (see `_deadline`)
+
+        Returns:
+            float: Seconds the run took, or None if it was cancelled, with
+                the reason in `last_prune_reason`
+        """
         start = time.time()
-        for query in tqdm(queries):
-            self.cursor.execute(query)
-        end = time.time()
+        deadline, reason = deadline_for(start)
+        completed = self._execute(query, deadline)
+        if completed and self.fetch_results:
+            completed = self._fetch(deadline) is not None
+        if not completed:
+            self.last_prune_reason = reason
+            return None
+        return time.time() - start
+
+    def _prepare_caches(self, query: str, deadline_for) -> tuple:
+        """Bring the caches into the state of the cache mode before a timed run.
+
+        Cold measurements follow a call of `drop_caches`. Warm measurements
+        follow `priming_runs` untimed runs; in "both" mode the first of them
+        is the timed cold run.
+
+        Args:
+            query (str): Query to prepare the caches for
+            deadline_for: Callable returning the (deadline, reason) of a
+                query started at the given time, so preparation stops at
+                the run's budget and timeouts
+
+        Returns:
+            tuple: (whether the preparation completed, seconds of the cold
+                run in "both" mode, else None)
+        """
+        if self.cache_mode in ("cold", "both") and self.drop_caches is not None:
+            with tracer.span("query.drop_caches"):
+                self.drop_caches()
+
+        cold_seconds = None
+        priming_runs = self.priming_runs if self.cache_mode in ("warm", "both") else 0
+        if self.cache_mode == "both":
+            with tracer.span("query.cold", query=query):
+                cold_seconds = self._untimed_run(query, deadline_for)
+            if cold_seconds is None:
+                return False, None
+            priming_runs -= 1
+        for _ in range(priming_runs):
+            with tracer.span("query.prime", query=query):
+                if self._untimed_run(query, deadline_for) is None:
+                    return False, None
+        return True, cold_seconds
+
+    def _execute(self, query: str, deadline: float = None) -> bool:
+        """
+        Submit a query asynchronously and wait for it to finish.
+
+        Args:
+            query: The query to execute
+            deadline: Optional time.time() value at which the query is
+                cancelled
+
+        Returns:
+            bool: True if the query finished, False if it was cancelled
+
+        Raises:
+            OperationalError: If the query failed
+        """
+        self.cursor.execute(query, async_=True)
+
+        # Poll quickly at first so short queries are timed accurately
+        interval = 0.005
+        while True:
+            status = self.cursor.poll(get_progress_update=False)
+            if status.operationState not in RUNNING_STATES:
+                break
+            if deadline is not None and time.time() >= deadline:
+                self.cursor.cancel()
+                return False
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.poll_interval)
 
-        return end - start
+        if status.operationState != ttypes.TOperationState.FINISHED_STATE:
+            raise OperationalError(
+                f"Query failed: {status.errorMessage or status.operationState}"
+            )
+        return True
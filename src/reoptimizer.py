@@ -0,0 +1,342 @@
+# reoptimizer.py
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from partition_manager import PartitionManager, OBJECTIVES
+from query_runner import QueryRunner
+from report_generator import write_consolidated_report
+from table import Table
+from tracing import tracer
+
+DEFAULT_STATE_FILE = os.path.join("algorithm_reports", "reoptimizer_state.json")
+
+
+def load_state(path):
+    """Load the state recorded at the last optimization of each table."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def save_state(path, state):
+    """Write the state file atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def column_usage(query_runner, table_name):
+    """Return the weighted number of queries filtering on each column of a table.
+
+    Filter columns are the ones partitioning can prune on, so this is the
+    workload profile partition layouts depend on.
+    """
+    usage = {}
+    for spec in query_runner.get_queries(table_name):
+        info = query_runner.index.get(spec["query"])
+        for col in info["filter_columns"].get(table_name, []):
+            usage[col] = usage.get(col, 0.0) + spec["weight"]
+    query_runner.index.save()
+    return usage
+
+
+def row_drift(old_rows, new_rows):
+    """Relative change of the row count."""
+    return abs(new_rows - old_rows) / max(old_rows, 1)
+
+
+def usage_drift(old_usage, new_usage):
+    """Total variation distance between two column-usage profiles.
+
+    Both profiles are normalized to distributions first. The result is 0 for
+    the same relative usage and 1 for profiles without a common column.
+    """
+    old_total = sum(old_usage.values())
+    new_total = sum(new_usage.values())
+    if not old_total and not new_total:
+        return 0.0
+    if not old_total or not new_total:
+        return 1.0
+    columns = set(old_usage) | set(new_usage)
+    return 0.5 * sum(
+        abs(old_usage.get(col, 0) / old_total - new_usage.get(col, 0) / new_total)
+        for col in columns
+    )
+
+
+class Reoptimizer:
+    def __init__(
+        self,
+        cursor,
+        schemas,
+        query_runner,
+        state_path=DEFAULT_STATE_FILE,
+        row_threshold=0.2,
+        usage_threshold=0.2,
+        partition_manager_options=None,
+    ):
+        """Re-runs the layout search for tables whose data or workload drifted.
+
+        The state file records, per table, the row count, the column-usage
+        profile of the workload (see `column_usage`) and the layout chosen at
+        the last optimization. Tables without a recorded state count as
+        drifted. The tables in Hive are expected to have the recorded
+        layouts, or no partitioning for tables without a state.
+
+        Args:
+            cursor: The cursor instance obtained from the Hive connection.
+            schemas: Table schemas, as in schema.json
+            query_runner: QueryRunner over the current workload
+            state_path: JSON file holding the state of the last optimization
+            row_threshold: Relative row count change that triggers a search
+            usage_threshold: Column-usage drift (see `usage_drift`) that
+                triggers a search
+            partition_manager_options: Extra keyword arguments for
+                PartitionManager
+        """
+        self.cursor = cursor
+        self.schemas = schemas
+        self.query_runner = query_runner
+        self.state_path = state_path
+        self.row_threshold = row_threshold
+        self.usage_threshold = usage_threshold
+        self.partition_manager_options = partition_manager_options or {}
+        self.state = load_state(state_path)
+
+    def _table(self, table_name):
+        """Return a Table with the layout recorded in the state."""
+        layout = self.state.get(table_name, {}).get("partition_columns", [])
+        columns = [(col, type_) for col, type_ in self.schemas[table_name]]
+        return Table(
+            table_name,
+            [(col, type_) for col, type_ in columns if col not in layout],
+            [(col, dict(columns)[col]) for col in layout],
+        )
+
+    def check(self, tables):
+        """Measure the drift of each table against its recorded state.
+
+        Tables without a workload are skipped with a warning.
+
+        Returns:
+            dict: {table name: {"row_count", "usage", "row_drift",
+                "usage_drift", "drifted"}}
+        """
+        drift = {}
+        for table_name, table in tables.items():
+            try:
+                usage = column_usage(self.query_runner, table_name)
+            except ValueError as e:
+                print(f"Warning: skipping {table_name}, it has no workload: {e}")
+                continue
+            row_count = table.compute_row_count(self.cursor)
+            recorded = self.state.get(table_name)
+            if recorded is None:
+                entry = {"row_drift": None, "usage_drift": None, "drifted": True}
+            else:
+                entry = {
+                    "row_drift": row_drift(recorded["row_count"], row_count),
+                    "usage_drift": usage_drift(recorded["usage"], usage),
+                }
+                entry["drifted"] = (
+                    entry["row_drift"] > self.row_threshold
+                    or entry["usage_drift"] > self.usage_threshold
+                )
+            entry["row_count"] = row_count
+            entry["usage"] = usage
+            drift[table_name] = entry
+
+            if recorded is None:
+                print(f"{table_name}: no recorded optimization, searching.")
+            else:
+                print(
+                    f"{table_name}: row drift {entry['row_drift']:.2%}, usage drift "
+                    f"{entry['usage_drift']:.2%}"
+                    + (", searching." if entry["drifted"] else ", unchanged.")
+                )
+        return drift
+
+    def run_once(self):
+        """Check all tables and re-optimize the drifted ones.
+
+        Each search is Algorithm 2, warm-started from the table's previous
+        best layout, with the current workload's column usage as column
+        frequencies. The previous layout is measured in place as the
+        incumbent and the other layouts on copies of the table, so the table
+        is only repartitioned when a layout beats the incumbent. The best
+        layout found is applied and recorded.
+
+        Returns:
+            dict: Results of the re-optimized tables, in the format of the
+                PartitionManager algorithms
+        """
+        tables = {table_name: self._table(table_name) for table_name in self.schemas}
+        drift = self.check(tables)
+        drifted = [table_name for table_name in drift if drift[table_name]["drifted"]]
+        if not drifted:
+            return {}
+
+        column_freq_dict = {
+            table_name: drift[table_name]["usage"] for table_name in drifted
+        }
+        partition_manager = PartitionManager(
+            tables, self.cursor, column_freq_dict, **self.partition_manager_options
+        )
+
+        all_results = {}
+        for table_name in drifted:
+            table = tables[table_name]
+            previous = self.state.get(table_name, {}).get("partition_columns", [])
+            table.compute_cardinality(self.cursor)
+
+            with tracer.span("reoptimizer.search", table=table_name):
+                results = partition_manager.algorithm2(
+                    table_name,
+                    self.query_runner,
+                    initial_columns=previous,
+                    on_copies=True,
+                )
+            all_results[table_name] = results
+
+            best_columns, best_objective, _, _ = results[0]
+            if best_objective == float("inf"):
+                print(f"{table_name}: no layout completed, keeping {previous}.")
+                best_columns, best_objective = previous, None
+            if list(table.partition) != list(best_columns):
+                partition_manager.repartition(table_name, best_columns)
+            print(f"{table_name}: applied layout {best_columns}.")
+
+            self.state[table_name] = {
+                "row_count": drift[table_name]["row_count"],
+                "usage": drift[table_name]["usage"],
+                "partition_columns": list(best_columns),
+                "objective_value": best_objective,
+                "optimized_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            save_state(self.state_path, self.state)
+        return all_results
+
+
+if __name__ == "__main__":
+    import testbench
+
+    parser = argparse.ArgumentParser(
+        description="Re-optimize the layouts of tables whose data or workload drifted"
+    )
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=DEFAULT_STATE_FILE,
+        help="JSON file with the state of the last optimization",
+    )
+    parser.add_argument(
+        "--row_threshold",
+        type=float,
+        default=0.2,
+        help="Relative row count change that triggers a search",
+    )
+    parser.add_argument(
+        "--usage_threshold",
+        type=float,
+        default=0.2,
+        help="Total variation distance between the column-usage profiles that triggers a search",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        help="Check again every this many seconds instead of checking once",
+    )
+    parser.add_argument(
+        "--objective",
+        type=str,
+        choices=OBJECTIVES,
+        default="weighted_total",
+        help="Objective to rank layouts by",
+    )
+    parser.add_argument(
+        "--queries_dir",
+        type=str,
+        default=None,
+        help="Directory with the current workload files (default: src/queries)",
+    )
+    parser.add_argument(
+        "--target_rows_per_partition",
+        type=int,
+        default=None,
+        help="Derive each table's partition limit as its row count divided by this instead of using the fixed limit of 1000",
+    )
+    parser.add_argument(
+        "--min_partitions",
+        type=int,
+        default=8,
+        help="Floor of the derived partition limit",
+    )
+    parser.add_argument(
+        "--max_partitions",
+        type=int,
+        default=10000,
+        help="Ceiling of the derived partition limit",
+    )
+    parser.add_argument(
+        "--host", type=str, default="localhost", help="HiveServer2 host"
+    )
+    parser.add_argument("--port", type=int, default=10000, help="HiveServer2 port")
+
+    args = parser.parse_args()
+
+    with open(os.path.join(os.getcwd(), "src", "schema.json"), "r") as file:
+        schemas = json.load(file)
+    conn = testbench.connect(args.host, args.port)
+    cursor = conn.cursor()
+
+    while True:
+        start_time = time.time()
+        # Reload the workload, which may have changed since the last check
+        query_runner = QueryRunner(cursor, queries_dir=args.queries_dir, schema=schemas)
+        reoptimizer = Reoptimizer(
+            cursor,
+            schemas,
+            query_runner,
+            state_path=args.state,
+            row_threshold=args.row_threshold,
+            usage_threshold=args.usage_threshold,
+            partition_manager_options={
+                "objective": args.objective,
+                "target_rows_per_partition": args.target_rows_per_partition,
+                "min_partitions": args.min_partitions,
+                "max_partitions": args.max_partitions,
+            },
+        )
+        all_results = reoptimizer.run_once()
+
+        if all_results:
+            write_consolidated_report(
+                all_results,
+                algorithm_name="algorithm_reoptimize",
+                metadata={
+                    "data_size": "N/A",
+                    "total_time": time.time() - start_time,
+                    "algorithm_version": "reoptimize",
+                    "objective": args.objective,
+                    "num_tables_processed": len(all_results),
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "total_tables_available": len(schemas),
+                },
+            )
+        else:
+            print("No table drifted beyond the thresholds.")
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+    conn.close()
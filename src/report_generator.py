@@ -1,21 +1,117 @@
 import os
 import json
 from datetime import datetime
+from results_store import ResultsStore, DEFAULT_RESULTS_DB
 
 
-def write_consolidated_report(all_results, algorithm_name, metadata=None):
+def _is_baseline(columns, layout):
+    """Return whether a result is the unpartitioned, unbucketed baseline.
+
+    With session parameters tuned, the baseline also has the starting
+    settings.
+    """
+    return (
+        columns == []
+        and not layout.get("bucket_columns")
+        and not layout.get("session_changes")
+    )
+
+
+def _execution_time(time, layout):
+    """Return the wall-clock execution time of a result.
+
+    Results are ranked by an objective value; the measured total execution
+    time is kept in the details when it differs from it.
+    """
+    return layout.get("total_time", time)
+
+
+def _layout_label(columns, layout):
+    """Describe a layout as its partition columns plus any bucketing."""
+    label = str(columns)
+    if layout.get("bucket_columns"):
+        label += f" + {layout['bucket_columns']} x{layout['num_buckets']}"
+        if layout.get("sorted_by"):
+            label += " sorted"
+    for name, value in layout.get("session_changes", {}).items():
+        label += f" {name}={value}"
+    return label
+
+
+def _query_changes(baseline_query_times, query_times, regression_threshold):
+    """Compare per-query timings of a layout against the baseline.
+
+    Queries are matched by position, since every layout runs the same
+    workload in the same order.
+
+    Returns:
+        list: One dictionary per query with its time, the percent change
+            against the baseline and a status of "improved", "regressed" or
+            "unchanged" relative to `regression_threshold`
+    """
+    changes = []
+    for i, entry in enumerate(query_times):
+        change_percent = None
+        if i < len(baseline_query_times):
+            baseline_entry = baseline_query_times[i]
+            if baseline_entry["query"] == entry["query"] and baseline_entry["seconds"]:
+                change_percent = (
+                    (entry["seconds"] - baseline_entry["seconds"])
+                    / baseline_entry["seconds"]
+                ) * 100
+
+        status = "unchanged"
+        if change_percent is not None and change_percent > regression_threshold:
+            status = "regressed"
+        elif change_percent is not None and change_percent < -regression_threshold:
+            status = "improved"
+
+        changes.append(
+            {
+                "query": entry["query"],
+                "seconds": round(entry["seconds"], 4),
+                "change_percent": (
+                    round(change_percent, 2) if change_percent is not None else None
+                ),
+                "status": status,
+            }
+        )
+    return changes
+
+
+def write_consolidated_report(
+    all_results,
+    algorithm_name,
+    metadata=None,
+    regression_threshold=10.0,
+    results_db=DEFAULT_RESULTS_DB,
+    report_dir=None,
+):
     """Writes the results for all tables to a single directory.
 
     Args:
-        all_results: Dictionary mapping table names to their results
+        all_results: Dictionary mapping table names to their results, a list
+            of (partition columns, objective value, cardinality product,
+            details) tuples. Details hold the bucket spec, the total
+            execution time and the per-query timings of the layout.
         algorithm_name: Name of the algorithm used
-        metadata: Dictionary containing run metadata (data_size, total_time, etc.)
+        metadata: Dictionary containing run metadata (data_size, total_time,
+            objective, etc.)
+        regression_threshold: Percent change against the unpartitioned
+            baseline beyond which a single query counts as regressed (or
+            improved)
+        results_db: SQLite results store the results are also appended to
+            (see results_store.py), or None to only write the report files
+        report_dir: Directory to write to (default:
+            algorithm_reports/<algorithm name>_<timestamp>). Its parent
+            directory names the run's collection in the results store.
     """
     # Generate a timestamp for the folder name
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     # Create the directory with timestamp
-    report_dir = f"algorithm_reports/{algorithm_name.lower()}_{timestamp}"
+    if report_dir is None:
+        report_dir = f"algorithm_reports/{algorithm_name.lower()}_{timestamp}"
     os.makedirs(report_dir, exist_ok=True)
 
     # Write metadata summary file
@@ -34,6 +130,18 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
             file.write(
                 f"Total Execution Time: {metadata.get('total_time', 'N/A'):.2f} seconds\n"
             )
+            file.write(f"Objective: {metadata.get('objective', 'weighted_total')}\n")
+
+        # Load throughput, if the data was loaded in this run
+        if metadata and metadata.get("data_loading"):
+            file.write("\nData Loading:\n")
+            file.write("-------------\n")
+            for table_name, stats in metadata["data_loading"].items():
+                file.write(
+                    f"{table_name}: {stats['bytes'] / 2**20:.2f} MiB in "
+                    f"{stats['seconds']:.2f}s ({stats['MiB_per_second']:.2f} MiB/s)\n"
+                )
+            file.write("\n")
 
         # Only write initial query time if it exists in metadata
         if "initial_query_time" in metadata:
@@ -47,22 +155,111 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
         for table_name, results in all_results.items():
             file.write(f"\n{table_name}:\n")
 
-            # Get baseline and best times
-            baseline_time = next(
-                (time for columns, time, _ in results if columns == []), None
+            # Get baseline and best objective values
+            baseline_result = next(
+                (result for result in results if _is_baseline(result[0], result[3])),
+                None,
             )
-            best_result = min(
+            baseline_time = baseline_result[1] if baseline_result else None
+            # Interleaved comparisons only declare a layout faster when the
+            # difference is significant
+            best_result = next(
+                (result for result in results if result[3].get("declared_best")),
+                None,
+            ) or min(
                 results, key=lambda x: x[1] if x[1] != float("inf") else float("inf")
             )
 
-            file.write(f"  Baseline Time: {baseline_time:.2f} seconds\n")
-            file.write(f"  Best Time: {best_result[1]:.2f} seconds\n")
+            if baseline_result:
+                file.write(
+                    f"  Baseline Time: {_execution_time(baseline_time, baseline_result[3]):.2f} seconds\n"
+                )
+            file.write(
+                f"  Best Time: {_execution_time(best_result[1], best_result[3]):.2f} seconds\n"
+            )
+            if baseline_result:
+                file.write(f"  Baseline Objective: {baseline_time:.4g}\n")
+            file.write(f"  Best Objective: {best_result[1]:.4g}\n")
             file.write(
                 f"  Best Partition: {best_result[0] if best_result[0] else 'None'}\n"
             )
+            if best_result[3].get("session_changes"):
+                file.write(
+                    "  Best Session Settings: "
+                    + ", ".join(
+                        f"{name}={value}"
+                        for name, value in best_result[3]["session_changes"].items()
+                    )
+                    + "\n"
+                )
+            if best_result[3].get("bucket_columns"):
+                file.write(
+                    f"  Best Buckets: {best_result[3]['bucket_columns']} into {best_result[3]['num_buckets']} buckets\n"
+                )
             if baseline_time and best_result[1] != float("inf"):
                 improvement = ((baseline_time - best_result[1]) / baseline_time) * 100
                 file.write(f"  Improvement: {improvement:.2f}%\n")
+            # Cold and warm cache measurements (QueryRunner cache modes)
+            for mode in ("cold", "warm"):
+                key = f"total_{mode}_seconds"
+                measured = [result for result in results if key in result[3]]
+                if not measured:
+                    continue
+                if baseline_result and key in baseline_result[3]:
+                    file.write(
+                        f"  Baseline {mode.capitalize()} Time: {baseline_result[3][key]:.2f} seconds\n"
+                    )
+                fastest = min(measured, key=lambda result: result[3][key])
+                file.write(
+                    f"  Fastest {mode.capitalize()} Partition: "
+                    f"{fastest[0] if fastest[0] else 'None'} ({fastest[3][key]:.2f} seconds)\n"
+                )
+            pruned_count = sum(1 for result in results if result[3].get("pruned"))
+            if pruned_count:
+                file.write(f"  Candidates Pruned: {pruned_count}\n")
+            if best_result[3].get("interleaved"):
+                file.write(f"  Interleaved Rounds: {best_result[3].get('rounds')}\n")
+                if "p_value" in best_result[3]:
+                    file.write(
+                        f"  Significance: faster than {best_result[3]['compared_with'] or 'None'} "
+                        f"(p = {best_result[3]['p_value']:.4f})\n"
+                    )
+                else:
+                    file.write("  Significance: no layout was significantly faster\n")
+
+            # Per-query regressions hidden behind the best total
+            baseline_query_times = next(
+                (
+                    layout.get("query_times", [])
+                    for columns, _, _, layout in results
+                    if _is_baseline(columns, layout)
+                ),
+                [],
+            )
+            changes = _query_changes(
+                baseline_query_times,
+                best_result[3].get("query_times", []),
+                regression_threshold,
+            )
+            regressed = [c for c in changes if c["status"] == "regressed"]
+            if regressed:
+                worst = max(regressed, key=lambda c: c["change_percent"])
+                file.write(
+                    f"  Regressed Queries (>{regression_threshold}%): {len(regressed)}, worst +{worst['change_percent']:.2f}%\n"
+                )
+
+    # Register the run in the results store
+    store = ResultsStore(results_db) if results_db else None
+    if store:
+        run_id = store.add_run(
+            os.path.normpath(report_dir),
+            algorithm_name,
+            data_size_MiB=metadata.get("data_size") if metadata else None,
+            timestamp=timestamp,
+            objective=metadata.get("objective") if metadata else None,
+            total_algorithm_time=metadata.get("total_time") if metadata else None,
+            collection=os.path.basename(os.path.dirname(report_dir)),
+        )
 
     # Write detailed results for each table as JSON
     for table_name, results in all_results.items():
@@ -70,7 +267,9 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
         json_report_filename = f"{report_dir}/{table_name}_report.json"
 
         # Count successfully tested column groups (finite execution time)
-        column_groups_tested = sum(1 for _, time, _ in results if time != float("inf"))
+        column_groups_tested = sum(
+            1 for _, time, _, _ in results if time != float("inf")
+        )
 
         # Create JSON object
         report_data = {
@@ -85,14 +284,50 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
             "results": [],
         }
 
-        # Find the baseline execution time
+        # Find the baseline execution time and objective value
         no_partition_time = next(
-            (time for columns, time, _ in results if columns == []), None
+            (
+                _execution_time(time, layout)
+                for columns, time, _, layout in results
+                if _is_baseline(columns, layout)
+            ),
+            None,
+        )
+        no_partition_objective = next(
+            (
+                time
+                for columns, time, _, layout in results
+                if _is_baseline(columns, layout)
+            ),
+            None,
+        )
+        baseline_query_times = next(
+            (
+                layout.get("query_times", [])
+                for columns, _, _, layout in results
+                if _is_baseline(columns, layout)
+            ),
+            [],
+        )
+        baseline_layout = next(
+            (
+                layout
+                for columns, _, _, layout in results
+                if _is_baseline(columns, layout)
+            ),
+            {},
+        )
+        report_data["regression_threshold_percent"] = regression_threshold
+        report_data["objective"] = (
+            metadata.get("objective", "weighted_total")
+            if metadata
+            else "weighted_total"
         )
 
         # Add results
-        for columns, time, cardinality_product in results:
-            if no_partition_time is not None and time != float("inf"):
+        for columns, objective_value, cardinality_product, layout in results:
+            time = _execution_time(objective_value, layout)
+            if no_partition_time and time != float("inf"):
                 time_diff_percent = (
                     (time - no_partition_time) / no_partition_time
                 ) * 100
@@ -104,6 +339,11 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
                 "execution_time_seconds": (
                     round(time, 4) if time != float("inf") else "inf"
                 ),
+                "objective_value": (
+                    round(objective_value, 4)
+                    if objective_value != float("inf")
+                    else "inf"
+                ),
                 "cardinality_product": cardinality_product,
                 "time_difference_percent": (
                     round(time_diff_percent, 2)
@@ -111,11 +351,72 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
                     else None
                 ),
             }
+            if no_partition_objective and objective_value != float("inf"):
+                result_item["objective_difference_percent"] = round(
+                    (objective_value - no_partition_objective)
+                    / no_partition_objective
+                    * 100,
+                    2,
+                )
+            if layout.get("pruned"):
+                result_item["pruned"] = True
+                result_item["prune_reason"] = layout.get("prune_reason")
+            if layout.get("filtered"):
+                result_item["filtered"] = True
+            if "repartition_seconds" in layout:
+                result_item["repartition_time_seconds"] = round(
+                    layout["repartition_seconds"], 4
+                )
+            for mode in ("cold", "warm"):
+                key = f"total_{mode}_seconds"
+                if key in layout:
+                    result_item[f"{mode}_time_seconds"] = round(layout[key], 4)
+                    if baseline_layout.get(key):
+                        result_item[f"{mode}_time_difference_percent"] = round(
+                            (layout[key] - baseline_layout[key])
+                            / baseline_layout[key]
+                            * 100,
+                            2,
+                        )
+            if "total_fetch_seconds" in layout:
+                result_item["execute_time_seconds"] = round(
+                    layout["total_execute_seconds"], 4
+                )
+                result_item["fetch_time_seconds"] = round(
+                    layout["total_fetch_seconds"], 4
+                )
+                result_item["rows_fetched"] = layout["total_rows"]
+                result_item["bytes_fetched"] = layout["total_bytes"]
+            if layout.get("plan"):
+                result_item["pruning_queries"] = sum(
+                    1 for query_plan in layout["plan"] if query_plan.get("pruned")
+                )
+                result_item["plan"] = layout["plan"]
+            if "session" in layout:
+                result_item["session"] = layout["session"]
+                result_item["session_changes"] = layout["session_changes"]
+            if layout.get("bucket_columns"):
+                result_item["bucket_columns"] = layout["bucket_columns"]
+                result_item["num_buckets"] = layout["num_buckets"]
+                result_item["sorted_by"] = layout.get("sorted_by", [])
+            if layout.get("query_times"):
+                changes = _query_changes(
+                    baseline_query_times, layout["query_times"], regression_threshold
+                )
+                result_item["improved_queries"] = sum(
+                    1 for c in changes if c["status"] == "improved"
+                )
+                result_item["regressed_queries"] = sum(
+                    1 for c in changes if c["status"] == "regressed"
+                )
+                result_item["query_times"] = changes
             report_data["results"].append(result_item)
 
         # Write JSON file
         with open(json_report_filename, "w") as file:
             json.dump(report_data, file, indent=2)
+        if store:
+            store.add_results(run_id, table_name, report_data["results"])
 
         # Also keep the text version for backward compatibility
         report_filename = f"{report_dir}/{table_name}_report.txt"
@@ -139,20 +440,81 @@ def write_consolidated_report(all_results, algorithm_name, metadata=None):
             )
             file.write(f"{'-' * 80}\n")
 
-            for columns, time, cardinality_product in results:
-                if no_partition_time is not None and time != float("inf"):
+            for columns, objective_value, cardinality_product, layout in results:
+                time = _execution_time(objective_value, layout)
+                if no_partition_time and time != float("inf"):
                     time_diff_percent = (
                         (time - no_partition_time) / no_partition_time
                     ) * 100
                 else:
                     time_diff_percent = None
 
+                if layout.get("pruned"):
+                    time_label = "pruned"
+                elif layout.get("filtered"):
+                    time_label = "filtered"
+                else:
+                    time_label = round(time, 4) if time != float("inf") else "inf"
+                file.write(
+                    f"{_layout_label(columns, layout):<30} {time_label:<20} {cardinality_product:<25} {time_diff_percent if time_diff_percent is None else round(time_diff_percent, 2)}\n"
+                )
+
+            # Write the per-query changes against the baseline
+            file.write(
+                f"\nPer-Query Changes vs. Baseline (threshold {regression_threshold}%)\n"
+            )
+            file.write(f"{'-' * 80}\n")
+            for columns, time, _, layout in results:
+                if _is_baseline(columns, layout) or not layout.get("query_times"):
+                    continue
+                changes = _query_changes(
+                    baseline_query_times, layout["query_times"], regression_threshold
+                )
+                improved = [c for c in changes if c["status"] == "improved"]
+                regressed = [c for c in changes if c["status"] == "regressed"]
+                file.write(
+                    f"{_layout_label(columns, layout)}: {len(improved)} improved, {len(regressed)} regressed\n"
+                )
+                for change in sorted(
+                    regressed, key=lambda c: c["change_percent"], reverse=True
+                ):
+                    file.write(
+                        f"  +{change['change_percent']:.2f}%  {change['query']}\n"
+                    )
+
+            # Write execution and fetch time separately when results were fetched
+            fetched = [r for r in results if "total_fetch_seconds" in r[3]]
+            if fetched:
+                file.write("\nResult Fetching\n")
+                file.write(
+                    f"{'Partition Columns':<30} {'Execute (s)':<15} {'Fetch (s)':<15} {'Rows':<15} {'Bytes'}\n"
+                )
+                file.write(f"{'-' * 80}\n")
+            for columns, _, _, layout in fetched:
+                file.write(
+                    f"{_layout_label(columns, layout):<30} {round(layout['total_execute_seconds'], 4):<15} {round(layout['total_fetch_seconds'], 4):<15} {layout['total_rows']:<15} {layout['total_bytes']}\n"
+                )
+
+            # Write which queries prune partitions, for layouts that were explained
+            explained = [result for result in results if result[3].get("plan")]
+            if explained:
+                file.write("\nPartition Pruning (EXPLAIN)\n")
+                file.write(f"{'-' * 80}\n")
+            for columns, _, _, layout in explained:
+                pruning = [p for p in layout["plan"] if p.get("pruned")]
                 file.write(
-                    f"{str(columns):<30} {round(time, 4) if time != float('inf') else 'inf':<20} {cardinality_product:<25} {time_diff_percent if time_diff_percent is None else round(time_diff_percent, 2)}\n"
+                    f"{_layout_label(columns, layout)}: {len(pruning)}/{len(layout['plan'])} queries prune partitions\n"
                 )
+                for query_plan in pruning:
+                    file.write(
+                        f"  {query_plan['partitions_read']} of {query_plan['total_partitions']}  {query_plan['query']}\n"
+                    )
 
         print(f"Results for table {table_name} have been written to:")
         print(f"  - Text report: {report_filename}")
         print(f"  - JSON report: {json_report_filename}")
 
+    if store:
+        store.close()
+        print(f"Results appended to {results_db}")
     print(f"All results and summary have been written to {report_dir}")
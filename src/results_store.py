@@ -0,0 +1,311 @@
+# results_store.py
+import json
+import os
+import re
+import sqlite3
+
+DEFAULT_RESULTS_DB = os.path.join("algorithm_reports", "results.sqlite")
+
+# Report directories saved for plotting are named algorithm_<n>_<size>
+REPORT_DIR_PATTERN = re.compile(r"^algorithm_(\w+?)_(\d+)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT UNIQUE,
+    collection TEXT,
+    algorithm TEXT,
+    data_size_MiB REAL,
+    timestamp TEXT,
+    objective TEXT,
+    total_algorithm_time REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    partition_columns TEXT NOT NULL,
+    column_count INTEGER,
+    bucket_columns TEXT,
+    num_buckets INTEGER,
+    execution_time_seconds REAL,
+    objective_value REAL,
+    time_difference_percent REAL,
+    cardinality_product INTEGER,
+    pruned INTEGER,
+    result_json TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_algorithm_size ON runs(algorithm, data_size_MiB);
+CREATE INDEX IF NOT EXISTS runs_collection ON runs(collection);
+CREATE INDEX IF NOT EXISTS results_run_table ON results(run_id, table_name);
+CREATE INDEX IF NOT EXISTS results_table_columns ON results(table_name, partition_columns);
+"""
+
+
+def _number(value):
+    """Convert a report value, where infinity is written as "inf", to a float."""
+    if value is None:
+        return None
+    return float(value)
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_RESULTS_DB):
+        """Single SQLite database holding the results of all algorithm runs.
+
+        Every consolidated report appends its results here, so plotting and
+        analysis can query one indexed table instead of parsing report
+        directories.
+
+        Args:
+            path: Path of the SQLite database file, created if missing
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def has_run(self, source):
+        """Return whether a run from the given source was already stored."""
+        row = self.conn.execute(
+            "SELECT 1 FROM runs WHERE source = ?", (source,)
+        ).fetchone()
+        return row is not None
+
+    def add_run(
+        self,
+        source,
+        algorithm,
+        data_size_MiB=None,
+        timestamp=None,
+        objective=None,
+        total_algorithm_time=None,
+        collection=None,
+    ):
+        """Register a run, replacing any earlier run from the same source.
+
+        Args:
+            source: Unique name of the run, usually its report directory
+
+        Returns:
+            int: The run id
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM runs WHERE source = ?", (source,))
+            cursor = self.conn.execute(
+                """
+                INSERT INTO runs (source, collection, algorithm, data_size_MiB,
+                    timestamp, objective, total_algorithm_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    source,
+                    collection,
+                    algorithm,
+                    data_size_MiB,
+                    timestamp,
+                    objective,
+                    total_algorithm_time,
+                ),
+            )
+        return cursor.lastrowid
+
+    def add_results(self, run_id, table_name, result_items):
+        """Append the result items of one table, as written to its JSON report."""
+        rows = []
+        for item in result_items:
+            partition_columns = item.get("partition_columns", [])
+            rows.append(
+                (
+                    run_id,
+                    table_name,
+                    ",".join(partition_columns),
+                    len(partition_columns),
+                    ",".join(item.get("bucket_columns", [])),
+                    item.get("num_buckets", 0),
+                    _number(item.get("execution_time_seconds")),
+                    _number(item.get("objective_value")),
+                    _number(item.get("time_difference_percent")),
+                    item.get("cardinality_product"),
+                    int(bool(item.get("pruned") or item.get("filtered"))),
+                    json.dumps(item),
+                )
+            )
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO results (run_id, table_name, partition_columns,
+                    column_count, bucket_columns, num_buckets,
+                    execution_time_seconds, objective_value,
+                    time_difference_percent, cardinality_product, pruned,
+                    result_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+
+    def import_report_dir(self, report_dir, collection=None):
+        """Import the JSON reports of one report directory.
+
+        Directories named algorithm_<n>_<size> take the algorithm and data
+        size from their name, like `plot_generation` does; others use the
+        values in the reports.
+
+        Returns:
+            int: The run id, or None if the directory holds no reports
+        """
+        report_files = sorted(
+            f for f in os.listdir(report_dir) if f.endswith("_report.json")
+        )
+        if not report_files:
+            return None
+
+        reports = []
+        for filename in report_files:
+            with open(os.path.join(report_dir, filename), "r") as file:
+                reports.append((filename, json.load(file)))
+
+        first = reports[0][1]
+        algorithm = first.get("algorithm")
+        data_size = first.get("data_size_MiB")
+        match = REPORT_DIR_PATTERN.match(os.path.basename(os.path.normpath(report_dir)))
+        if match:
+            algorithm = f"algorithm_{match.group(1)}"
+            data_size = int(match.group(2))
+
+        run_id = self.add_run(
+            os.path.normpath(report_dir),
+            algorithm,
+            data_size_MiB=data_size if data_size != "N/A" else None,
+            timestamp=first.get("timestamp"),
+            objective=first.get("objective"),
+            total_algorithm_time=(
+                first.get("total_algorithm_time")
+                if first.get("total_algorithm_time") != "N/A"
+                else None
+            ),
+            collection=collection,
+        )
+        for filename, report in reports:
+            table_name = report.get("table_name", filename.replace("_report.json", ""))
+            self.add_results(run_id, table_name, report.get("results", []))
+        return run_id
+
+    def import_reports(self, base_path, force=False):
+        """Import every report directory below `base_path` once.
+
+        The collection of each run is the name of the directory holding its
+        report directory, e.g. "march_8_reports". Directories that were
+        imported before are skipped unless `force` is set.
+
+        Returns:
+            list: Ids of the imported runs
+        """
+        run_ids = []
+        for directory, _, filenames in sorted(os.walk(base_path)):
+            if not any(f.endswith("_report.json") for f in filenames):
+                continue
+            if not force and self.has_run(os.path.normpath(directory)):
+                continue
+            collection = os.path.basename(os.path.dirname(os.path.normpath(directory)))
+            run_ids.append(self.import_report_dir(directory, collection))
+        return run_ids
+
+    def latest_run_id(self):
+        """Return the id of the most recent run, or 0 if there is none."""
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0] or 0
+
+    def latest_collection(self):
+        """Return the collection of the most recent run, or None if there is none."""
+        row = self.conn.execute(
+            "SELECT collection FROM runs ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def results(
+        self,
+        algorithm=None,
+        data_size_MiB=None,
+        table_name=None,
+        collection=None,
+        since_run_id=None,
+    ):
+        """Query stored results joined with their run.
+
+        All filters are optional. `since_run_id` only returns results of runs
+        added after that run, so callers can fetch new results incrementally.
+
+        Returns:
+            list: sqlite3.Row objects with the run and result columns
+        """
+        conditions = []
+        parameters = []
+        for column, value in (
+            ("runs.algorithm", algorithm),
+            ("runs.data_size_MiB", data_size_MiB),
+            ("results.table_name", table_name),
+            ("runs.collection", collection),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if since_run_id is not None:
+            conditions.append("runs.run_id > ?")
+            parameters.append(since_run_id)
+
+        query = """
+            SELECT runs.run_id, runs.source, runs.collection, runs.algorithm,
+                runs.data_size_MiB, runs.timestamp, runs.objective,
+                runs.total_algorithm_time, results.*
+            FROM results JOIN runs ON results.run_id = runs.run_id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY runs.run_id, results.result_id"
+        return self.conn.execute(query, parameters).fetchall()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Import saved report directories into the results store"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=["saved_algorithm_reports", "algorithm_reports"],
+        help="Directories to search for report directories",
+    )
+    parser.add_argument(
+        "--db", type=str, default=DEFAULT_RESULTS_DB, help="Results database"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-import report directories that were imported before",
+    )
+
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        for path in args.paths:
+            if not os.path.isdir(path):
+                print(f"Warning: {path} is not a directory, skipping.")
+                continue
+            run_ids = store.import_reports(path, force=args.force)
+            print(f"Imported {len(run_ids)} report directories from {path}")
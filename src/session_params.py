@@ -0,0 +1,63 @@
+# session_params.py
+import json
+
+# Tunable Hive session parameters and the values tried for each. The first
+# value is the one a session starts with.
+PARAMETER_SPACE = {
+    "hive.vectorized.execution.enabled": ["true", "false"],
+    "hive.exec.parallel": ["true", "false"],
+    "hive.exec.parallel.thread.number": [8, 4, 16],
+    "hive.exec.reducers.bytes.per.reducer": [256000000, 64000000, 1000000000],
+    "hive.exec.reducers.max": [1009, 64, 256],
+    "hive.auto.convert.join": ["true", "false"],
+    # Map-join threshold: tables smaller than this are broadcast
+    "hive.auto.convert.join.noconditionaltask.size": [10000000, 1000000, 100000000],
+    "hive.map.aggr": ["true", "false"],
+    "hive.map.aggr.hash.percentmemory": [0.5, 0.25, 0.75],
+}
+
+
+def load_space(path):
+    """Load a parameter space from a JSON file of {parameter: [values]}.
+
+    Useful for cluster-specific parameters such as
+    mapreduce.map.memory.mb, whose sensible values depend on the
+    containers.
+    """
+    with open(path, "r") as file:
+        space = json.load(file)
+    for name, values in space.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Parameter {name} needs a non-empty list of values")
+    return space
+
+
+def default_settings(space=None):
+    """Return the starting value of every parameter of the space."""
+    return {name: values[0] for name, values in (space or PARAMETER_SPACE).items()}
+
+
+def parse_settings(text):
+    """Parse "name=value,name=value" into a dictionary."""
+    settings = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"Expected name=value, got {item}")
+        settings[name.strip()] = value.strip()
+    return settings
+
+
+def apply_settings(cursor, settings):
+    """SET every parameter on the cursor's session."""
+    for name, value in settings.items():
+        cursor.execute(f"SET {name}={value}")
+
+
+def changed_settings(settings, reference):
+    """Return the parameters whose value differs from the one in `reference`."""
+    return {
+        name: value
+        for name, value in settings.items()
+        if str(reference.get(name)) != str(value)
+    }
@@ -1,6 +1,7 @@
 # table.py
 from pyhive.hive import Cursor
 import time
+from tracing import tracer
 
 
 class Table:
@@ -9,6 +10,9 @@ class Table:
         name: str,
         columns: list[tuple[str, str]] | None = None,
         partition: list[tuple[str, str]] | None = None,
+        bucket_columns: list[str] | None = None,
+        num_buckets: int = 0,
+        sorted_by: list[str] | None = None,
     ):
         """Define a table.
 
@@ -18,6 +22,11 @@ class Table:
             partition: List of (str, str) tuples in the same format as
                 `columns`. These define the columns that should be partitioned
                 on. This should be disjoint from `columns`.
+            bucket_columns: Names of regular columns to cluster the rows by
+                (CLUSTERED BY). Requires `num_buckets`.
+            num_buckets: Number of buckets the rows are hashed into.
+            sorted_by: Optional names of regular columns each bucket is
+                sorted by (SORTED BY).
         """
         self.name = name
         # Convert lists to dictionaries with column name as key and type as value
@@ -27,10 +36,21 @@ class Table:
         self.partition = (
             {} if partition is None else {name: type_ for name, type_ in partition}
         )
+        self.bucket_columns = [] if bucket_columns is None else list(bucket_columns)
+        self.num_buckets = num_buckets if self.bucket_columns else 0
+        self.sorted_by = [] if sorted_by is None else list(sorted_by)
         self.cardinalities = {}  # Dictionary to store column cardinalities
+        # Number of rows and bytes on disk, filled by `compute_cardinality`
+        self.row_count = None
+        self.size_bytes = None
 
     def compute_cardinality(self, cursor: Cursor):
-        """Compute the cardinality (number of unique values) for each column."""
+        """Compute the cardinality (number of unique values) for each column.
+
+        Also records the table's row count and size (see `compute_row_count`).
+        """
+        self.compute_row_count(cursor)
+
         all_columns = list(self.columns.keys()) + list(self.partition.keys())
 
         for col_name in all_columns:
@@ -54,14 +74,41 @@ class Table:
                 FROM {self.name}
                 """
 
-            cursor.execute(query)
-            result = cursor.fetchone()
+            with tracer.span("table.statistics", table=self.name, column=col_name):
+                cursor.execute(query)
+                result = cursor.fetchone()
             self.cardinalities[col_name] = result[0] if result else 0
 
             print(
                 f"Computed cardinality for {col_name} ({col_type}): {self.cardinalities[col_name]}"
             )
 
+    def compute_row_count(self, cursor: Cursor):
+        """Record the table's row count and, if the metastore knows it, its size."""
+        with tracer.span("table.statistics", table=self.name, column="*"):
+            cursor.execute(f"SELECT COUNT(*) FROM {self.name}")
+            result = cursor.fetchone()
+        self.row_count = result[0] if result else 0
+        self.size_bytes = self.compute_size(cursor)
+        print(f"Table {self.name} has {self.row_count} rows, {self.size_bytes} bytes")
+        return self.row_count
+
+    def compute_size(self, cursor: Cursor):
+        """Return the table's totalSize from DESCRIBE FORMATTED, or None."""
+        try:
+            cursor.execute(f"DESCRIBE FORMATTED {self.name}")
+            rows = cursor.fetchall()
+        except Exception:
+            return None
+        # Table parameters are listed as ("", key, value) rows
+        for row in rows:
+            cells = [str(cell).strip() if cell is not None else "" for cell in row]
+            if "totalSize" in cells[:-1]:
+                value = cells[cells.index("totalSize") + 1]
+                if value.isdigit():
+                    return int(value)
+        return None
+
     def create(self, cursor: Cursor):
         """Create the table in Hive.
 
@@ -88,6 +135,12 @@ class Table:
             query += ",\n".join(f"    {part_def}" for part_def in partition_defs)
             query += "\n)"
 
+        if self.bucket_columns:
+            query += f"\nCLUSTERED BY ({', '.join(self.bucket_columns)})"
+            if self.sorted_by:
+                query += f"\nSORTED BY ({', '.join(self.sorted_by)})"
+            query += f"\nINTO {self.num_buckets} BUCKETS"
+
         query += """
         ROW FORMAT DELIMITED
         FIELDS TERMINATED BY ','"""
@@ -95,14 +148,57 @@ class Table:
         cursor.execute(f"DROP TABLE IF EXISTS {self.name}")
         cursor.execute(query)
 
-    def repartition(self, cursor: Cursor, partition_columns: list[str]):
+    def repartition(
+        self,
+        cursor: Cursor,
+        partition_columns: list[str],
+        bucket_columns: list[str] | None = None,
+        num_buckets: int = 0,
+        sorted_by: list[str] | None = None,
+    ):
         """Repartition a table by creating a new partitioned table and transferring the data.
 
         Args:
             cursor: The cursor instance obtained from the Hive connection.
             partition_columns: List of column names to partition the table by.
-            These must be existing columns in the table.
+            These must be existing columns in the table. An empty list
+            converts the table back to an unpartitioned layout.
+            bucket_columns: Optional list of column names to bucket the table
+            by. These must not be partition columns.
+            num_buckets: Number of buckets, required with `bucket_columns`.
+            sorted_by: Optional list of column names to sort each bucket by.
         """
+        # Create temporary table name
+        temp_table_name = f"{self.name}_temp_{int(time.time())}"
+        temp_table = self.copy(
+            cursor,
+            temp_table_name,
+            partition_columns,
+            bucket_columns=bucket_columns,
+            num_buckets=num_buckets,
+            sorted_by=sorted_by,
+        )
+        self.replace_with(cursor, temp_table)
+
+    def copy(
+        self,
+        cursor: Cursor,
+        name: str,
+        partition_columns: list[str],
+        bucket_columns: list[str] | None = None,
+        num_buckets: int = 0,
+        sorted_by: list[str] | None = None,
+    ):
+        """Create a copy of the table's data with another layout.
+
+        The table itself is left unchanged. Arguments are as in
+        `repartition`, plus the name of the new table.
+
+        Returns:
+            Table: The new table
+        """
+        bucket_columns = bucket_columns or []
+        sorted_by = sorted_by or []
         # Get all current column names from both regular and partition columns
         all_current_columns = list(self.columns.keys()) + list(self.partition.keys())
 
@@ -111,6 +207,19 @@ class Table:
             if col not in all_current_columns:
                 raise ValueError(f"Column {col} not found in table {self.name}")
 
+        # Validate bucket columns: they must stay regular columns
+        for col in bucket_columns + sorted_by:
+            if col not in all_current_columns:
+                raise ValueError(f"Column {col} not found in table {self.name}")
+            if col in partition_columns:
+                raise ValueError(
+                    f"Column {col} cannot be both a partition and a bucket column"
+                )
+        if bucket_columns and num_buckets < 1:
+            raise ValueError("num_buckets must be positive when bucketing")
+        if sorted_by and not bucket_columns:
+            raise ValueError("sorted_by requires bucket_columns")
+
         # Create new column and partition dictionaries
         new_columns = {}
         new_partition = {}
@@ -126,33 +235,50 @@ class Table:
                 col_type = self.columns.get(col_name) or self.partition.get(col_name)
                 new_columns[col_name] = col_type
 
-        # Create temporary table name
-        temp_table_name = f"{self.name}_temp_{int(time.time())}"
-
-        # Create temporary table with new partitioning
+        # Create the new table with the new partitioning
         temp_table = Table(
-            name=temp_table_name,
+            name=name,
             columns=list(new_columns.items()),
             partition=list(new_partition.items()),
+            bucket_columns=bucket_columns,
+            num_buckets=num_buckets,
+            sorted_by=sorted_by,
         )
-        temp_table.create(cursor)
+        with tracer.span("table.create", table=name):
+            temp_table.create(cursor)
 
         # Insert data from old table into new table
         # Note: We need to select columns in the correct order
         all_columns = list(new_columns.keys()) + list(new_partition.keys())
         select_cols = ", ".join(all_columns)
 
+        # An empty partition list restores the unpartitioned layout
+        partition_clause = (
+            f"PARTITION ({', '.join(partition_columns)})" if partition_columns else ""
+        )
         insert_query = f"""
-        INSERT OVERWRITE TABLE {temp_table_name}
-        PARTITION ({', '.join(partition_columns)})
+        INSERT OVERWRITE TABLE {name}
+        {partition_clause}
         SELECT {select_cols} FROM {self.name}
         """
-        cursor.execute(insert_query)
+        with tracer.span("table.insert_overwrite", table=self.name):
+            cursor.execute(insert_query)
+        return temp_table
+
+    def replace_with(self, cursor: Cursor, other: "Table"):
+        """Replace the table by another one, e.g. a copy made with `copy`.
 
+        The other table is renamed to this table's name and this object takes
+        over its layout.
+        """
         # Drop old table and rename new table
-        cursor.execute(f"DROP TABLE {self.name}")
-        cursor.execute(f"ALTER TABLE {temp_table_name} RENAME TO {self.name}")
+        with tracer.span("table.swap", table=self.name):
+            cursor.execute(f"DROP TABLE {self.name}")
+            cursor.execute(f"ALTER TABLE {other.name} RENAME TO {self.name}")
 
         # Update the object's state to reflect new partitioning
-        self.columns = new_columns
-        self.partition = new_partition
+        self.columns = dict(other.columns)
+        self.partition = dict(other.partition)
+        self.bucket_columns = list(other.bucket_columns)
+        self.num_buckets = other.num_buckets
+        self.sorted_by = list(other.sorted_by)
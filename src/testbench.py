@@ -1,47 +1,104 @@
 import fake_data
 from table import Table
 from pyhive import hive
-from query_runner import QueryRunner
-from partition_manager import PartitionManager
+from query_runner import QueryRunner, CACHE_MODES, command_hook
+from session_params import apply_settings, default_settings, load_space, parse_settings
+from partition_manager import PartitionManager, OBJECTIVES
+from interleaved import min_rounds
 import argparse
 from report_generator import write_consolidated_report
+from tracing import tracer, export_chrome_trace
+import metrics
 from datetime import datetime
 
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
+import queue
+import threading
 import time
 
 
-class Testbench:
-    def __init__(self, data_size_MiB=2):
-        self.conn = hive.Connection(host="localhost", port=10000)
-        self.cursor = self.conn.cursor()
-        self.data_size_MiB = data_size_MiB
+def connect(
+    host="localhost", port=10000, max_partition_product=1000, session_settings=None
+):
+    """Open a Hive connection with the session settings of the testbench.
 
-        # Correct memory settings
-        # self.cursor.execute("SET mapreduce.map.memory.mb=3072")
-        # self.cursor.execute("SET mapreduce.reduce.memory.mb=3072")
-        # self.cursor.execute("SET hive.map.aggr.hash.percentmemory=0.5")
-        # self.cursor.execute("SET hive.exec.reducers.max=1000")
-        # self.cursor.execute("SET hive.vectorized.execution.enabled=true")
+    Args:
+        session_settings: Session parameters overriding the starting values
+            of the tunable parameters (see session_params.py)
+    """
+    conn = hive.Connection(host=host, port=port)
+    cursor = conn.cursor()
 
-        # Parallel execution
-        self.cursor.execute("SET hive.exec.parallel=true")
-        self.cursor.execute("SET hive.exec.parallel.thread.number=8")
+    # Tunable parameters: vectorization, parallel execution, reducers,
+    # map joins and map-side aggregation
+    apply_settings(cursor, dict(default_settings(), **(session_settings or {})))
 
-        self.MAX_PARTITION_PRODUCT = 1000
-        self.cursor.execute(
-            f"SET hive.exec.max.dynamic.partitions={self.MAX_PARTITION_PRODUCT + 5}"
-        )
-        self.cursor.execute(
-            f"SET hive.exec.max.dynamic.partitions.pernode={self.MAX_PARTITION_PRODUCT + 5}"
-        )
+    # Let joins on bucketed tables use bucket map joins
+    cursor.execute("SET hive.optimize.bucketmapjoin=true")
+    cursor.execute("SET hive.optimize.bucketmapjoin.sortedmerge=true")
 
-        # Load column frequency dictionary
+    cursor.execute(f"SET hive.exec.max.dynamic.partitions={max_partition_product + 5}")
+    cursor.execute(
+        f"SET hive.exec.max.dynamic.partitions.pernode={max_partition_product + 5}"
+    )
+    return conn
+
+
+class Testbench:
+    def __init__(
+        self,
+        data_size_MiB=2,
+        objective="weighted_total",
+        prune_factor=None,
+        query_timeout=None,
+        candidate_timeout=None,
+        explain_filter=False,
+        fetch_results=False,
+        arraysize=10000,
+        queries_dir=None,
+        representatives=None,
+        table_files_only=False,
+        compression=None,
+        load_workers=4,
+        host="localhost",
+        port=10000,
+        max_partition_product=1000,
+        target_rows_per_partition=None,
+        target_bytes_per_partition=None,
+        min_partitions=1,
+        max_partitions=None,
+        interleaved_rounds=None,
+        max_materialized=4,
+        significance_level=0.05,
+        cache_mode="default",
+        priming_runs=1,
+        drop_caches_command=None,
+        session_settings=None,
+    ):
+        # Fixed partition limit, used when no target partition size is given
+        self.MAX_PARTITION_PRODUCT = max_partition_product
+        self.host = host
+        self.port = port
+        # Session parameters overriding the starting values of every
+        # connection (see session_params.py)
+        self.session_settings = session_settings or {}
+        self.conn = self._connect()
+        self.cursor = self.conn.cursor()
+        self.data_size_MiB = data_size_MiB
+        # Per-table load statistics, filled when the data is (re)loaded
+        self.load_stats = {}
+
+        # Load column frequency dictionary. A generated workload comes with
+        # its own (see workload_generator.py).
+        column_freq_path = os.path.join(os.getcwd(), "src", "column_freq_dict.json")
+        if queries_dir and os.path.exists(
+            os.path.join(queries_dir, "column_freq_dict.json")
+        ):
+            column_freq_path = os.path.join(queries_dir, "column_freq_dict.json")
         self.column_freq_dict = {}
-        with open(
-            os.path.join(os.getcwd(), "src", "column_freq_dict.json"), "r"
-        ) as file:
+        with open(column_freq_path, "r") as file:
             self.column_freq_dict = json.load(file)
 
         # Load table schemas
@@ -74,26 +131,39 @@ class Testbench:
             self.base_data_dir, "current_loaded.txt"
         )
 
-        # Check if we need to generate new data
-        should_generate = (
-            not os.path.exists(self.size_data_dir)
-            or len(os.listdir(self.size_data_dir)) == 0
+        # Check if we need to generate new data, in the requested compression
+        data_files = {
+            table_name: fake_data.data_filename(table_name, compression)
+            for table_name in self.tables
+        }
+        should_generate = not all(
+            os.path.exists(os.path.join(self.size_data_dir, filename))
+            for filename in data_files.values()
         )
 
-        # Check if this size data is already loaded in Hive
+        # Check if this size data is already loaded in Hive. Compressed files
+        # hold different random data, so the marker records the compression.
+        loaded_marker = (
+            str(data_size_MiB) + fake_data.COMPRESSION_EXTENSIONS[compression]
+        )
         current_loaded_size = None
         if os.path.exists(self.current_data_marker):
             with open(self.current_data_marker, "r") as file:
                 current_loaded_size = file.read().strip()
 
-        needs_loading = str(data_size_MiB) != current_loaded_size
+        needs_loading = loaded_marker != current_loaded_size
 
         # Generate data if needed
         if should_generate:
             print(
                 f"Generating {data_size_MiB} MiB of fake data in {self.size_data_dir}"
             )
-            fake_data.generate_data(data_size_MiB, output_dir=self.size_data_dir)
+            with tracer.span("testbench.generate_data", size_MiB=data_size_MiB):
+                fake_data.generate_data(
+                    data_size_MiB,
+                    output_dir=self.size_data_dir,
+                    compression=compression,
+                )
 
             # Since we generated new data, we need to load it
             needs_loading = True
@@ -114,29 +184,11 @@ class Testbench:
 
         # Load data into tables if needed
         if needs_loading:
-            # Setup for data loading
-            for table_name in self.tables:
-                source_path = os.path.join(self.size_data_dir, f"{table_name}.csv")
-
-                if not os.path.exists(source_path):
-                    print(f"Warning: CSV file not found: {source_path}")
-                    continue
-
-                print(f"Loading {table_name} from size {data_size_MiB} dataset...")
-
-                try:
-                    # Try loading directly from the size directory
-                    self.cursor.execute(
-                        f"LOAD DATA LOCAL INPATH 'file:///data/{data_size_MiB}/{table_name}.csv' OVERWRITE INTO TABLE {table_name}"
-                    )
-                    print(f"Successfully loaded {table_name} from size directory.")
-                except Exception as e:
-                    print(f"Error loading {table_name}: {e}")
-                    print(f"Could not load {table_name}. This table may be empty.")
+            self.load_stats = self._load_tables(data_size_MiB, data_files, load_workers)
 
             # Update current loaded data marker
             with open(self.current_data_marker, "w") as file:
-                file.write(str(data_size_MiB))
+                file.write(loaded_marker)
             print(f"Data loading operations complete.")
         else:
             print(
@@ -145,25 +197,232 @@ class Testbench:
 
         # Compute cardinalities
         for table in self.tables.values():
-            table.compute_cardinality(self.cursor)
+            with tracer.span("testbench.statistics", table=table.name):
+                table.compute_cardinality(self.cursor)
+
+        # Initialize utility objects. The options are kept to build the same
+        # objects over other connections (see `optimize_parallel`).
+        self.query_runner_options = dict(
+            query_timeout=query_timeout,
+            candidate_timeout=candidate_timeout,
+            fetch_results=fetch_results,
+            arraysize=arraysize,
+            queries_dir=queries_dir,
+            representatives=representatives,
+            schema=schemas,
+            select_by_index=not table_files_only,
+            cache_mode=cache_mode,
+            priming_runs=priming_runs,
+            drop_caches=(
+                command_hook(drop_caches_command) if drop_caches_command else None
+            ),
+        )
+        self.partition_manager_options = dict(
+            objective=objective,
+            prune_factor=prune_factor,
+            explain_filter=explain_filter,
+            target_rows_per_partition=target_rows_per_partition,
+            target_bytes_per_partition=target_bytes_per_partition,
+            min_partitions=min_partitions,
+            max_partitions=max_partitions,
+            interleaved_rounds=interleaved_rounds,
+            max_materialized=max_materialized,
+            significance_level=significance_level,
+        )
+        self.query_runner, self.partition_manager = self._optimizer(self.cursor)
+        for table_name in self.tables:
+            print(
+                f"Partition limit for {table_name}: "
+                f"{self.partition_manager.partition_limit(table_name)}"
+            )
+
+    def _optimizer(self, cursor, **query_runner_options):
+        """Return a QueryRunner and PartitionManager working over `cursor`."""
+        query_runner = QueryRunner(
+            cursor, **dict(self.query_runner_options, **query_runner_options)
+        )
+        partition_manager = PartitionManager(
+            self.tables,
+            cursor,
+            self.column_freq_dict,
+            self.MAX_PARTITION_PRODUCT,
+            **self.partition_manager_options,
+        )
+        return query_runner, partition_manager
 
-        # Initialize utility objects
-        self.query_runner = QueryRunner(self.cursor)
-        self.partition_manager = PartitionManager(
-            self.tables, self.cursor, self.column_freq_dict, self.MAX_PARTITION_PRODUCT
+    def _connect(self):
+        """Open a connection to the testbench's HiveServer2 endpoint."""
+        return connect(
+            self.host, self.port, self.MAX_PARTITION_PRODUCT, self.session_settings
         )
 
+    def _load_tables(self, data_size_MiB, data_files, load_workers):
+        """Load the data files of all tables concurrently.
+
+        A HiveServer2 session runs one statement at a time, so every worker
+        takes its own connection from a pool and the loads run in parallel.
+
+        Args:
+            data_size_MiB: Size of the dataset, the name of its directory
+            data_files: {table name: data file name in that directory}
+            load_workers: Number of concurrent loads
+
+        Returns:
+            dict: {table name: {"bytes", "seconds", "MiB_per_second"}} of the
+                tables that loaded successfully
+        """
+        loads = {}
+        for table_name, filename in data_files.items():
+            source_path = os.path.join(self.size_data_dir, filename)
+            if not os.path.exists(source_path):
+                print(f"Warning: CSV file not found: {source_path}")
+                continue
+            loads[table_name] = filename
+            print(f"Loading {table_name} from size {data_size_MiB} dataset...")
+
+        pool = queue.Queue()
+        for _ in range(max(1, min(load_workers, len(loads)))):
+            pool.put(self._connect())
+
+        def load(table_name, filename):
+            size = os.path.getsize(os.path.join(self.size_data_dir, filename))
+            conn = pool.get()
+            try:
+                with tracer.span("testbench.load", table=table_name, bytes=size):
+                    start = time.time()
+                    conn.cursor().execute(
+                        f"LOAD DATA LOCAL INPATH 'file:///data/{data_size_MiB}/{filename}' OVERWRITE INTO TABLE {table_name}"
+                    )
+                    seconds = time.time() - start
+            finally:
+                pool.put(conn)
+            metrics.bytes_loaded.inc(size, table=table_name)
+            throughput = size / seconds if seconds > 0 else float("inf")
+            metrics.load_throughput.set(throughput, table=table_name)
+            print(
+                f"Loaded {table_name}: {size / 2**20:.2f} MiB in {seconds:.2f}s "
+                f"({throughput / 2**20:.2f} MiB/s)"
+            )
+            return {
+                "bytes": size,
+                "seconds": seconds,
+                "MiB_per_second": throughput / 2**20,
+            }
+
+        load_stats = {}
+        with ThreadPoolExecutor(max_workers=pool.qsize()) as executor:
+            futures = {
+                executor.submit(load, table_name, filename): table_name
+                for table_name, filename in loads.items()
+            }
+            for future, table_name in futures.items():
+                try:
+                    load_stats[table_name] = future.result()
+                except Exception as e:
+                    print(f"Error loading {table_name}: {e}")
+                    print(f"Could not load {table_name}. This table may be empty.")
+
+        while not pool.empty():
+            pool.get().close()
+        return load_stats
+
     def run(self):
         """Run all queries and return execution time."""
         return self.query_runner.run()
 
     def algorithm1(self, table_name):
         """Run algorithm 1 for the given table."""
-        return self.partition_manager.algorithm1(table_name, self.query_runner)
+        with tracer.span("testbench.algorithm1", table=table_name):
+            return self.partition_manager.algorithm1(table_name, self.query_runner)
 
     def algorithm2(self, table_name):
         """Run algorithm 2 for the given table."""
-        return self.partition_manager.algorithm2(table_name, self.query_runner)
+        with tracer.span("testbench.algorithm2", table=table_name):
+            return self.partition_manager.algorithm2(table_name, self.query_runner)
+
+    def algorithm3(self, table_name):
+        """Run algorithm 3 (partitioning plus bucketing) for the given table."""
+        with tracer.span("testbench.algorithm3", table=table_name):
+            return self.partition_manager.algorithm3(table_name, self.query_runner)
+
+    def optimize_parallel(
+        self, algorithm, table_names, parallel_tables, exclusive_timing=False
+    ):
+        """Run an algorithm on several tables concurrently.
+
+        Every table gets its own connection, QueryRunner and
+        PartitionManager. Queries that read another table of `table_names`
+        are left out of a table's workload, since that table may be
+        mid-repartition; their number is printed per table. Tables joined
+        with each other are better optimized together (see `joint`).
+        A table whose run fails gets an infinite-time result holding the
+        error, and the other tables still complete.
+
+        Args:
+            algorithm: 1, 2 or 3
+            table_names: Tables to optimize
+            parallel_tables: Number of tables optimized at the same time
+            exclusive_timing: Whether measurements of different tables are
+                serialized, so they do not compete for the cluster; the
+                repartitioning still overlaps
+
+        Returns:
+            dict: Results of each table, in the order of `table_names`
+        """
+        timing_lock = threading.Lock() if exclusive_timing else None
+
+        def optimize(table_name):
+            conn = self._connect()
+            try:
+                query_runner, partition_manager = self._optimizer(
+                    conn.cursor(),
+                    exclude_tables=set(table_names) - {table_name},
+                    timing_lock=timing_lock,
+                )
+                excluded = query_runner.excluded_queries(table_name)
+                if excluded:
+                    print(
+                        f"{table_name}: leaving out {len(excluded)} queries that also "
+                        "read tables optimized concurrently."
+                    )
+                with tracer.span(f"testbench.algorithm{algorithm}", table=table_name):
+                    return getattr(partition_manager, f"algorithm{algorithm}")(
+                        table_name, query_runner
+                    )
+            finally:
+                conn.close()
+
+        with ThreadPoolExecutor(max_workers=parallel_tables) as executor:
+            futures = {
+                table_name: executor.submit(optimize, table_name)
+                for table_name in table_names
+            }
+        all_results = {}
+        for table_name, future in futures.items():
+            try:
+                all_results[table_name] = future.result()
+            except Exception as e:
+                print(f"Optimizing {table_name} failed: {e}")
+                all_results[table_name] = [([], float("inf"), 1, {"error": str(e)})]
+        return all_results
+
+    def session_search(self, table_name, space=None, max_measurements=40):
+        """Search session parameters together with the table's partition columns."""
+        with tracer.span("testbench.session_search", table=table_name):
+            return self.partition_manager.session_search(
+                table_name,
+                self.query_runner,
+                space=space,
+                settings=self.session_settings,
+                max_measurements=max_measurements,
+            )
+
+    def joint(self, table_names, max_candidates=20):
+        """Run the joint partitioning search for a group of joined tables."""
+        with tracer.span("testbench.joint", tables=list(table_names)):
+            return self.partition_manager.joint_algorithm(
+                table_names, self.query_runner, max_candidates
+            )
 
 
 def main():
@@ -176,9 +435,9 @@ def main():
     parser.add_argument(
         "--algorithm",
         type=int,
-        choices=[1, 2],
+        choices=[1, 2, 3],
         default=1,
-        help="Algorithm to run (1 or 2)",
+        help="Algorithm to run (1, 2, or 3 for partitioning plus bucketing)",
     )
     parser.add_argument(
         "--tables",
@@ -186,13 +445,298 @@ def main():
         help="Comma-separated list of tables to run the algorithm on (e.g., 'users,orders'). If not specified, runs on all tables.",
         default=None,
     )
+    parser.add_argument(
+        "--joint",
+        type=str,
+        help="Comma-separated list of joined tables to optimize together (e.g., 'orders,order_items'). Replaces the per-table algorithm run.",
+        default=None,
+    )
+    parser.add_argument(
+        "--joint_budget",
+        type=int,
+        default=20,
+        help="Maximum number of layouts measured by the joint search",
+    )
+    parser.add_argument(
+        "--session",
+        type=str,
+        default=None,
+        help="Comma-separated name=value session parameters applied to every connection, overriding the starting values (e.g. 'hive.vectorized.execution.enabled=false')",
+    )
+    parser.add_argument(
+        "--session_search",
+        type=int,
+        default=None,
+        help="Search session parameters together with each table's partition columns, measuring at most this many configurations per table. Replaces the per-table algorithm run",
+    )
+    parser.add_argument(
+        "--session_space",
+        type=str,
+        default=None,
+        help="JSON file of {parameter: [values]} to search with --session_search, the first value being the starting one (default: the space in session_params.py)",
+    )
+    parser.add_argument(
+        "--objective",
+        type=str,
+        choices=OBJECTIVES,
+        default="weighted_total",
+        help="Objective used to rank layouts, computed from the per-query weights and SLO targets of the workload",
+    )
+    parser.add_argument(
+        "--prune_factor",
+        type=float,
+        default=None,
+        help="Cancel a candidate once its running time exceeds the best time so far times this factor (e.g. 1.5)",
+    )
+    parser.add_argument(
+        "--query_timeout",
+        type=float,
+        default=None,
+        help="Seconds after which a single query is cancelled and its candidate pruned",
+    )
+    parser.add_argument(
+        "--candidate_timeout",
+        type=float,
+        default=None,
+        help="Seconds after which all queries of a candidate are cancelled and the candidate pruned",
+    )
+    parser.add_argument(
+        "--explain_filter",
+        action="store_true",
+        help="Inspect query plans with EXPLAIN after each repartition and skip timing layouts that no query prunes",
+    )
+    parser.add_argument(
+        "--fetch_results",
+        action="store_true",
+        help="Consume query results with fetchmany so the measured time includes transfer cost",
+    )
+    parser.add_argument(
+        "--arraysize",
+        type=int,
+        default=10000,
+        help="Rows per fetchmany batch when fetching results",
+    )
+    parser.add_argument(
+        "--regression_threshold",
+        type=float,
+        default=10.0,
+        help="Percent slowdown against the baseline at which a single query is reported as regressed",
+    )
+    parser.add_argument(
+        "--queries_dir",
+        type=str,
+        default=None,
+        help="Directory with the workload files, e.g. one written by workload_generator.py (default: src/queries)",
+    )
+    parser.add_argument(
+        "--representatives",
+        type=int,
+        default=None,
+        help="Group queries that differ only in literals into templates, measure this many per template and extrapolate the total with the template counts",
+    )
+    parser.add_argument(
+        "--table_files_only",
+        action="store_true",
+        help="Measure each table with only the queries of its own workload file instead of every query touching the table",
+    )
+    parser.add_argument(
+        "--target_rows_per_partition",
+        type=int,
+        default=None,
+        help="Derive each table's partition limit as its row count divided by this instead of using --max_partition_product",
+    )
+    parser.add_argument(
+        "--target_bytes_per_partition",
+        type=int,
+        default=None,
+        help="Derive each table's partition limit as its size in bytes divided by this instead of using --max_partition_product (the stricter of the two targets applies)",
+    )
+    parser.add_argument(
+        "--min_partitions",
+        type=int,
+        default=8,
+        help="Floor of the derived partition limit",
+    )
+    parser.add_argument(
+        "--max_partitions",
+        type=int,
+        default=10000,
+        help="Ceiling of the derived partition limit",
+    )
+    parser.add_argument(
+        "--max_partition_product",
+        type=int,
+        default=1000,
+        help="Fixed partition limit of every table, unless a target per partition is given",
+    )
+    parser.add_argument(
+        "--interleaved_rounds",
+        type=int,
+        default=None,
+        help="With --algorithm 1, keep several layouts materialized side by side and measure them in this many rounds of randomized order instead of once each",
+    )
+    parser.add_argument(
+        "--max_materialized",
+        type=int,
+        default=4,
+        help="Maximum number of layouts of a table materialized at once with --interleaved_rounds",
+    )
+    parser.add_argument(
+        "--significance_level",
+        type=float,
+        default=0.05,
+        help="p-value below which an interleaved layout is declared faster than the current best one",
+    )
+    parser.add_argument(
+        "--cache_mode",
+        choices=CACHE_MODES,
+        default="default",
+        help="cold: time each query after --drop_caches_command; warm: after --priming_runs untimed runs; both: time a cold and then a warm run. All but default disable the query results cache",
+    )
+    parser.add_argument(
+        "--priming_runs",
+        type=int,
+        default=1,
+        help="Untimed runs of each query before its warm measurement",
+    )
+    parser.add_argument(
+        "--drop_caches_command",
+        type=str,
+        default=None,
+        help="Shell command run before each cold measurement, e.g. to drop the OS page cache on the workers",
+    )
+    parser.add_argument(
+        "--host", type=str, default="localhost", help="HiveServer2 host"
+    )
+    parser.add_argument("--port", type=int, default=10000, help="HiveServer2 port")
+    parser.add_argument(
+        "--compression",
+        choices=["gzip", "bz2"],
+        default=None,
+        help="Generate and load compressed CSV files, which Hive decompresses natively",
+    )
+    parser.add_argument(
+        "--load_workers",
+        type=int,
+        default=4,
+        help="Number of tables loaded concurrently, each over its own connection",
+    )
+    parser.add_argument(
+        "--parallel_tables",
+        type=int,
+        default=1,
+        help="Optimize this many tables concurrently, each over its own connection. Queries joining two of the processed tables are left out of their workloads",
+    )
+    parser.add_argument(
+        "--exclusive_timing",
+        action="store_true",
+        help="With --parallel_tables, never measure two tables' queries at the same time",
+    )
+    parser.add_argument(
+        "--metrics_file",
+        type=str,
+        default=None,
+        help="Periodically write optimizer metrics to this Prometheus textfile (e.g. for the node exporter's textfile collector)",
+    )
+    parser.add_argument(
+        "--metrics_interval",
+        type=float,
+        default=15.0,
+        help="Seconds between metrics textfile writes",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Write timed spans of loading, statistics, repartitioning and queries to this JSON-lines file, plus a Chrome trace next to it",
+    )
 
     args = parser.parse_args()
 
+    if args.interleaved_rounds and (
+        args.joint or args.session_search or args.algorithm != 1
+    ):
+        print("Error: --interleaved_rounds only applies to --algorithm 1.")
+        return
+    if (
+        args.interleaved_rounds
+        and args.objective != "weighted_total"
+        and args.interleaved_rounds < min_rounds(args.significance_level)
+    ):
+        print(
+            f"Error: with --objective {args.objective}, rounds are compared by their "
+            f"objective values, which needs --interleaved_rounds of at least "
+            f"{min_rounds(args.significance_level)}."
+        )
+        return
+    if args.representatives is not None and args.representatives < 1:
+        print("Error: --representatives must be at least 1.")
+        return
+    if args.cache_mode in ("cold", "both") and not args.drop_caches_command:
+        print(
+            f"Warning: --cache_mode {args.cache_mode} without --drop_caches_command "
+            "only disables the query results cache; the OS page cache and the "
+            "JVM caches stay warm, so the cold timings are not cold."
+        )
+
+    if args.trace:
+        tracer.configure(args.trace)
+
+    metrics_flusher = None
+    if args.metrics_file:
+        metrics_flusher = metrics.Flusher(
+            metrics.registry, args.metrics_file, args.metrics_interval
+        )
+        metrics_flusher.start()
+
+    # Tear tracing and metrics down even when the run stops early or fails
+    try:
+        run(args)
+    finally:
+        if metrics_flusher is not None:
+            metrics_flusher.stop()
+
+        if args.trace:
+            tracer.close()
+            chrome_trace = os.path.splitext(args.trace)[0] + ".chrome.json"
+            export_chrome_trace(args.trace, chrome_trace)
+            print(f"Trace written to {args.trace} (Chrome trace: {chrome_trace})")
+
+
+def run(args):
+    """Run the algorithm chosen on the command line and write its report."""
     # Record start time for total execution
     start_time = time.time()
 
-    tb = Testbench(data_size_MiB=args.data_size)
+    tb = Testbench(
+        data_size_MiB=args.data_size,
+        objective=args.objective,
+        prune_factor=args.prune_factor,
+        query_timeout=args.query_timeout,
+        candidate_timeout=args.candidate_timeout,
+        explain_filter=args.explain_filter,
+        fetch_results=args.fetch_results,
+        arraysize=args.arraysize,
+        queries_dir=args.queries_dir,
+        representatives=args.representatives,
+        table_files_only=args.table_files_only,
+        compression=args.compression,
+        load_workers=args.load_workers,
+        host=args.host,
+        port=args.port,
+        max_partition_product=args.max_partition_product,
+        target_rows_per_partition=args.target_rows_per_partition,
+        target_bytes_per_partition=args.target_bytes_per_partition,
+        min_partitions=args.min_partitions,
+        max_partitions=args.max_partitions,
+        interleaved_rounds=args.interleaved_rounds,
+        max_materialized=args.max_materialized,
+        significance_level=args.significance_level,
+        cache_mode=args.cache_mode,
+        priming_runs=args.priming_runs,
+        drop_caches_command=args.drop_caches_command,
+        session_settings=parse_settings(args.session) if args.session else None,
+    )
 
     # Run queries before repartitioning
     # exec_time_1 = tb.run()
@@ -202,31 +746,69 @@ def main():
     all_results = {}
 
     # Determine which tables to process
-    if args.tables:
+    if args.joint:
+        requested_tables = [t.strip() for t in args.joint.split(",")]
+    elif args.tables:
         requested_tables = [t.strip() for t in args.tables.split(",")]
-        invalid_tables = [t for t in requested_tables if t not in tb.tables]
-        if invalid_tables:
-            print(f"Error: Table(s) not found: {invalid_tables}")
-            print(f"Available tables: {list(tb.tables.keys())}")
+    else:
+        requested_tables = list(tb.tables.keys())
+
+    invalid_tables = [t for t in requested_tables if t not in tb.tables]
+    if invalid_tables:
+        print(f"Error: Table(s) not found: {invalid_tables}")
+        print(f"Available tables: {list(tb.tables.keys())}")
+        return
+    tables_to_process = requested_tables
+
+    if args.joint:
+        # Optimize the join partners as a unit
+        print(f"Running joint optimization on tables: {tables_to_process}")
+        algorithm_name = "algorithm_joint"
+        all_results["+".join(tables_to_process)] = tb.joint(
+            tables_to_process, args.joint_budget
+        )
+    elif args.session_search:
+        algorithm_name = "algorithm_session"
+        space = load_space(args.session_space) if args.session_space else None
+        for table_name in tables_to_process:
+            print(f"Running the session parameter search on table: {table_name}")
+            all_results[table_name] = tb.session_search(
+                table_name, space, args.session_search
+            )
+    elif args.parallel_tables > 1:
+        if args.algorithm not in (1, 2, 3):
+            print(f"Error: Algorithm {args.algorithm} is not supported.")
             return
-        tables_to_process = requested_tables
+        algorithm_name = f"algorithm_{args.algorithm}"
+        print(
+            f"Running Algorithm {args.algorithm} on {args.parallel_tables} tables "
+            f"at a time: {tables_to_process}"
+        )
+        all_results = tb.optimize_parallel(
+            args.algorithm,
+            tables_to_process,
+            args.parallel_tables,
+            exclusive_timing=args.exclusive_timing,
+        )
     else:
-        tables_to_process = list(tb.tables.keys())
+        algorithm_name = f"algorithm_{args.algorithm}"
 
-    # Iterate over selected tables and run the chosen algorithm
-    for table_name in tables_to_process:
-        print(f"Running Algorithm {args.algorithm} on table: {table_name}")
+        # Iterate over selected tables and run the chosen algorithm
+        for table_name in tables_to_process:
+            print(f"Running Algorithm {args.algorithm} on table: {table_name}")
 
-        if args.algorithm == 1:
-            results = tb.algorithm1(table_name)
-        elif args.algorithm == 2:
-            results = tb.algorithm2(table_name)
-        else:
-            print(f"Error: Algorithm {args.algorithm} is not supported.")
-            return
+            if args.algorithm == 1:
+                results = tb.algorithm1(table_name)
+            elif args.algorithm == 2:
+                results = tb.algorithm2(table_name)
+            elif args.algorithm == 3:
+                results = tb.algorithm3(table_name)
+            else:
+                print(f"Error: Algorithm {args.algorithm} is not supported.")
+                return
 
-        # Store the results
-        all_results[table_name] = results
+            # Store the results
+            all_results[table_name] = results
 
     # Calculate total execution time
     total_time = time.time() - start_time
@@ -236,14 +818,23 @@ def main():
         "data_size": args.data_size,
         "total_time": total_time,
         # "initial_all_query_time": exec_time_1,
-        "algorithm_version": args.algorithm,
-        "num_tables_processed": len(tables_to_process),
+        "algorithm_version": (
+            "joint"
+            if args.joint
+            else "session" if args.session_search else args.algorithm
+        ),
+        "objective": args.objective,
+        "num_tables_processed": len(all_results),
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "total_tables_available": len(tb.tables),
+        "data_loading": tb.load_stats,
     }
 
     write_consolidated_report(
-        all_results, algorithm_name=f"algorithm_{args.algorithm}", metadata=metadata
+        all_results,
+        algorithm_name=algorithm_name,
+        metadata=metadata,
+        regression_threshold=args.regression_threshold,
     )
 
 
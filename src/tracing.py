@@ -0,0 +1,149 @@
+# tracing.py
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+    def __init__(self, path=None):
+        """Record nested, timed spans as JSON lines.
+
+        Args:
+            path: File to write span events to. Tracing is disabled (and
+                spans cost next to nothing) until a path is configured.
+        """
+        self._file = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        if path:
+            self.configure(path)
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def configure(self, path):
+        """Start writing span events to the given JSON-lines file.
+
+        The file is truncated, so it (and a Chrome trace exported from it)
+        only holds the events of this run.
+        """
+        self.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w")
+
+    def close(self):
+        """Stop tracing and close the output file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time a block of code as a span nested in the enclosing span.
+
+        The yielded dictionary holds the span's attributes; values added to
+        it inside the block are written with the span.
+
+        Example:
+            with tracer.span("repartition", table="orders") as span:
+                ...
+                span["rows"] = 1000
+        """
+        if not self.enabled:
+            yield attrs
+            return
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span_id = next(self._ids)
+        parent_id = stack[-1] if stack else None
+        stack.append(span_id)
+
+        start = time.time()
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            end = time.time()
+            stack.pop()
+            event = {
+                "id": span_id,
+                "parent": parent_id,
+                "name": name,
+                "start": start,
+                "end": end,
+                "duration": end - start,
+                "pid": os.getpid(),
+                "thread": threading.get_ident(),
+                "attrs": attrs,
+            }
+            if error is not None:
+                event["error"] = error
+            self._write(event)
+
+    def _write(self, event):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(event, default=str) + "\n")
+                self._file.flush()
+
+
+def export_chrome_trace(jsonl_path, output_path):
+    """Convert a JSON-lines span file to the Chrome trace event format.
+
+    The output can be opened in chrome://tracing or https://ui.perfetto.dev.
+    """
+    trace_events = []
+    with open(jsonl_path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            args = dict(event.get("attrs", {}))
+            if "error" in event:
+                args["error"] = event["error"]
+            trace_events.append(
+                {
+                    "name": event["name"],
+                    "cat": event["name"].split(".")[0],
+                    "ph": "X",
+                    "ts": event["start"] * 1e6,
+                    "dur": event["duration"] * 1e6,
+                    "pid": event["pid"],
+                    "tid": event["thread"],
+                    "args": args,
+                }
+            )
+
+    with open(output_path, "w") as file:
+        json.dump({"traceEvents": trace_events}, file)
+
+
+# Process-wide tracer used by all modules; configured by testbench.py
+tracer = Tracer()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Export a JSON-lines trace to Chrome trace format"
+    )
+    parser.add_argument("trace", type=str, help="JSON-lines trace file")
+    parser.add_argument("output", type=str, help="Chrome trace JSON file to write")
+
+    args = parser.parse_args()
+
+    export_chrome_trace(args.trace, args.output)
@@ -0,0 +1,558 @@
+# workload_generator.py
+import argparse
+import csv
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from fake_data import CATEGORIES, OPENERS, data_filename
+from query_index import analyze_query
+
+# Short aliases used in generated queries
+ALIASES = {
+    "users": "u",
+    "products": "p",
+    "orders": "o",
+    "order_items": "oi",
+    "reviews": "r",
+}
+
+# Foreign key relationships between the fake_data tables
+JOIN_EDGES = [
+    (("orders", "user_id"), ("users", "user_id")),
+    (("order_items", "order_id"), ("orders", "order_id")),
+    (("order_items", "product_id"), ("products", "product_id")),
+    (("reviews", "user_id"), ("users", "user_id")),
+    (("reviews", "product_id"), ("products", "product_id")),
+]
+
+# Numeric columns that are summed or averaged by aggregation queries
+MEASURES = {
+    "users": [],
+    "products": ["price", "stock"],
+    "orders": ["total_amount"],
+    "order_items": ["quantity", "price"],
+    "reviews": ["rating"],
+}
+
+QUERY_KINDS = ("filter", "aggregate", "join")
+
+# Columns whose values fake_data draws at random, e.g. the few user ids that
+# orders are sampled from. Their domains are read from the generated CSVs.
+SAMPLED_COLUMNS = {
+    "users": ["user_id"],
+    "products": ["product_id", "price"],
+    "orders": ["user_id"],
+    "order_items": ["product_id"],
+    "reviews": ["user_id", "product_id"],
+}
+
+
+def read_column_values(data_dir, table_name, columns):
+    """Return the sorted distinct integer values of columns in a table's CSV.
+
+    Returns None if the table has no CSV in `data_dir`, in any compression.
+    """
+    for compression, opener in OPENERS.items():
+        path = os.path.join(data_dir, data_filename(table_name, compression))
+        if os.path.exists(path):
+            break
+    else:
+        return None
+
+    values = {col: set() for col in columns}
+    with opener(path, "rt", newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            for col in columns:
+                values[col].add(int(row[col]))
+    return {col: sorted(col_values) for col, col_values in values.items()}
+
+
+def column_domains(data_dir=None):
+    """Describe the values fake_data generates for every column.
+
+    Most domains mirror the default value pools of the `fake_data`
+    generators. The columns in `SAMPLED_COLUMNS` hold a random sample of
+    values, so their domains are the values in the CSVs of `data_dir`.
+    This way predicates hit existing rows with a predictable selectivity.
+    A domain is one of:
+        ("int", low, high): integers in [low, high]
+        ("set", values): the sorted integers in `values`
+        ("decimal", low, high): decimals in [low, high]
+        ("date", days): dates within the last `days` days
+        ("pool", format, size): strings format.format(i) for i in [1, size]
+        ("values", values): a fixed list of strings
+        None: not used in predicates, e.g. free text
+
+    Args:
+        data_dir: Directory with the generated CSVs, e.g. data/2. Without
+            it, the sampled columns are not used in predicates.
+    """
+    domains = {
+        "users": {
+            "user_id": None,
+            "name": ("pool", "User{}", 40000),
+            "email": ("pool", "user{}@example.com", 11000),
+            "created_at": ("date", 18000),
+        },
+        "products": {
+            "product_id": None,
+            "name": None,
+            "category": ("values", CATEGORIES),
+            "price": None,
+            "stock": ("int", 0, 100),
+        },
+        "orders": {
+            "order_id": ("int", 1, 17),
+            "user_id": None,
+            "order_date": ("date", 41),
+            "total_amount": ("decimal", 20.0, 1000.0),
+        },
+        "order_items": {
+            "order_id": ("int", 1, 17),
+            "product_id": None,
+            "quantity": ("int", 1, 11),
+            "price": ("decimal", 1.0, 100.0),
+        },
+        "reviews": {
+            "review_id": ("int", 1, 71),
+            "user_id": None,
+            "product_id": None,
+            "rating": ("int", 1, 5),
+            "comment": ("pool", "Review text {}", 20),
+        },
+    }
+
+    missing = []
+    for table_name, columns in SAMPLED_COLUMNS.items():
+        values = read_column_values(data_dir, table_name, columns) if data_dir else None
+        if values is None:
+            missing.append(table_name)
+            continue
+        for col in columns:
+            domains[table_name][col] = ("set", values[col])
+    if missing:
+        print(
+            f"Warning: no generated data for {', '.join(missing)} in {data_dir}; "
+            "predicates skip their sampled columns."
+        )
+    return domains
+
+
+def _cardinality(domain):
+    kind = domain[0]
+    if kind == "int":
+        return domain[2] - domain[1] + 1
+    if kind == "set":
+        return len(domain[1])
+    if kind == "date":
+        return domain[1]
+    if kind == "pool":
+        return domain[2]
+    if kind == "values":
+        return len(domain[1])
+    # Decimals are treated as continuous
+    return float("inf")
+
+
+class WorkloadGenerator:
+    def __init__(
+        self,
+        data_dir=None,
+        mix=None,
+        selectivity=(0.001, 0.1),
+        max_predicates=2,
+        predicate_columns=None,
+        column_freq_dict=None,
+        skew=1.0,
+        max_in_values=20,
+        seed=None,
+    ):
+        """Generate random queries against the fake_data schema.
+
+        Args:
+            data_dir: Directory with the generated CSVs the value domains
+                are read from (see `column_domains`)
+            mix: Dictionary of relative frequencies of the query kinds
+                "filter", "aggregate" and "join"
+            selectivity: (min, max) fraction of a column's values a single
+                predicate selects; drawn log-uniformly per predicate
+            max_predicates: Maximum number of predicates per query
+            predicate_columns: Optional {table: [columns]} restricting which
+                columns predicates and GROUP BY clauses use
+            column_freq_dict: Optional {table: {column: frequency}} used to
+                weight the choice of predicate columns
+            skew: Zipf exponent of the query weights; 0 weights all queries
+                equally
+            max_in_values: Maximum number of values in an IN list
+            seed: Random seed
+        """
+        self.domains = column_domains(data_dir)
+        self.mix = mix or {"filter": 0.5, "aggregate": 0.3, "join": 0.2}
+        unknown_kinds = set(self.mix) - set(QUERY_KINDS)
+        if unknown_kinds:
+            raise ValueError(f"Unknown query kinds: {sorted(unknown_kinds)}")
+        self.min_selectivity, self.max_selectivity = selectivity
+        self.max_predicates = max_predicates
+        self.skew = skew
+        self.max_in_values = max_in_values
+        self.random = random.Random(seed)
+        self.today = datetime.now().date()
+
+        self.predicate_columns = {}
+        for table_name, domains in self.domains.items():
+            columns = [col for col, domain in domains.items() if domain is not None]
+            if predicate_columns is not None:
+                columns = [
+                    col
+                    for col in predicate_columns.get(table_name, [])
+                    if col in columns
+                ]
+            self.predicate_columns[table_name] = columns
+
+        # Columns are weighted by their frequency in the existing workload;
+        # the +1 keeps rarely used columns in play
+        self.column_weights = {
+            table_name: [
+                (column_freq_dict or {}).get(table_name, {}).get(col, 0) + 1
+                for col in columns
+            ]
+            for table_name, columns in self.predicate_columns.items()
+        }
+
+    def _choose_columns(self, table_name, k):
+        columns = self.predicate_columns[table_name]
+        weights = list(self.column_weights[table_name])
+        chosen = []
+        while columns and len(chosen) < min(k, len(columns)):
+            col = self.random.choices(columns, weights)[0]
+            index = columns.index(col)
+            columns = columns[:index] + columns[index + 1 :]
+            weights = weights[:index] + weights[index + 1 :]
+            chosen.append(col)
+        return chosen
+
+    def _selectivity(self):
+        low, high = self.min_selectivity, self.max_selectivity
+        return low * (high / low) ** self.random.random()
+
+    def predicate(self, table_name, column, alias=None):
+        """Build a predicate on `column` with a random target selectivity.
+
+        Selectivities at or below one value of the column become equality
+        predicates; larger ones become ranges or IN lists covering roughly
+        that fraction of the column's values.
+        """
+        domain = self.domains[table_name][column]
+        name = f"{alias}.{column}" if alias else column
+        kind = domain[0]
+        selectivity = self._selectivity()
+
+        if kind == "decimal":
+            low, high = domain[1], domain[2]
+            width = (high - low) * selectivity
+            start = self.random.uniform(low, high - width)
+            return f"{name} BETWEEN {start:.2f} AND {start + width:.2f}"
+
+        cardinality = _cardinality(domain)
+        num_values = max(1, min(round(selectivity * cardinality), cardinality))
+
+        if kind == "int":
+            low, high = domain[1], domain[2]
+            start = self.random.randint(low, high - num_values + 1)
+            if num_values == 1:
+                return f"{name} = {start}"
+            return f"{name} BETWEEN {start} AND {start + num_values - 1}"
+
+        if kind == "set":
+            values = domain[1]
+            start = self.random.randint(0, len(values) - num_values)
+            if num_values == 1:
+                return f"{name} = {values[start]}"
+            return (
+                f"{name} BETWEEN {values[start]} AND {values[start + num_values - 1]}"
+            )
+
+        if kind == "date":
+            offset = self.random.randint(0, domain[1] - num_values)
+            end = self.today - timedelta(days=offset)
+            if num_values == 1:
+                return f"{name} = '{end.isoformat()}'"
+            start = end - timedelta(days=num_values - 1)
+            return f"{name} BETWEEN '{start.isoformat()}' AND '{end.isoformat()}'"
+
+        # String pools and fixed value lists are filtered with IN lists
+        if kind == "pool":
+            indexes = self.random.sample(
+                range(1, domain[2] + 1), min(num_values, self.max_in_values)
+            )
+            values = [domain[1].format(i) for i in indexes]
+        else:
+            values = self.random.sample(
+                domain[1], min(num_values, self.max_in_values, len(domain[1]))
+            )
+        if len(values) == 1:
+            return f"{name} = '{values[0]}'"
+        quoted = ", ".join(f"'{value}'" for value in values)
+        return f"{name} IN ({quoted})"
+
+    def _where(self, predicates):
+        return f" WHERE {' AND '.join(predicates)}" if predicates else ""
+
+    def _group_column(self, table_name):
+        """Pick a low-cardinality column to group by."""
+        columns = sorted(
+            self.predicate_columns[table_name],
+            key=lambda col: _cardinality(self.domains[table_name][col]),
+        )
+        return self.random.choice(columns[:3]) if columns else None
+
+    def _aggregates(self, table_name, alias=None):
+        prefix = f"{alias}." if alias else ""
+        aggregates = ["COUNT(*) AS num_rows"]
+        if MEASURES[table_name]:
+            measure = self.random.choice(MEASURES[table_name])
+            function = self.random.choice(["SUM", "AVG", "MAX"])
+            aggregates.append(
+                f"{function}({prefix}{measure}) AS {function.lower()}_{measure}"
+            )
+        return aggregates
+
+    def filter_query(self, table_name):
+        columns = self._choose_columns(
+            table_name, self.random.randint(1, self.max_predicates)
+        )
+        predicates = [self.predicate(table_name, col) for col in columns]
+        return f"SELECT * FROM {table_name}{self._where(predicates)}"
+
+    def aggregate_query(self, table_name):
+        group_column = self._group_column(table_name)
+        columns = self._choose_columns(
+            table_name, self.random.randint(1, self.max_predicates)
+        )
+        predicates = [self.predicate(table_name, col) for col in columns]
+        select = ([group_column] if group_column else []) + self._aggregates(table_name)
+        query = f"SELECT {', '.join(select)} FROM {table_name}{self._where(predicates)}"
+        if group_column:
+            query += f" GROUP BY {group_column}"
+        return query
+
+    def join_query(self, edges):
+        (left, left_col), (right, right_col) = self.random.choice(edges)
+        left_alias, right_alias = ALIASES[left], ALIASES[right]
+
+        # Spread the predicates over both sides of the join
+        predicates = []
+        for _ in range(self.random.randint(1, self.max_predicates)):
+            table_name, alias = self.random.choice(
+                [(left, left_alias), (right, right_alias)]
+            )
+            columns = self._choose_columns(table_name, 1)
+            if columns:
+                predicate = self.predicate(table_name, columns[0], alias)
+                if predicate not in predicates:
+                    predicates.append(predicate)
+
+        query_from = (
+            f" FROM {left} {left_alias} JOIN {right} {right_alias}"
+            f" ON {left_alias}.{left_col} = {right_alias}.{right_col}"
+        )
+        group_column = self._group_column(right)
+        if self.random.random() < 0.5 and group_column:
+            select = [f"{right_alias}.{group_column}"] + self._aggregates(
+                left, left_alias
+            )
+            return (
+                f"SELECT {', '.join(select)}{query_from}{self._where(predicates)}"
+                f" GROUP BY {right_alias}.{group_column}"
+            )
+        return f"SELECT {left_alias}.*{query_from}{self._where(predicates)}"
+
+    def generate(self, num_queries, tables=None):
+        """Generate a workload of distinct queries with Zipf-distributed weights.
+
+        Args:
+            num_queries: Number of distinct queries to generate
+            tables: Tables to generate queries for (default: all)
+
+        Returns:
+            list: (query kind, tables, query spec) tuples where the spec is
+                {"query": str, "weight": float}. Weights average to 1.
+        """
+        tables = list(tables or self.domains.keys())
+        edges = [
+            edge for edge in JOIN_EDGES if edge[0][0] in tables and edge[1][0] in tables
+        ]
+        kinds = [kind for kind in self.mix if kind != "join" or edges]
+        kind_weights = [self.mix[kind] for kind in kinds]
+
+        seen = set()
+        workload = []
+        attempts = 0
+        while len(workload) < num_queries and attempts < num_queries * 20:
+            attempts += 1
+            kind = self.random.choices(kinds, kind_weights)[0]
+            if kind == "join":
+                query = self.join_query(edges)
+            else:
+                table_name = self.random.choice(tables)
+                if kind == "filter":
+                    query = self.filter_query(table_name)
+                else:
+                    query = self.aggregate_query(table_name)
+            if query in seen:
+                continue
+            seen.add(query)
+            workload.append((kind, analyze_query(query)["tables"], query))
+
+        # A random popularity rank per query; weight ~ 1 / rank ** skew
+        ranks = list(range(1, len(workload) + 1))
+        self.random.shuffle(ranks)
+        raw_weights = [1 / rank**self.skew for rank in ranks]
+        scale = len(workload) / sum(raw_weights) if workload else 0
+        return [
+            (kind, query_tables, {"query": query, "weight": round(weight * scale, 4)})
+            for (kind, query_tables, query), weight in zip(workload, raw_weights)
+        ]
+
+
+def column_frequencies(workload, domains):
+    """Count how often each column is used in WHERE and GROUP BY clauses.
+
+    This is the same count column_freq_dict.json holds for the hand-written
+    workload.
+    """
+    schema = {table_name: list(columns) for table_name, columns in domains.items()}
+    frequencies = {
+        table_name: {col: 0 for col in columns}
+        for table_name, columns in domains.items()
+    }
+    for _, _, spec in workload:
+        info = analyze_query(spec["query"], schema)
+        for table_name, columns in frequencies.items():
+            used = set(info["filter_columns"].get(table_name, []))
+            used |= set(info["group_columns"].get(table_name, []))
+            for col in used & set(columns):
+                columns[col] += 1
+    return frequencies
+
+
+def write_workload(workload, output_dir, domains):
+    """Write the workload in the format of src/queries.
+
+    Every query goes to the file of each table it reads, as in
+    queries/classify.py, and to all.json. A column_freq_dict.json for the
+    workload is written next to them.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    table_queries = {table_name: [] for table_name in domains}
+    for _, query_tables, spec in workload:
+        for table_name in query_tables:
+            table_queries[table_name].append(spec)
+
+    for table_name, specs in table_queries.items():
+        with open(os.path.join(output_dir, f"{table_name}.json"), "w") as file:
+            json.dump(specs, file, indent=4)
+    with open(os.path.join(output_dir, "all.json"), "w") as file:
+        json.dump([spec for _, _, spec in workload], file, indent=4)
+    with open(os.path.join(output_dir, "column_freq_dict.json"), "w") as file:
+        json.dump(column_frequencies(workload, domains), file, indent=2)
+
+
+def _parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        kind, weight = item.split("=")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def _parse_columns(value):
+    columns = {}
+    for item in value.split(","):
+        table_name, col = item.strip().split(".")
+        columns.setdefault(table_name, []).append(col)
+    return columns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic query workload for the fake data"
+    )
+    parser.add_argument(
+        "--num_queries", type=int, default=1000, help="Number of queries"
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=os.path.join("src", "queries_generated"),
+        help="Directory to write the per-table JSON files to",
+    )
+    parser.add_argument(
+        "--data_size",
+        type=int,
+        default=2,
+        help="Data size in MiB whose generated CSVs (data/<size>) the value domains are read from",
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=None,
+        help="Directory with the generated CSVs (default: data/<data_size>)",
+    )
+    parser.add_argument(
+        "--tables",
+        type=str,
+        default=None,
+        help="Comma-separated list of tables to generate queries for",
+    )
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=None,
+        help="Relative frequency of query kinds, e.g. 'filter=0.5,aggregate=0.3,join=0.2'",
+    )
+    parser.add_argument(
+        "--selectivity",
+        type=str,
+        default="0.001,0.1",
+        help="Minimum and maximum fraction of values selected by one predicate",
+    )
+    parser.add_argument(
+        "--max_predicates", type=int, default=2, help="Maximum predicates per query"
+    )
+    parser.add_argument(
+        "--predicate_columns",
+        type=_parse_columns,
+        default=None,
+        help="Comma-separated table.column list predicates are restricted to, e.g. 'orders.order_date,users.name'",
+    )
+    parser.add_argument(
+        "--skew",
+        type=float,
+        default=1.0,
+        help="Zipf exponent of the query weights (0 for uniform weights)",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+
+    args = parser.parse_args()
+
+    with open(os.path.join("src", "column_freq_dict.json"), "r") as file:
+        column_freq_dict = json.load(file)
+
+    generator = WorkloadGenerator(
+        data_dir=args.data_dir or os.path.join("data", str(args.data_size)),
+        mix=args.mix,
+        selectivity=tuple(float(s) for s in args.selectivity.split(",")),
+        max_predicates=args.max_predicates,
+        predicate_columns=args.predicate_columns,
+        column_freq_dict=column_freq_dict,
+        skew=args.skew,
+        seed=args.seed,
+    )
+    tables = args.tables.split(",") if args.tables else None
+    workload = generator.generate(args.num_queries, tables)
+    write_workload(workload, args.output_dir, generator.domains)
+
+    print(f"Wrote {len(workload)} queries to {args.output_dir}")
@@ -0,0 +1,142 @@
+# test_interleaved.py
+import itertools
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+from interleaved import (
+    InterleavedScheduler,
+    min_rounds,
+    paired_differences,
+    sign_flip_test,
+)
+
+
+def scheduler(objective="weighted_total", **kwargs):
+    """InterleavedScheduler whose partition manager only has an objective."""
+    return InterleavedScheduler(SimpleNamespace(objective=objective), None, **kwargs)
+
+
+def enumerated_p_value(differences):
+    """Two-sided p-value over every sign assignment, computed independently."""
+    observed = abs(sum(differences))
+    totals = [
+        abs(sum(sign * d for sign, d in zip(signs, differences)))
+        for signs in itertools.product((1, -1), repeat=len(differences))
+    ]
+    return sum(total >= observed * (1 - 1e-9) for total in totals) / len(totals)
+
+
+def samples(rng, mean, rounds=5, queries=8, noise=0.1):
+    """Per-round (round, time, score, query_times) samples of one layout."""
+    result = []
+    for round_number in range(rounds):
+        query_times = [
+            {"seconds": max(0.0, rng.gauss(mean, noise)), "weight": 1.0}
+            for _ in range(queries)
+        ]
+        total = sum(entry["seconds"] for entry in query_times)
+        result.append((round_number, total, total, query_times))
+    return result
+
+
+def test_paired_differences_are_weighted():
+    a = [{"seconds": 2.0, "weight": 3.0}, {"seconds": 1.0, "weight": 1.0, "count": 2}]
+    b = [{"seconds": 1.0}, {"seconds": 0.5}]
+    assert paired_differences(a, b) == [3.0, 1.0]
+
+
+def test_exact_test_matches_enumeration():
+    rng = random.Random(0)
+    for length in range(1, 11):
+        differences = [rng.gauss(0.2, 1.0) for _ in range(length)]
+        assert sign_flip_test(differences) == enumerated_p_value(differences)
+    # Five equal positive differences: only all-plus and all-minus are as extreme
+    assert sign_flip_test([1.0] * 5) == 2 / 32
+
+
+def test_no_difference_is_not_significant():
+    assert sign_flip_test([]) == 1.0
+    assert sign_flip_test([0.0, 0.0]) == 1.0
+    rng = random.Random(1)
+    a = [rng.gauss(1.0, 0.1) for _ in range(40)]
+    b = [rng.gauss(1.0, 0.1) for _ in range(40)]
+    differences = [x - y for x, y in zip(a, b)]
+    assert sign_flip_test(differences, rng=random.Random(2)) > 0.05
+
+
+def test_clear_shift_is_significant():
+    rng = random.Random(1)
+    a = [rng.gauss(1.0, 0.1) for _ in range(40)]
+    differences = [x - (x + 0.3 + rng.gauss(0, 0.1)) for x in a]
+    assert sign_flip_test(differences, rng=random.Random(2)) < 0.01
+
+
+def test_sampled_test_is_reproducible_with_a_seed():
+    rng = random.Random(3)
+    differences = [rng.gauss(0.02, 0.1) for _ in range(30)]
+    p_values = {
+        sign_flip_test(differences, permutations=2000, rng=random.Random(7))
+        for _ in range(3)
+    }
+    assert len(p_values) == 1
+
+
+def test_decide_keeps_champion_without_significant_difference():
+    rng = random.Random(4)
+    decider = scheduler(seed=5)
+    champion = {"columns": [], "samples": samples(rng, 1.0)}
+    challenger = {"columns": ["a"], "samples": samples(rng, 1.0)}
+    # Make sure the challenger is the batch leader, but only by noise
+    challenger["samples"] = [
+        (r, t * 0.99, s * 0.99, q) for r, t, s, q in challenger["samples"]
+    ]
+    assert decider._decide(champion, [champion, challenger]) is champion
+    assert challenger["compared_with"] == []
+    assert challenger["p_value"] >= decider.significance_level
+
+
+def test_decide_switches_to_a_significantly_faster_layout():
+    rng = random.Random(4)
+    decider = scheduler(seed=5)
+    champion = {"columns": [], "samples": samples(rng, 1.0)}
+    challenger = {"columns": ["a"], "samples": samples(rng, 0.5)}
+    assert decider._decide(champion, [champion, challenger]) is challenger
+    assert challenger["compared_with"] == []
+    assert challenger["p_value"] < decider.significance_level
+    assert champion["compared_with"] == ["a"]
+
+
+def test_decide_is_reproducible_with_a_seed():
+    def decide():
+        rng = random.Random(6)
+        decider = scheduler(seed=8)
+        champion = {"columns": [], "samples": samples(rng, 1.0, rounds=8)}
+        challenger = {"columns": ["a"], "samples": samples(rng, 0.97, rounds=8)}
+        winner = decider._decide(champion, [champion, challenger])
+        return winner["columns"], challenger["p_value"]
+
+    assert decide() == decide()
+
+
+def test_other_objectives_are_tested_on_round_scores():
+    assert min_rounds(0.05) == 6
+    assert sign_flip_test([1.0] * min_rounds(0.05)) < 0.05
+    assert sign_flip_test([1.0] * (min_rounds(0.05) - 1)) >= 0.05
+    with pytest.raises(ValueError):
+        scheduler("weighted_p95", rounds=5)
+
+    rng = random.Random(4)
+    decider = scheduler("weighted_p95", rounds=6, seed=5)
+    champion = {"columns": [], "samples": samples(rng, 1.0, rounds=6)}
+    challenger = {"columns": ["a"], "samples": samples(rng, 0.5, rounds=6)}
+    # Six rounds, all faster: the exact p-value is 2 / 2**6
+    assert decider._decide(champion, [champion, challenger]) is challenger
+    assert challenger["p_value"] == 2 / 64